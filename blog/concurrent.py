@@ -0,0 +1,77 @@
+"""Independent read queries run at the same time from async views.
+
+Django 4.2's async ORM runs every query through sync_to_async on the
+request's one thread, so awaiting several with asyncio.gather still runs
+them back to back. `gather` runs each callable on a worker thread with its
+own database connection instead, so a page waits for its slowest query
+rather than for their sum. The workers cannot see uncommitted writes of
+the calling thread, so only use it for reads outside a transaction; with
+CONCURRENT_QUERIES off (as in tests of async views) the callables run one
+after another on the request thread instead.
+
+Hooks installed with `execute_wrapper` (query budgets, benchmarks) follow
+the current context rather than a thread, so they see the queries of the
+workers and of async views' sync_to_async calls too.
+"""
+import asyncio
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.db.backends.signals import connection_created
+
+_wrappers = ContextVar('execute_wrappers', default=())
+
+
+def _dispatch(execute, sql, params, many, context):
+    """Run a query through the wrappers installed in the current context"""
+    for wrapper in reversed(_wrappers.get()):
+        execute = functools.partial(wrapper, execute)
+    return execute(sql, params, many, context)
+
+
+def _install_dispatch(connection, **kwargs):
+    if _dispatch not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_dispatch)
+
+
+# Connections opened by any thread from now on, and those already open here
+connection_created.connect(_install_dispatch, dispatch_uid='blog.concurrent.dispatch')
+
+
+@contextmanager
+def execute_wrapper(wrapper):
+    """connection.execute_wrapper for every query of the current context, on any thread"""
+    for connection in connections.all():
+        _install_dispatch(connection)
+    token = _wrappers.set((*_wrappers.get(), wrapper))
+    try:
+        yield
+    finally:
+        _wrappers.reset(token)
+
+
+def _run(function):
+    try:
+        return function()
+    finally:
+        # Worker threads get no request_finished signal to do this
+        close_old_connections()
+
+
+async def gather(*functions):
+    """Call each function on its own worker thread; returns their results in order"""
+    if not settings.CONCURRENT_QUERIES:
+        return await sync_to_async(lambda: [function() for function in functions])()
+    return await asyncio.gather(*(
+        sync_to_async(_run, thread_sensitive=False)(function) for function in functions
+    ))
+
+
+async def load_user(request):
+    """Resolve the lazy request.user off the event loop and return it"""
+    await sync_to_async(lambda: request.user.is_authenticated)()
+    return request.user
@@ -0,0 +1,97 @@
+"""Conditional GET for content views.
+
+`conditional` wraps a view with django.views.decorators.http.condition,
+computing the ETag and Last-Modified validators from one function so they
+cost a single query. A matching If-None-Match or If-Modified-Since request
+gets a 304 before the view body or any template runs. Listings send only
+an ETag, since a post leaving a listing cannot move a Last-Modified forward.
+Async views are supported too; their validators run on a worker thread.
+
+Validators can register blog.pagecache `on_cache_hit` hooks; a 304 runs
+them like a page cache hit does, so skipping the view skips no side effects.
+"""
+import asyncio
+import hashlib
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.messages import get_messages
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import condition
+
+from .pagecache import key_versions, run_cache_hit_hooks
+
+
+def make_validators(request, stamps, surrogate_keys=(), last_modified=None):
+    """(etag, last_modified) for a page built from `stamps` and surrogate keys.
+
+    The ETag also covers the surrogate key versions (see blog.pagecache) for
+    changes without a timestamp of their own, and who is asking, since
+    logged-in readers see a different page. It is weak: the body embeds a
+    CSRF token that differs between otherwise identical renders.
+    """
+    versions = key_versions(surrogate_keys) if surrogate_keys else {}
+    parts = [request.user.pk, *stamps, *sorted(versions.items())]
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return f'W/"{digest}"', last_modified
+
+
+def conditional(validators):
+    """Decorate a view with validators(request, *args, **kwargs) -> (etag, last_modified).
+
+    `validators` returns None when there is nothing to validate against,
+    typically because the object does not exist and the view will 404.
+    """
+    def decorator(view):
+        def get(request, *args, **kwargs):
+            if not hasattr(request, '_validators'):
+                # Pending flash messages are rendered into the page
+                request._validators = None if len(get_messages(request)) else validators(
+                    request, *args, **kwargs
+                )
+            return request._validators or (None, None)
+
+        if asyncio.iscoroutinefunction(view):
+            return _async_conditional(view, get)
+
+        conditional_view = condition(
+            etag_func=lambda request, *args, **kwargs: get(request, *args, **kwargs)[0],
+            last_modified_func=lambda request, *args, **kwargs: get(request, *args, **kwargs)[1],
+        )(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            # Unsafe methods are never answered from a validator
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            response = conditional_view(request, *args, **kwargs)
+            if response.status_code == 304:
+                run_cache_hit_hooks(getattr(request, 'page_cache_hit_hooks', []))
+            return response
+
+        return wrapper
+    return decorator
+
+
+def _async_conditional(view, get):
+    """What condition() does, for an async view (condition() is sync-only before Django 5.0)"""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return await view(request, *args, **kwargs)
+
+        etag, last_modified = await sync_to_async(get)(request, *args, **kwargs)
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = await view(request, *args, **kwargs)
+        elif response.status_code == 304:
+            await sync_to_async(run_cache_hit_hooks)(getattr(request, 'page_cache_hit_hooks', []))
+        if timestamp and not response.has_header('Last-Modified'):
+            response.headers['Last-Modified'] = http_date(timestamp)
+        if etag:
+            response.headers.setdefault('ETag', etag)
+        return response
+
+    return wrapper
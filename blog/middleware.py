@@ -0,0 +1,133 @@
+import json
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .concurrent import execute_wrapper
+
+logger = logging.getLogger('blog.query_budget')
+
+# Collapse parameter lists so "IN (%s, %s)" and "IN (%s, %s, %s)" share a fingerprint
+IN_LIST_RE = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+NUMBER_RE = re.compile(r'\b\d+\b')
+QUOTED_RE = re.compile(r"'(?:[^']|'')*'")
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def fingerprint(sql):
+    """Normalise a statement so repeats with different parameters match"""
+    sql = QUOTED_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = IN_LIST_RE.sub('(...)', sql)
+    return ' '.join(sql.split())
+
+
+class QueryRecorder:
+    """connection.execute_wrapper hook collecting statement fingerprints and timings"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        # Queries of blog.concurrent workers are recorded from their threads
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            with self._lock:
+                self.duration += time.perf_counter() - start
+                self.count += 1
+                self.fingerprints[fingerprint(sql)] += 1
+
+
+class QueryBudgetMiddleware:
+    """Sample requests and check their queries against per-view budgets.
+
+    QUERY_BUDGETS maps URL names to the maximum number of queries a request
+    may run; QUERY_BUDGET_DEFAULT applies to everything else. Any statement
+    repeated more than QUERY_BUDGET_MAX_DUPLICATES times is reported as a
+    likely N+1. Samples are logged as JSON to the "blog.query_budget"
+    logger, and with QUERY_BUDGET_RAISE (meant for tests) a violation raises
+    QueryBudgetExceeded instead of only being logged.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        strict = settings.QUERY_BUDGET_RAISE
+        if not strict and random.random() >= settings.QUERY_BUDGET_SAMPLE_RATE:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        with execute_wrapper(recorder):
+            response = self.get_response(request)
+
+        self.report(request, response, recorder, strict)
+        return response
+
+    async def __acall__(self, request):
+        strict = settings.QUERY_BUDGET_RAISE
+        if not strict and random.random() >= settings.QUERY_BUDGET_SAMPLE_RATE:
+            return await self.get_response(request)
+
+        recorder = QueryRecorder()
+        with execute_wrapper(recorder):
+            response = await self.get_response(request)
+
+        self.report(request, response, recorder, strict)
+        return response
+
+    def report(self, request, response, recorder, strict):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else None
+        budget = settings.QUERY_BUDGETS.get(view, settings.QUERY_BUDGET_DEFAULT)
+        duplicates = {
+            sql: count for sql, count in recorder.fingerprints.most_common()
+            if count > settings.QUERY_BUDGET_MAX_DUPLICATES
+        }
+
+        violations = []
+        if budget is not None and recorder.count > budget:
+            violations.append('budget')
+        if duplicates:
+            violations.append('duplicates')
+
+        record = {
+            'event': 'query_budget',
+            'view': view,
+            'path': request.path,
+            'method': request.method,
+            'status': response.status_code,
+            'queries': recorder.count,
+            'budget': budget,
+            'db_time_ms': round(recorder.duration * 1000, 2),
+            'duplicates': duplicates,
+            'violations': violations,
+        }
+
+        if violations:
+            logger.warning(json.dumps(record))
+            if strict:
+                raise QueryBudgetExceeded(json.dumps(record, indent=2))
+        else:
+            logger.info(json.dumps(record))
@@ -0,0 +1,212 @@
+"""Full-page cache for anonymous readers, purged by surrogate key.
+
+Views listed in PAGE_CACHE_VIEWS are cached for anonymous GET and HEAD
+requests, keyed by host, path and normalized query string. While rendering,
+a view tags the request with the surrogate keys its output depends on
+("post:12", "category:3", ...) through `add_surrogate_keys`; the cached page
+remembers the version of each of those keys. `purge` bumps key versions, so
+exactly the pages that depended on a changed object stop matching, without
+keeping an index of pages per key. Hits are answered from process_view,
+before the view runs, and every response for a cacheable view carries an
+X-Cache header of HIT or MISS. Hits honour the stored ETag and
+Last-Modified, so revalidation is a 304 without a query.
+
+CSRF tokens rendered into a page are swapped for a placeholder when it is
+stored and replaced with the visitor's own token on every hit.
+"""
+import hashlib
+import re
+import time
+from urllib.parse import parse_qsl, urlencode
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.middleware.csrf import _unmask_cipher_token, get_token
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from django.utils.module_loading import import_string
+
+KEY_PREFIX = 'pagecache:page:'
+VERSION_PREFIX = 'pagecache:key:'
+CSRF_PLACEHOLDER = b'__csrf_token__'
+# Masked CSRF tokens are 64 alphanumeric characters
+CSRF_TOKEN_RE = re.compile(rb'(?<![A-Za-z0-9])[A-Za-z0-9]{64}(?![A-Za-z0-9])')
+# Response headers that describe the request rather than the page
+SKIPPED_HEADERS = {'vary', 'x-cache', 'content-length'}
+
+
+def add_surrogate_keys(request, *keys):
+    """Record that the page being rendered depends on `keys`"""
+    request.surrogate_keys = getattr(request, 'surrogate_keys', set()) | set(keys)
+
+
+def on_cache_hit(request, function, *args):
+    """Call the function at dotted path `function` with `args` on every hit of this page.
+
+    For side effects the view would otherwise perform, such as counting views.
+    """
+    hooks = getattr(request, 'page_cache_hit_hooks', [])
+    if (function, args) not in hooks:
+        request.page_cache_hit_hooks = hooks + [(function, args)]
+
+
+def run_cache_hit_hooks(hooks):
+    """Call hooks recorded with on_cache_hit, for a response the view did not render"""
+    for function, args in hooks:
+        import_string(function)(*args)
+
+
+def post_keys(posts):
+    """Surrogate keys for pages that display `posts` (author and category included)"""
+    keys = set()
+    for post in posts:
+        keys |= {f'post:{post.id}', f'author:{post.author_id}'}
+        if post.category_id:
+            keys.add(f'category:{post.category_id}')
+    return keys
+
+
+def purge(*keys):
+    """Invalidate every cached page depending on any of `keys`, once the transaction commits"""
+    transaction.on_commit(lambda: _bump_versions(keys))
+
+
+def _bump_versions(keys):
+    for key in keys:
+        try:
+            cache.incr(VERSION_PREFIX + key)
+        except ValueError:
+            # No version yet means no page depends on it
+            pass
+
+
+def key_versions(keys):
+    """Current version of each surrogate key, starting any that have none"""
+    names = {VERSION_PREFIX + key: key for key in keys}
+    versions = cache.get_many(names)
+    for name in names.keys() - versions.keys():
+        # Start from the clock so a key that was evicted and recreated
+        # cannot come back to a version an old page recorded
+        cache.add(name, time.time_ns(), None)
+        versions[name] = cache.get(name)
+    return {names[name]: version for name, version in versions.items()}
+
+
+def _normalized_query(request):
+    params = [
+        (name, value) for name, value in parse_qsl(request.META.get('QUERY_STRING', ''))
+        if value and name not in settings.PAGE_CACHE_IGNORED_PARAMS
+        and not name.startswith('utm_')
+    ]
+    return urlencode(sorted(params))
+
+
+def page_key(request):
+    url = f'{request.get_host()}{request.path}?{_normalized_query(request)}'
+    return KEY_PREFIX + hashlib.md5(url.encode()).hexdigest()
+
+
+class PageCacheMiddleware:
+    """Serve and store anonymous pages of the views in PAGE_CACHE_VIEWS.
+
+    Must come after the authentication and messages middleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        if getattr(request, 'page_cache_key', None) is not None:
+            self.finish(request, response)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if getattr(request, 'page_cache_key', None) is not None:
+            # Messages may be read from the session, so storing is sync
+            await sync_to_async(self.finish)(request, response)
+        return response
+
+    def finish(self, request, response):
+        """Label a miss and store it if it can be shared"""
+        if not response.has_header('X-Cache'):
+            response['X-Cache'] = 'MISS'
+            if self.storable(request, response):
+                self.store(request.page_cache_key, request, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not self.cacheable(request):
+            return None
+        key = page_key(request)
+        entry = cache.get(key)
+        if entry is not None and key_versions(entry['keys']) == entry['keys']:
+            return self.hit(request, entry)
+        request.page_cache_key = key
+        return None
+
+    def cacheable(self, request):
+        match = request.resolver_match
+        return (
+            settings.PAGE_CACHE_TIMEOUT > 0
+            and request.method in ('GET', 'HEAD')
+            and match is not None and match.view_name in settings.PAGE_CACHE_VIEWS
+            and not request.user.is_authenticated
+            # Pending flash messages are rendered into the page
+            and not len(get_messages(request))
+        )
+
+    def storable(self, request, response):
+        return (
+            response.status_code == 200
+            and not response.streaming
+            and not response.cookies
+            and 'private' not in response.get('Cache-Control', '')
+            and 'no-store' not in response.get('Cache-Control', '')
+            and not len(get_messages(request))
+        )
+
+    def store(self, key, request, response):
+        content = response.content
+        secret = request.META.get('CSRF_COOKIE')
+        if secret:
+            content = CSRF_TOKEN_RE.sub(
+                lambda m: CSRF_PLACEHOLDER if _unmask_cipher_token(m[0].decode()) == secret else m[0],
+                content,
+            )
+        cache.set(key, {
+            'content': content,
+            'status': response.status_code,
+            'headers': [(h, v) for h, v in response.items() if h.lower() not in SKIPPED_HEADERS],
+            'keys': key_versions(getattr(request, 'surrogate_keys', set())),
+            'hooks': getattr(request, 'page_cache_hit_hooks', []),
+        }, settings.PAGE_CACHE_TIMEOUT)
+
+    def hit(self, request, entry):
+        content = entry['content']
+        if CSRF_PLACEHOLDER in content:
+            content = content.replace(CSRF_PLACEHOLDER, get_token(request).encode())
+        response = HttpResponse(content, status=entry['status'])
+        for header, value in entry['headers']:
+            response[header] = value
+        run_cache_hit_hooks(entry['hooks'])
+        # Revalidation against the stored validators (see blog.conditional)
+        response = get_conditional_response(
+            request,
+            etag=response.get('ETag'),
+            last_modified=parse_http_date_safe(response.get('Last-Modified')),
+            response=response,
+        )
+        response['X-Cache'] = 'HIT'
+        return response
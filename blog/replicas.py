@@ -0,0 +1,179 @@
+"""Read replicas for read-only views.
+
+ReplicaMiddleware picks a replica for GET and HEAD requests to the views in
+REPLICA_VIEWS, round-robin over the replicas that are currently healthy, and
+ReplicaRouter sends that request's reads to it. Everything else (writes,
+other views, management commands and workers) uses the primary; read-only
+views deliberately left on it are listed in REPLICA_EXCLUDED_VIEWS. A replica
+that cannot be reached, or on PostgreSQL lags by more than REPLICA_MAX_LAG
+seconds, is skipped for REPLICA_RETRY_SECONDS. Reads inside a transaction
+always use the primary.
+
+Anything that gets cached (page cache misses, the home snapshot, the sidebar,
+feeds) is built from the primary inside `use_primary()`, so a lagging
+replica cannot be cached for the whole TTL after a purge.
+
+After an unsafe request a short-lived cookie pins the client to the primary
+for REPLICA_PIN_SECONDS, so people see their own comments and votes.
+"""
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+PIN_COOKIE = 'use_primary'
+SAFE_METHODS = ('GET', 'HEAD')
+
+# Alias reads go to during the current request; None means the primary
+_read_alias = ContextVar('read_alias', default=None)
+
+_rotation = itertools.count()
+_health = {}
+_lock = threading.Lock()
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith('replica')]
+
+
+@contextmanager
+def use_primary():
+    """Send the reads in the block to the primary, for results that get cached"""
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    """Reads go to the replica chosen for the request, writes to the primary"""
+
+    def db_for_read(self, model, **hints):
+        # Reads inside a transaction on the primary must see its writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return _read_alias.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def _lag(alias):
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+            'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+        )
+        return float(cursor.fetchone()[0] or 0)
+
+
+def _healthy(alias):
+    """Connect and, every REPLICA_HEALTH_INTERVAL seconds, check replication lag"""
+    now = time.monotonic()
+    with _lock:
+        state = _health.setdefault(alias, {'down_until': 0, 'checked_at': 0})
+        if state['down_until'] > now:
+            return False
+        check_lag = now - state['checked_at'] >= settings.REPLICA_HEALTH_INTERVAL
+        if check_lag:
+            state['checked_at'] = now
+    try:
+        connections[alias].ensure_connection()
+        lag = _lag(alias) if check_lag else 0
+    except DatabaseError as e:
+        logger.warning('Replica %s unavailable: %s', alias, e)
+        lag = None
+    if lag is None or lag > settings.REPLICA_MAX_LAG:
+        if lag is not None:
+            logger.warning('Replica %s is %.1fs behind', alias, lag)
+        with _lock:
+            state['down_until'] = now + settings.REPLICA_RETRY_SECONDS
+        return False
+    return True
+
+
+def choose_replica():
+    """Next healthy replica in rotation, or None to use the primary"""
+    aliases = replica_aliases()
+    if not aliases:
+        return None
+    start = next(_rotation)
+    for offset in range(len(aliases)):
+        alias = aliases[(start + offset) % len(aliases)]
+        if _healthy(alias):
+            return alias
+    return None
+
+
+class ReplicaMiddleware:
+    """Route reads of read-only views to a replica; pin clients that just wrote to the primary"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        overlap = set(settings.REPLICA_VIEWS) & set(settings.REPLICA_EXCLUDED_VIEWS)
+        if overlap:
+            raise ImproperlyConfigured(
+                f"Views in both REPLICA_VIEWS and REPLICA_EXCLUDED_VIEWS: {', '.join(sorted(overlap))}"
+            )
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _read_alias.set(None)
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+        return self.pin(request, response)
+
+    async def __acall__(self, request):
+        token = _read_alias.set(None)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+        return self.pin(request, response)
+
+    def pin(self, request, response):
+        if request.method not in SAFE_METHODS and replica_aliases():
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        if (
+            request.method in SAFE_METHODS
+            and match is not None and match.view_name in settings.REPLICA_VIEWS
+            and PIN_COOKIE not in request.COOKIES
+            # A page cache miss (see blog.pagecache) is rendered to be stored
+            and getattr(request, 'page_cache_key', None) is None
+        ):
+            _read_alias.set(choose_replica())
+        return None
@@ -4,6 +4,9 @@ Django settings for blog project.
 
 import os
 from pathlib import Path
+
+import django
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -44,6 +47,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'blog.middleware.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -51,6 +55,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'blog.pagecache.PageCacheMiddleware',
+    'blog.replicas.ReplicaMiddleware',
 ]
 
 ROOT_URLCONF = 'blog.urls'
@@ -75,12 +81,119 @@ TEMPLATES = [
 WSGI_APPLICATION = 'blog.wsgi.application'
 
 # Database
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# SQLite unless POSTGRES_DB is set. PostgreSQL connections are kept open for
+# DATABASE_CONN_MAX_AGE seconds and checked before reuse, and every session
+# gets DATABASE_STATEMENT_TIMEOUT (ms) and DATABASE_WORK_MEM. Behind PgBouncer
+# in transaction mode set DATABASE_PGBOUNCER=1 (no server-side cursors).
+# DATABASE_POOL_SIZE enables Django's own pool, which needs Django 5.1+.
+# `manage.py copy_database` moves an existing SQLite database across.
+POSTGRES_DB = os.getenv('POSTGRES_DB')
+if POSTGRES_DB:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': POSTGRES_DB,
+            'USER': os.getenv('POSTGRES_USER', ''),
+            'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+            'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
+            'PORT': os.getenv('POSTGRES_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.getenv('DATABASE_CONN_MAX_AGE', 600)),
+            'CONN_HEALTH_CHECKS': True,
+            'DISABLE_SERVER_SIDE_CURSORS': os.getenv('DATABASE_PGBOUNCER', '0') == '1',
+            'OPTIONS': {
+                'connect_timeout': int(os.getenv('DATABASE_CONNECT_TIMEOUT', 5)),
+                'options': '-c statement_timeout={} -c work_mem={}'.format(
+                    int(os.getenv('DATABASE_STATEMENT_TIMEOUT', 30000)),
+                    os.getenv('DATABASE_WORK_MEM', '8MB'),
+                ),
+            },
+        }
+    }
+    DATABASE_POOL_SIZE = int(os.getenv('DATABASE_POOL_SIZE', 0))
+    if DATABASE_POOL_SIZE:
+        if django.VERSION < (5, 1):
+            raise ImproperlyConfigured(
+                'DATABASE_POOL_SIZE needs Django 5.1 or later; use PgBouncer with DATABASE_PGBOUNCER=1 instead'
+            )
+        # Pooled connections replace persistent ones
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv('DATABASE_POOL_MIN_SIZE', 2)),
+            'max_size': DATABASE_POOL_SIZE,
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'blog.sqlite',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
     }
+
+# SQLite connection settings (blog.sqlite). WAL lets pages be read while a
+# view count flush or a comment is being written; writers wait up to
+# SQLITE_BUSY_TIMEOUT ms for the lock. Run `manage.py sqlite_maintenance
+# --loop` next to the web process to checkpoint the WAL and re-ANALYZE every
+# SQLITE_MAINTENANCE_INTERVAL seconds; `manage.py benchmark_sqlite` compares
+# read throughput under concurrent writes with and without these settings.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)),
+    'synchronous': 'normal',
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+    # Negative sizes are in KiB
+    'cache_size': -int(os.getenv('SQLITE_CACHE_KB', 64 * 1024)),
+    'temp_store': 'memory',
 }
+SQLITE_IMMEDIATE_TRANSACTIONS = True
+SQLITE_MAINTENANCE_INTERVAL = int(os.getenv('SQLITE_MAINTENANCE_INTERVAL', 300))
+SQLITE_ANALYSIS_LIMIT = 1000
+
+# Read replicas (blog.replicas): DATABASE_REPLICAS lists replica hosts
+# ("host" or "host:port") for PostgreSQL, or database files for SQLite, e.g.
+# a copy of db.sqlite3 to try it locally. GET and HEAD requests to
+# REPLICA_VIEWS read from a healthy replica unless the client wrote within
+# the last REPLICA_PIN_SECONDS; whatever gets cached is built from the primary.
+DATABASE_REPLICAS = [replica for replica in os.getenv('DATABASE_REPLICAS', '').split(',') if replica]
+for number, replica in enumerate(DATABASE_REPLICAS, 1):
+    config = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+    if POSTGRES_DB:
+        host, _, port = replica.partition(':')
+        config.update(HOST=host, PORT=port or config['PORT'])
+    else:
+        config['NAME'] = replica
+    DATABASES[f'replica{number}'] = config
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['blog.replicas.ReplicaRouter']
+REPLICA_VIEWS = [
+    'home', 'post_list', 'post_detail', 'search', 'tag_posts', 'category_posts', 'author_list',
+]
+# Read-only views kept on the primary on purpose. Feeds are served from
+# their cache and rebuilt from the primary (see posts.feeds), so a replica
+# would save nothing and could only leave a stale feed cached.
+REPLICA_EXCLUDED_VIEWS = ['feed', 'scoped_feed']
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 10))
+REPLICA_MAX_LAG = float(os.getenv('REPLICA_MAX_LAG', 5))
+REPLICA_HEALTH_INTERVAL = 5
+REPLICA_RETRY_SECONDS = 30
+
+# Cache
+# A shared cache (Redis) is needed for invalidation to reach every worker;
+# the local-memory fallback is per process and only suits development.
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'blog-default',
+        }
+    }
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -109,10 +222,40 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# `collectstatic` hashes file names and precompresses text assets (see
+# blog.staticfiles); files under STATICFILES_PRUNE_DIRS that nothing refers
+# to are not collected
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'blog.staticfiles.CompressedManifestStaticFilesStorage',
+    },
+}
+STATICFILES_FINDERS = [
+    'blog.staticfiles.PrunedFileSystemFinder',
+    'django.contrib.staticfiles.finders.AppDirectoriesFinder',
+]
+STATICFILES_PRUNE_DIRS = ['assets/vendor', 'assets/images']
+# Serve collected files from the app when there is no proxy in front;
+# unhashed names are cached for STATIC_MAX_AGE, hashed ones for a year
+SERVE_STATIC = os.getenv('SERVE_STATIC', '0') == '1'
+STATIC_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', 3600))
+
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Responsive image derivatives (posts.images), written to media storage
+# under IMAGE_DERIVATIVES_DIR at upload time or on first render; backfill
+# existing media with `manage.py generate_image_derivatives`
+IMAGE_DERIVATIVES_DIR = 'derivatives'
+IMAGE_DERIVATIVE_WIDTHS = [160, 320, 640, 1024, 1600]
+IMAGE_DERIVATIVE_QUALITY = int(os.getenv('IMAGE_DERIVATIVE_QUALITY', 80))
+IMAGE_MANIFEST_TTL = 60 * 60 * 24 * 7
+IMAGE_MANIFEST_MISSING_TTL = 300
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -133,6 +276,93 @@ CKEDITOR_CONFIGS = {
 # Taggit
 TAGGIT_CASE_INSENSITIVE = True
 
+# Home page snapshot, rebuilt on content changes or after this many seconds
+HOME_SNAPSHOT_TTL = int(os.getenv('HOME_SNAPSHOT_TTL', 300))
+
+# Sidebar categories and popular tags from posts.context_processors
+SIDEBAR_CACHE_TTL = int(os.getenv('SIDEBAR_CACHE_TTL', 600))
+
+# Sitemaps built into SITEMAP_ROOT by `manage.py build_sitemaps` (see
+# blog.sitemaps); 50,000 URLs is the most a sitemap file may hold
+SITEMAP_ROOT = Path(os.getenv('SITEMAP_ROOT', BASE_DIR / 'sitemaps'))
+SITEMAP_SHARD_SIZE = 50000
+SITEMAP_MAX_AGE = int(os.getenv('SITEMAP_MAX_AGE', 3600))
+
+# Atom/RSS feeds (posts.feeds): newest posts per feed; cached feeds are
+# retired by the page cache purge signals, the timeout is only a backstop
+FEED_ITEMS = int(os.getenv('FEED_ITEMS', 20))
+FEED_CACHE_TIMEOUT = int(os.getenv('FEED_CACHE_TIMEOUT', 60 * 60 * 24))
+
+# Anonymous full-page cache (blog.pagecache): views whose pages are cached,
+# for how long, and query parameters that do not change the page
+PAGE_CACHE_VIEWS = ['post_list', 'post_detail', 'category_posts', 'tag_posts']
+PAGE_CACHE_TIMEOUT = int(os.getenv('PAGE_CACHE_TIMEOUT', 600))
+PAGE_CACHE_IGNORED_PARAMS = ['fbclid', 'gclid', 'ref']
+
+# Post views are buffered in the cache and written to the database in bulk
+# every interval, either from the request path or by `manage.py flush_view_counts`.
+# The command needs the shared (Redis) cache; with the local-memory cache
+# keep VIEW_COUNT_INLINE_FLUSH on so each process flushes its own views.
+VIEW_COUNT_FLUSH_INTERVAL = int(os.getenv('VIEW_COUNT_FLUSH_INTERVAL', 30))
+VIEW_COUNT_INLINE_FLUSH = os.getenv('VIEW_COUNT_INLINE_FLUSH', '1') == '1'
+
+# Trending scores decay views by age; recompute with `manage.py update_trending`
+TRENDING_HALF_LIFE_HOURS = float(os.getenv('TRENDING_HALF_LIFE_HOURS', 12))
+TRENDING_WINDOW_HOURS = int(os.getenv('TRENDING_WINDOW_HOURS', 72))
+TRENDING_UPDATE_INTERVAL = int(os.getenv('TRENDING_UPDATE_INTERVAL', 300))
+
+# Full-text search; the backend is picked from the database vendor unless a
+# dotted path to a posts.search backend class is given
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND')
+SEARCH_RESULTS_LIMIT = 1000
+
+# How long the approximate total shown on cursor-paginated listings is cached
+PAGINATION_COUNT_TTL = 600
+
+# Independent queries of async views run concurrently on worker threads
+# (blog.concurrent). Tests that render async views turn it off, since the
+# workers cannot see data inside the test transaction.
+CONCURRENT_QUERIES = os.getenv('CONCURRENT_QUERIES', '1') == '1'
+
+# Query budgets, enforced by blog.middleware.QueryBudgetMiddleware
+# Maximum queries per request by URL name; None disables the check
+QUERY_BUDGETS = {
+    'home': 15,
+    'post_list': 10,
+    'post_detail': 20,
+    'search': 10,
+    'trending': 5,
+    'category_list': 10,
+    'category_posts': 10,
+    'tag_list': 5,
+    'tag_posts': 10,
+    'author_list': 5,
+    'comment_thread': 10,
+}
+QUERY_BUDGET_DEFAULT = 50
+# The same statement run more often than this in one request is an N+1
+QUERY_BUDGET_MAX_DUPLICATES = 5
+QUERY_BUDGET_SAMPLE_RATE = float(os.getenv('QUERY_BUDGET_SAMPLE_RATE', 0.01))
+# Raise instead of logging, and check every request; tests of query counts
+# turn it on
+QUERY_BUDGET_RAISE = os.getenv('QUERY_BUDGET_RAISE', '0') == '1'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'blog.query_budget': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+        },
+    },
+}
+
 # Custom User Model
 AUTH_USER_MODEL = 'users.CustomUser'
 
@@ -142,4 +372,32 @@ LOGOUT_REDIRECT_URL = 'home'
 LOGIN_URL = 'login'
 
 # Email Configuration (for production)
-EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
\ No newline at end of file
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', 25))
+EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', '0') == '1'
+EMAIL_TIMEOUT = int(os.getenv('EMAIL_TIMEOUT', 30))
+DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'webmaster@localhost')
+
+# Comment notifications
+SITE_URL = os.getenv('SITE_URL', 'http://localhost:8000')
+ADMIN_EMAIL = os.getenv('ADMIN_EMAIL', 'admin@localhost')
+NOTIFY_ADMIN_ON_COMMENT = os.getenv('NOTIFY_ADMIN_ON_COMMENT', '0') == '1'
+
+# Notification emails are queued in comments.OutboxMessage and sent by
+# `manage.py run_outbox_worker`; failures retry after OUTBOX_RETRY_DELAY
+# seconds, doubling each time, up to OUTBOX_MAX_ATTEMPTS
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', 100))
+OUTBOX_THREADS = int(os.getenv('OUTBOX_THREADS', 4))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 6))
+OUTBOX_RETRY_DELAY = int(os.getenv('OUTBOX_RETRY_DELAY', 60))
+OUTBOX_LEASE_SECONDS = int(os.getenv('OUTBOX_LEASE_SECONDS', 300))
+OUTBOX_POLL_INTERVAL = int(os.getenv('OUTBOX_POLL_INTERVAL', 5))
+
+# Newsletter sending (`manage.py send_newsletter`); the rate is emails per
+# second across all workers, 0 for no limit
+NEWSLETTER_BATCH_SIZE = int(os.getenv('NEWSLETTER_BATCH_SIZE', 500))
+NEWSLETTER_WORKERS = int(os.getenv('NEWSLETTER_WORKERS', 4))
+NEWSLETTER_RATE_LIMIT = float(os.getenv('NEWSLETTER_RATE_LIMIT', 50))
\ No newline at end of file
@@ -0,0 +1,218 @@
+"""Sitemaps written to disk in shards and rebuilt incrementally.
+
+Each section (posts, categories, tags, authors) is split into shards by
+primary key range, SITEMAP_SHARD_SIZE ids per shard, so a shard can never
+go over the 50,000 URL limit and objects never move between shards. The
+state file keeps a watermark per shard: the number of URLs, the newest
+lastmod (`updated_at` for posts, the newest post in it for listing pages)
+and a checksum of the fields the URLs are built from. `build_sitemaps`
+reads only those columns and renders and rewrites just the shards whose
+watermark moved, then the sitemap index. Every file gets a gzipped sibling
+and `serve_sitemap` serves them from disk.
+"""
+import gzip
+import json
+import os
+import zlib
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import F, Max, Q
+from django.urls import reverse
+
+from categories.models import Category
+from posts.models import Post
+from taggit.models import Tag
+
+from .staticfiles import serve
+
+STATE_FILE = 'state.json'
+INDEX_FILE = 'sitemap.xml'
+XMLNS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+
+class Section:
+    """One kind of page; `queryset` is annotated with `lastmod`"""
+    url_fields = ('slug',)
+    changefreq = 'daily'
+
+    def __init__(self, name):
+        self.name = name
+
+    def rows(self, pk_range=None):
+        """(pk, lastmod, *url_fields) for every object, in pk order"""
+        queryset = self.queryset()
+        if pk_range:
+            queryset = queryset.filter(pk__gte=pk_range[0], pk__lt=pk_range[1])
+        return queryset.order_by('pk').values_list(
+            'pk', 'lastmod', *self.url_fields
+        ).iterator(chunk_size=5000)
+
+
+class PostSection(Section):
+    url_fields = ('published_date', 'slug')
+    changefreq = 'monthly'
+
+    def queryset(self):
+        return Post.objects.filter(status='published').annotate(lastmod=F('updated_at'))
+
+    def location(self, published_date, slug):
+        return Post(published_date=published_date, slug=slug).get_absolute_url()
+
+
+class CategorySection(Section):
+    def queryset(self):
+        return Category.objects.annotate(
+            lastmod=Max('posts__updated_at', filter=Q(posts__status='published'))
+        )
+
+    def location(self, slug):
+        return reverse('category_posts', args=[slug])
+
+
+class TagSection(Section):
+    def queryset(self):
+        return Tag.objects.annotate(
+            lastmod=Max('post__updated_at', filter=Q(post__status='published'))
+        ).filter(lastmod__isnull=False)
+
+    def location(self, slug):
+        return reverse('tag_posts', args=[slug])
+
+
+class AuthorSection(Section):
+    url_fields = ('username',)
+    changefreq = 'weekly'
+
+    def queryset(self):
+        return get_user_model().objects.filter(is_active=True).annotate(
+            lastmod=Max('blog_posts__updated_at', filter=Q(blog_posts__status='published'))
+        ).filter(lastmod__isnull=False)
+
+    def location(self, username):
+        return reverse('user_profile', args=[username])
+
+
+SECTIONS = [
+    PostSection('posts'),
+    CategorySection('categories'),
+    TagSection('tags'),
+    AuthorSection('authors'),
+]
+
+
+def _shard_name(section, shard):
+    return f'sitemap-{section}-{shard}.xml'
+
+
+def _isoformat(value, timespec='seconds'):
+    return value.isoformat(timespec=timespec) if value else None
+
+
+def watermarks(section):
+    """{shard: [url count, newest lastmod, checksum]} from the cheap columns only"""
+    size = settings.SITEMAP_SHARD_SIZE
+    shards = {}
+    for pk, lastmod, *url_fields in section.rows():
+        mark = shards.setdefault(str(pk // size), [0, None, 0])
+        mark[0] += 1
+        # Full precision, so an edit within the same second still moves it
+        lastmod = _isoformat(lastmod, 'microseconds')
+        if lastmod and (mark[1] is None or lastmod > mark[1]):
+            mark[1] = lastmod
+        mark[2] = zlib.crc32(repr((pk, url_fields)).encode(), mark[2])
+    return shards
+
+
+def _replace(path, data):
+    with open(path + '.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(path + '.tmp', path)
+
+
+def _write(root, name, content):
+    """Atomically write `name` and its gzipped sibling"""
+    data = content.encode()
+    _replace(os.path.join(root, name + '.gz'), gzip.compress(data, mtime=0))
+    _replace(os.path.join(root, name), data)
+
+
+def _remove(root, name):
+    for filename in (name, name + '.gz'):
+        try:
+            os.remove(os.path.join(root, filename))
+        except FileNotFoundError:
+            pass
+
+
+def render_shard(section, shard):
+    size = settings.SITEMAP_SHARD_SIZE
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', f'<urlset xmlns="{XMLNS}">']
+    for pk, lastmod, *url_fields in section.rows((shard * size, (shard + 1) * size)):
+        lines.append('<url>')
+        lines.append(f'<loc>{escape(settings.SITE_URL + section.location(*url_fields))}</loc>')
+        if lastmod:
+            lines.append(f'<lastmod>{_isoformat(lastmod)}</lastmod>')
+        lines.append(f'<changefreq>{section.changefreq}</changefreq>')
+        lines.append('</url>')
+    lines.append('</urlset>')
+    return '\n'.join(lines) + '\n'
+
+
+def render_index(state):
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', f'<sitemapindex xmlns="{XMLNS}">']
+    for section in SECTIONS:
+        for shard, (count, lastmod, checksum) in sorted(
+            state.get(section.name, {}).items(), key=lambda item: int(item[0])
+        ):
+            location = reverse('sitemap_shard', args=[_shard_name(section.name, shard)])
+            lines.append('<sitemap>')
+            lines.append(f'<loc>{escape(settings.SITE_URL + location)}</loc>')
+            if lastmod:
+                lines.append(f'<lastmod>{_isoformat(datetime.fromisoformat(lastmod))}</lastmod>')
+            lines.append('</sitemap>')
+    lines.append('</sitemapindex>')
+    return '\n'.join(lines) + '\n'
+
+
+def _load_state(root):
+    try:
+        with open(os.path.join(root, STATE_FILE)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def build_sitemaps(full=False, progress=None):
+    """Bring the files in SITEMAP_ROOT up to date; returns the number of shards written"""
+    root = str(settings.SITEMAP_ROOT)
+    os.makedirs(root, exist_ok=True)
+    state = {} if full else _load_state(root)
+    written = 0
+    removed = False
+
+    for section in SECTIONS:
+        old = state.get(section.name, {})
+        new = watermarks(section)
+        for shard, mark in new.items():
+            if old.get(shard) != mark:
+                _write(root, _shard_name(section.name, shard), render_shard(section, int(shard)))
+                written += 1
+                if progress:
+                    progress(section.name, shard)
+        for shard in old.keys() - new.keys():
+            _remove(root, _shard_name(section.name, shard))
+            removed = True
+        state[section.name] = new
+
+    if written or removed or not os.path.exists(os.path.join(root, INDEX_FILE)):
+        _write(root, INDEX_FILE, render_index(state))
+    _replace(os.path.join(root, STATE_FILE), json.dumps(state).encode())
+    return written
+
+
+def serve_sitemap(request, name=INDEX_FILE):
+    """The sitemap index or one shard, gzipped when the client accepts it"""
+    return serve(request, name, document_root=settings.SITEMAP_ROOT, max_age=settings.SITEMAP_MAX_AGE)
@@ -0,0 +1,32 @@
+"""SQLite tuned for serving traffic.
+
+Use ENGINE 'blog.sqlite' instead of Django's sqlite3 backend. Every new
+connection gets SQLITE_PRAGMAS: WAL journaling so readers keep going while
+a write is in progress, a busy timeout so writers queue for the lock
+instead of failing, synchronous=NORMAL (safe with WAL), a memory map and a
+larger page cache. With SQLITE_IMMEDIATE_TRANSACTIONS, atomic blocks take
+the write lock when they start, so two transactions can never both hold a
+read lock and deadlock upgrading it.
+
+The WAL only shrinks at a checkpoint no reader is in the way of, and the
+query planner relies on ANALYZE statistics; `maintain` does both and
+`manage.py sqlite_maintenance --loop` runs it periodically.
+"""
+from django.conf import settings
+from django.db import connections
+
+
+def maintain(using='default'):
+    """Checkpoint and truncate the WAL, then refresh planner statistics.
+
+    Returns (busy, WAL frames, frames checkpointed); busy is 1 when a
+    reader kept the checkpoint from finishing.
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        result = tuple(cursor.fetchone())
+        # Sample at most this many rows per index, so ANALYZE stays quick on big tables
+        cursor.execute(f'PRAGMA analysis_limit = {int(settings.SQLITE_ANALYSIS_LIMIT)}')
+        cursor.execute('ANALYZE')
+    return result
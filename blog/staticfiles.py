@@ -0,0 +1,198 @@
+"""Static asset build and serving.
+
+`collectstatic` is the build step: PrunedFileSystemFinder leaves out files
+under STATICFILES_PRUNE_DIRS that no template or collected asset refers to,
+and CompressedManifestStaticFilesStorage content-hashes everything into
+staticfiles.json and writes .gz (and .br, when the brotli package is
+installed) siblings next to text assets. Hashed files can be cached
+forever: `serve` sends them with immutable Cache-Control and picks the best
+precompressed variant, and a proxy can do the same by serving STATIC_ROOT
+with gzip_static/brotli_static and far-future expiry for hashed names.
+"""
+import gzip
+import logging
+import mimetypes
+import os
+import posixpath
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.finders import FileSystemFinder
+from django.contrib.staticfiles.storage import HashedFilesMixin, ManifestStaticFilesStorage
+from django.http import FileResponse, Http404
+from django.template.utils import get_app_template_dirs
+from django.utils._os import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_EXTENSIONS = (
+    '.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.html', '.xml',
+    '.ico', '.ttf', '.otf', '.eot',
+)
+COMPRESS_MIN_SIZE = 256
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# Names written by ManifestStaticFilesStorage: file.0123456789ab.css
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.[^/.]+$')
+
+CSS_URL_RE = re.compile(r'''url\(\s*['"]?([^'")]+?)['"]?\s*\)''')
+SOURCE_MAP_RE = re.compile(r'sourceMappingURL=([^\s*]+)')
+TEXT_EXTENSIONS = ('.css', '.js', '.html', '.txt')
+
+
+def _prune_path_re():
+    dirs = '|'.join(re.escape(d.strip('/')) for d in settings.STATICFILES_PRUNE_DIRS)
+    return re.compile(rf'''(?:{dirs})/[^'"\s)?#]+''')
+
+
+def _template_sources():
+    dirs = [Path(d) for engine in settings.TEMPLATES for d in engine.get('DIRS', [])]
+    dirs += [Path(d) for d in get_app_template_dirs('templates')]
+    for directory in dirs:
+        yield from (p for p in directory.rglob('*') if p.is_file())
+
+
+def reachable_static_files(files):
+    """Subset of the prunable static files that something refers to.
+
+    `files` maps static paths to filesystem paths. Templates and every
+    non-prunable asset are scanned for paths inside the prune directories;
+    the stylesheets, scripts and source maps that are reached are followed
+    in turn, resolving relative url() references.
+    """
+    prune_re = _prune_path_re()
+    prunable = {path for path in files if prune_re.fullmatch(path)}
+    reached = set()
+    queue = []
+
+    def visit(text, base=None):
+        refs = set(prune_re.findall(text))
+        if base:
+            for ref in CSS_URL_RE.findall(text) + SOURCE_MAP_RE.findall(text):
+                ref = ref.split('?')[0].split('#')[0]
+                if ref and not ref.startswith(('data:', 'http:', 'https:', '//', '/')):
+                    refs.add(posixpath.normpath(posixpath.join(posixpath.dirname(base), ref)))
+        for ref in refs:
+            if ref in prunable and ref not in reached:
+                reached.add(ref)
+                queue.append(ref)
+
+    for source in _template_sources():
+        visit(source.read_text(errors='ignore'))
+    for path, full_path in files.items():
+        if path not in prunable and path.endswith(TEXT_EXTENSIONS):
+            visit(Path(full_path).read_text(errors='ignore'), base=path)
+    while queue:
+        path = queue.pop()
+        if path.endswith(TEXT_EXTENSIONS):
+            visit(Path(files[path]).read_text(errors='ignore'), base=path)
+    return reached | (set(files) - prunable)
+
+
+class PrunedFileSystemFinder(FileSystemFinder):
+    """STATICFILES_DIRS finder that only lists files something refers to.
+
+    Only affects what collectstatic copies; find() still sees everything.
+    """
+
+    def list(self, ignore_patterns):
+        found = list(super().list(ignore_patterns))
+        files = {path: storage.path(path) for path, storage in found}
+        keep = reachable_static_files(files)
+        pruned = 0
+        for path, storage in found:
+            if path in keep:
+                yield path, storage
+            else:
+                pruned += 1
+        logger.info('Pruned %d unreferenced static files', pruned)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Hashed file names plus precompressed copies of text assets.
+
+    References to files that do not exist (typically vendor source maps)
+    are left untouched with a warning instead of failing the build, and
+    until collectstatic has written a manifest, URLs fall back to the
+    unhashed names so development and tests work without a build.
+    """
+
+    def hashed_name(self, name, content=None, filename=None):
+        try:
+            return super().hashed_name(name, content, filename)
+        except ValueError:
+            if content is not None:
+                raise
+            logger.warning('Static reference %s does not exist; leaving it unhashed', name)
+            return name
+
+    def url(self, name, force=False):
+        if not self.hashed_files and not force:
+            return super(HashedFilesMixin, self).url(name)
+        try:
+            return super().url(name, force)
+        except ValueError:
+            logger.warning('No hashed static file for %s', name)
+            return super(HashedFilesMixin, self).url(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in set(self.hashed_files) | set(self.hashed_files.values()):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS) and self.exists(name):
+                self.compress(name)
+
+    def compress(self, name):
+        path = self.path(name)
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return
+        variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli:
+            variants.append(('.br', brotli.compress(data)))
+        for suffix, compressed in variants:
+            # Not worth serving if it barely saves anything
+            if len(compressed) < len(data) * 0.95:
+                with open(path + suffix, 'wb') as f:
+                    f.write(compressed)
+
+
+def serve(request, path, document_root=None, max_age=None):
+    """Serve a collected static file, precompressed and cached when hashed.
+
+    Other directories of prebuilt files can be served with `document_root`;
+    unhashed names are cached for `max_age` (STATIC_MAX_AGE by default).
+    """
+    try:
+        full_path = safe_join(document_root or settings.STATIC_ROOT, path)
+    except ValueError:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    accepted = request.headers.get('Accept-Encoding', '')
+    encoding = None
+    for name, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if name in accepted and os.path.isfile(full_path + suffix):
+            encoding, full_path = name, full_path + suffix
+            break
+
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    response = FileResponse(open(full_path, 'rb'), content_type=content_type,
+                            filename=posixpath.basename(path))
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    if HASHED_NAME_RE.search(path):
+        response.headers['Cache-Control'] = IMMUTABLE
+    else:
+        max_age = settings.STATIC_MAX_AGE if max_age is None else max_age
+        response.headers['Cache-Control'] = f'public, max-age={max_age}'
+    return response
@@ -2,7 +2,7 @@
 URL configuration for blog project.
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.contrib.auth import views as auth_views
 from django.conf import settings
 from django.conf.urls.static import static
@@ -10,6 +10,8 @@ from users.forms import CustomUserCreationForm
 from users.views import register
 from django.views.generic import TemplateView
 from users.views import register, author_list
+from blog.sitemaps import serve_sitemap
+from blog.staticfiles import serve as serve_static
 
 urlpatterns = [
     # Admin
@@ -35,10 +37,18 @@ urlpatterns = [
     path('about/', TemplateView.as_view(template_name='about.html'), name='about'),
     path('author/list/', author_list, name='author_list'),
     
+    # Sitemaps, prebuilt by `manage.py build_sitemaps`
+    path('sitemap.xml', serve_sitemap, name='sitemap'),
+    re_path(r'^(?P<name>sitemap-[a-z]+-\d+\.xml)$', serve_sitemap, name='sitemap_shard'),
+    
     # CKEditor
     path('ckeditor/', include('ckeditor_uploader.urls')),
 ]
 
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
\ No newline at end of file
+    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
+elif settings.SERVE_STATIC:
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % settings.STATIC_URL.lstrip('/'), serve_static),
+    ]
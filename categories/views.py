@@ -1,12 +1,21 @@
 from django.core.paginator import Paginator
-from django.shortcuts import render
+from django.db.models import Count, Max, OuterRef, Q, Subquery
+from django.shortcuts import render, get_object_or_404
+from blog.conditional import conditional, make_validators
+from blog.pagecache import add_surrogate_keys, post_keys
 from .models import Category
 from posts.models import Post
+from posts.pagination import paginate_by_cursor
 from taggit.models import Tag
 
 def category_list(request):
     # Get all categories
-    categories_list = Category.objects.annotate(post_count=Count('posts')).order_by('name')
+    # The card image is that of the category's latest post, fetched with the page
+    latest_post = Post.objects.filter(category=OuterRef('pk')).order_by('-published_date')
+    categories_list = Category.objects.annotate(
+        post_count=Count('posts'),
+        cover_image=Subquery(latest_post.values('featured_image')[:1]),
+    ).order_by('name')
     
     # Pagination for categories
     paginator = Paginator(categories_list, 12)  # 12 categories per page
@@ -29,14 +38,25 @@ def category_list(request):
         'default_tags': default_tags,
     })
 
+def category_posts_validators(request, slug):
+    published = Q(posts__status='published')
+    category = Category.objects.filter(slug=slug).annotate(
+        latest=Max('posts__updated_at', filter=published),
+        published_count=Count('posts', filter=published),
+    ).values('updated_at', 'latest', 'published_count').first()
+    if category is None:
+        return None
+    return make_validators(request, category.values(), ['sidebar'])
+
+@conditional(category_posts_validators)
 def category_posts(request, slug):
     category = get_object_or_404(Category, slug=slug)
-    posts_list = Post.objects.filter(category=category, status='published').order_by('-published_date')
+    posts_list = Post.objects.filter(category=category, status='published').select_related('author', 'category').order_by('-published_date')
     
     # Pagination
-    paginator = Paginator(posts_list, 10)  # 10 posts per page
-    page = request.GET.get('page')
-    posts = paginator.get_page(page)
+    posts = paginate_by_cursor(request, posts_list, 10)  # 10 posts per page
+    
+    add_surrogate_keys(request, f'category:{category.id}', f'category-posts:{category.id}', *post_keys(posts))
     
     return render(request, 'categories/category_posts.html', {
         'category': category,
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Comment, CommentVote, CommentReport
+from django.utils import timezone
+from .models import Comment, CommentVote, CommentReport, OutboxMessage
 
 class CommentVoteInline(admin.TabularInline):
     model = CommentVote
@@ -82,4 +83,16 @@ class CommentReportAdmin(admin.ModelAdmin):
     def mark_resolved(self, request, queryset):
         queryset.update(resolved=True, resolved_by=request.user, resolved_at=timezone.now())
         self.message_user(request, f'{queryset.count()} reports marked as resolved.')
-    mark_resolved.short_description = "Mark selected reports as resolved"
\ No newline at end of file
+    mark_resolved.short_description = "Mark selected reports as resolved"
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'comment', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status', 'kind']
+    readonly_fields = ['kind', 'comment', 'attempts', 'last_error', 'created_at', 'sent_at']
+    actions = ['retry_messages']
+    
+    def retry_messages(self, request, queryset):
+        updated = queryset.exclude(status='sent').update(status='pending', next_attempt_at=timezone.now())
+        self.message_user(request, f'{updated} emails queued for retry.')
+    retry_messages.short_description = "Retry selected emails"
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from comments.models import Comment
+from comments.votes import recount_votes
+
+
+class Command(BaseCommand):
+    help = 'Recompute comment upvote, downvote and score tallies from the recorded votes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--post', type=int, help='Only repair comments on this post id')
+
+    def handle(self, *args, **options):
+        comments = Comment.objects.all()
+        if options['post']:
+            comments = comments.filter(post_id=options['post'])
+
+        updated = recount_votes(
+            comments,
+            batch_size=options['batch_size'],
+            progress=lambda count: self.stdout.write(f'Recounted {count} comments...'),
+        )
+        self.stdout.write(self.style.SUCCESS(f'Repaired vote tallies for {updated} comments.'))
@@ -0,0 +1,31 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from comments.outbox import process_outbox
+
+
+class Command(BaseCommand):
+    help = 'Send queued comment notification emails'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running, polling every OUTBOX_POLL_INTERVAL seconds when the queue is empty',
+        )
+        parser.add_argument('--batch-size', type=int, default=settings.OUTBOX_BATCH_SIZE)
+        parser.add_argument('--threads', type=int, default=settings.OUTBOX_THREADS)
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = process_outbox(options['batch_size'], options['threads'])
+            if sent or failed:
+                self.stdout.write(self.style.SUCCESS(f'Sent {sent} emails, {failed} failed.'))
+                # More messages may already be due
+                continue
+
+            if not options['loop']:
+                break
+            time.sleep(settings.OUTBOX_POLL_INTERVAL)
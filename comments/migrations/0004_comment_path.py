@@ -0,0 +1,69 @@
+# Generated by Django 4.2.7 on 2026-10-18 06:07
+
+from django.db import migrations, models
+from django.utils.http import int_to_base36
+
+PATH_STEP = 7
+MAX_DEPTH = 255 // PATH_STEP
+BATCH_SIZE = 1000
+
+
+def backfill_paths(apps, schema_editor):
+    Comment = apps.get_model('comments', 'Comment')
+    parents = dict(Comment.objects.values_list('id', 'parent_id'))
+    paths = {}
+
+    def resolve(comment_id):
+        # Walk up to the nearest ancestor with a known path, then back down
+        chain = []
+        while comment_id not in paths:
+            chain.append(comment_id)
+            parent_id = parents[comment_id]
+            if parent_id is None:
+                break
+            comment_id = parent_id
+        for comment_id in reversed(chain):
+            segment = int_to_base36(comment_id).rjust(PATH_STEP, '0')
+            parent_id = parents[comment_id]
+            if parent_id is None:
+                paths[comment_id] = (segment, 0)
+            else:
+                parent_path, parent_depth = paths[parent_id]
+                if parent_depth + 1 < MAX_DEPTH:
+                    paths[comment_id] = (parent_path + segment, parent_depth + 1)
+                else:
+                    paths[comment_id] = (parent_path[:-PATH_STEP] + segment, parent_depth)
+
+    for comment_id in parents:
+        resolve(comment_id)
+
+    Comment.objects.bulk_update(
+        [Comment(id=comment_id, path=path, depth=depth) for comment_id, (path, depth) in paths.items()],
+        ['path', 'depth'],
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0003_commentreport_commentvote_comment_ip_address_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(backfill_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'path'], name='comments_co_post_id_adad8a_idx'),
+        ),
+    ]
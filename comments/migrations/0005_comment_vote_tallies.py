@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-18 06:09
+
+from django.db import migrations, models
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_votes(apps, schema_editor):
+    Comment = apps.get_model('comments', 'Comment')
+    CommentVote = apps.get_model('comments', 'CommentVote')
+
+    def vote_count(value):
+        return Coalesce(Subquery(
+            CommentVote.objects.filter(comment=OuterRef('pk'), vote=value)
+            .values('comment').annotate(total=Count('*')).values('total'),
+            output_field=IntegerField(),
+        ), Value(0))
+
+    voted = Comment.objects.filter(votes__isnull=False).distinct()
+    Comment.objects.filter(pk__in=voted.values('pk')).update(
+        upvotes=vote_count(1), downvotes=vote_count(-1)
+    )
+    Comment.objects.update(score=F('upvotes') - F('downvotes'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0004_comment_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='downvotes',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='score',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='upvotes',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_votes, migrations.RunPython.noop),
+    ]
@@ -2,10 +2,22 @@ from django.db import models
 from django.urls import reverse
 from django.utils import timezone
 from django.contrib.auth import get_user_model
+from django.utils.http import int_to_base36
 from posts.models import Post
 
 User = get_user_model()
 
+# Materialized path: each level is the comment id in fixed-width base 36,
+# so ordering by path lists a thread depth first with parents before replies
+PATH_STEP = 7
+PATH_MAX_LENGTH = 255
+MAX_DEPTH = PATH_MAX_LENGTH // PATH_STEP
+
+
+def path_segment(pk):
+    return int_to_base36(pk).rjust(PATH_STEP, '0')
+
+
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
@@ -29,18 +41,47 @@ class Comment(models.Model):
     moderated_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='moderated_comments')
     moderated_at = models.DateTimeField(null=True, blank=True)
     
+    # Position in the comment tree, set once the id is known
+    path = models.CharField(max_length=PATH_MAX_LENGTH, blank=True, editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    
+    # Vote tallies, kept in step with CommentVote by comments.votes
+    upvotes = models.PositiveIntegerField(default=0, editable=False)
+    downvotes = models.PositiveIntegerField(default=0, editable=False)
+    score = models.IntegerField(default=0, editable=False)
+    
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['created_at']),
             models.Index(fields=['post', 'active']),
             models.Index(fields=['parent']),
+            models.Index(fields=['post', 'path']),
         ]
     
     def __str__(self):
         author_name = self.author.username if self.author else (self.name or 'Anonymous')
         return f'Comment by {author_name} on {self.post.title}'
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        if not self.path:
+            self.set_path()
+            Comment.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+    
+    def set_path(self, parent=None):
+        """Derive path and depth from the parent's; needs the comment's id"""
+        parent = parent or self.parent
+        if parent is None:
+            self.path, self.depth = path_segment(self.pk), 0
+        elif parent.depth + 1 < MAX_DEPTH:
+            self.path, self.depth = parent.path + path_segment(self.pk), parent.depth + 1
+        else:
+            # Too deep to extend the path: file it beside the parent. The
+            # tree is still nested by parent_id when it is assembled.
+            self.path = parent.path[:-PATH_STEP] + path_segment(self.pk)
+            self.depth = parent.depth
+    
     def get_absolute_url(self):
         return f"{self.post.get_absolute_url()}#comment-{self.id}"
     
@@ -112,4 +153,35 @@ class CommentReport(models.Model):
         unique_together = ['comment', 'reporter']
     
     def __str__(self):
-        return f"Report on comment {self.comment.id} by {self.reporter.username}"
\ No newline at end of file
+        return f"Report on comment {self.comment.id} by {self.reporter.username}"
+class OutboxMessage(models.Model):
+    """Notification email queued with the comment that triggers it, sent by run_outbox_worker"""
+    KIND_CHOICES = (
+        ('new_comment', 'New comment'),
+        ('new_reply', 'New reply'),
+        ('moderation', 'Moderation'),
+    )
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+    
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    comment = models.ForeignKey(Comment, on_delete=models.CASCADE, related_name='outbox_messages')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # When the message may next be picked up; also the lease while it is being sent
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_kind_display()} email for comment {self.comment_id} ({self.status})"
@@ -0,0 +1,145 @@
+"""Transactional outbox for comment notification emails.
+
+Views only insert OutboxMessage rows, in the same transaction as the
+comment, so posting a comment never waits on the mail server. The
+run_outbox_worker command claims due messages in batches, renders and sends
+them from a thread pool with one mail connection per thread, and reschedules
+failures with exponential backoff.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import OutboxMessage
+
+NOTIFICATIONS = {
+    'new_comment': ('New comment on your post: {title}', 'emails/new_comment_notification'),
+    'new_reply': ('New reply to your comment on: {title}', 'emails/new_reply_notification'),
+    'moderation': ('New comment requires moderation on: {title}', 'emails/comment_moderation_notification'),
+}
+
+
+def enqueue_comment_notifications(comment):
+    """Queue the emails a new comment triggers; call inside the comment's transaction"""
+    kinds = []
+    if comment.author_id != comment.post.author_id:
+        kinds.append('new_comment')
+    if comment.parent and comment.parent.author_id and comment.author_id != comment.parent.author_id:
+        kinds.append('new_reply')
+    if settings.NOTIFY_ADMIN_ON_COMMENT:
+        kinds.append('moderation')
+    OutboxMessage.objects.bulk_create([
+        OutboxMessage(kind=kind, comment=comment) for kind in kinds
+    ])
+
+
+def _recipient(message):
+    comment = message.comment
+    if message.kind == 'new_comment':
+        return comment.post.author.email
+    if message.kind == 'new_reply':
+        return comment.parent.author.email if comment.parent and comment.parent.author else ''
+    return settings.ADMIN_EMAIL
+
+
+def build_email(message, connection=None):
+    comment = message.comment
+    subject, template = NOTIFICATIONS[message.kind]
+    context = {
+        'comment': comment,
+        'parent': comment.parent,
+        'post': comment.post,
+        'site_url': settings.SITE_URL,
+    }
+    email = EmailMultiAlternatives(
+        subject=subject.format(title=comment.post.title),
+        body=render_to_string(f'{template}.txt', context),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[_recipient(message)],
+        connection=connection,
+    )
+    email.attach_alternative(render_to_string(f'{template}.html', context), 'text/html')
+    return email
+
+
+def claim_batch(batch_size):
+    """Lease up to batch_size due messages so other workers skip them"""
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(OutboxMessage.objects.select_for_update(skip_locked=True).filter(
+            status='pending', next_attempt_at__lte=now
+        ).order_by('next_attempt_at', 'id').values_list('id', flat=True)[:batch_size])
+        OutboxMessage.objects.filter(id__in=ids).update(
+            next_attempt_at=now + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS)
+        )
+    # Everything rendering needs is loaded here, so the send threads never query
+    return list(OutboxMessage.objects.filter(id__in=ids).select_related(
+        'comment__post__author', 'comment__author', 'comment__parent__author'
+    ).order_by('id'))
+
+
+def _send_chunk(messages):
+    """Send messages over one connection; returns {message id: error or None}"""
+    results = {}
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        return {message.id: f'Could not connect: {e}' for message in messages}
+    try:
+        for message in messages:
+            try:
+                if not _recipient(message):
+                    raise ValueError('No recipient address')
+                build_email(message, connection).send()
+                results[message.id] = None
+            except Exception as e:
+                results[message.id] = f'{type(e).__name__}: {e}'
+    finally:
+        connection.close()
+    return results
+
+
+def _record_results(messages, results):
+    now = timezone.now()
+    for message in messages:
+        error = results[message.id]
+        message.attempts += 1
+        if error is None:
+            message.status = 'sent'
+            message.sent_at = now
+            message.last_error = ''
+        elif message.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            message.status = 'failed'
+            message.last_error = error
+        else:
+            delay = settings.OUTBOX_RETRY_DELAY * 2 ** (message.attempts - 1)
+            message.next_attempt_at = now + timedelta(seconds=delay)
+            message.last_error = error
+    OutboxMessage.objects.bulk_update(
+        messages, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at']
+    )
+
+
+def process_outbox(batch_size=None, threads=None):
+    """Send one batch of due messages; returns (sent, failed)"""
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    threads = threads or settings.OUTBOX_THREADS
+    messages = claim_batch(batch_size)
+    if not messages:
+        return 0, 0
+
+    chunks = [messages[i::threads] for i in range(threads) if messages[i::threads]]
+    results = {}
+    with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+        for chunk_results in executor.map(_send_chunk, chunks):
+            results.update(chunk_results)
+
+    _record_results(messages, results)
+    failed = sum(1 for error in results.values() if error)
+    return len(messages) - failed, failed
@@ -1,3 +1,129 @@
-from django.test import TestCase
+from datetime import timedelta
+from smtplib import SMTPException
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Post
+from . import votes
+from .models import Comment, CommentVote, OutboxMessage
+from .outbox import process_outbox
+from .votes import cast_vote
+
+
+class VoteTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create_user('voter', 'voter@example.com', 'x')
+        cls.other = User.objects.create_user('other', 'other@example.com', 'x')
+        post = Post.objects.create(
+            title='Post', slug='post', author=cls.user, content='<p>Body</p>', status='published',
+        )
+        cls.comment = Comment.objects.create(post=post, content='Hi', name='a', email='a@example.com')
+
+    def assertTallies(self, upvotes, downvotes):
+        self.assertEqual(
+            (self.comment.upvotes, self.comment.downvotes, self.comment.score),
+            (upvotes, downvotes, upvotes - downvotes),
+        )
+        self.comment.refresh_from_db()
+        self.assertEqual(
+            (self.comment.upvotes, self.comment.downvotes, self.comment.score),
+            (upvotes, downvotes, upvotes - downvotes),
+        )
+
+    def test_vote_unvote_and_switch(self):
+        self.assertEqual(cast_vote(self.comment, self.user, 1), 1)
+        self.assertTallies(1, 0)
+        self.assertEqual(cast_vote(self.comment, self.other, -1), -1)
+        self.assertTallies(1, 1)
+        self.assertEqual(cast_vote(self.comment, self.user, -1), -1)
+        self.assertTallies(0, 2)
+        self.assertEqual(cast_vote(self.comment, self.user, -1), 0)
+        self.assertTallies(0, 1)
+        self.assertFalse(CommentVote.objects.filter(user=self.user).exists())
+
+    def test_losing_a_concurrent_first_vote_retries(self):
+        real = votes._cast_vote
+        attempts = []
+
+        def lose_first_insert(*args):
+            attempts.append(args)
+            if len(attempts) == 1:
+                raise IntegrityError('UNIQUE constraint failed')
+            return real(*args)
+
+        with mock.patch.object(votes, '_cast_vote', side_effect=lose_first_insert):
+            self.assertEqual(cast_vote(self.comment, self.user, 1), 1)
+        self.assertEqual(len(attempts), 2)
+        self.assertTallies(1, 0)
+
+    def test_vote_view_rejects_bad_input(self):
+        self.client.force_login(self.user)
+        url = reverse('vote_comment', args=[self.comment.id])
+        for vote in ('abc', '2', ''):
+            self.assertEqual(self.client.post(url, {'vote': vote}).status_code, 400)
+        response = self.client.post(url, {'vote': '-1'})
+        self.assertEqual(response.json()['downvotes'], 1)
+
+
+@override_settings(OUTBOX_THREADS=1, OUTBOX_MAX_ATTEMPTS=2, OUTBOX_RETRY_DELAY=60)
+class OutboxTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = get_user_model().objects.create_user('author', 'author@example.com', 'x')
+        post = Post.objects.create(
+            title='Post', slug='post', author=author, content='<p>Body</p>', status='published',
+        )
+        comment = Comment.objects.create(post=post, content='Hi', name='a', email='a@example.com')
+        OutboxMessage.objects.create(kind='new_comment', comment=comment)
+
+    def make_due(self):
+        OutboxMessage.objects.update(next_attempt_at=timezone.now())
+
+    def test_failed_send_is_retried_then_marked_sent(self):
+        with mock.patch(
+            'django.core.mail.backends.locmem.EmailBackend.send_messages',
+            side_effect=SMTPException('Connection refused'),
+        ):
+            self.assertEqual(process_outbox(), (0, 1))
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.status, message.attempts), ('pending', 1))
+        self.assertIn('Connection refused', message.last_error)
+        self.assertGreater(message.next_attempt_at, timezone.now() + timedelta(seconds=50))
+
+        # Not due again until the backoff has passed
+        self.assertEqual(process_outbox(), (0, 0))
+        self.make_due()
+        self.assertEqual(process_outbox(), (1, 0))
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts, message.last_error), ('sent', 2, ''))
+        self.assertIsNotNone(message.sent_at)
+        self.assertEqual([email.to for email in mail.outbox], [['author@example.com']])
+
+        # Sent messages are never picked up again
+        self.make_due()
+        self.assertEqual(process_outbox(), (0, 0))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_gives_up_after_max_attempts(self):
+        with mock.patch(
+            'django.core.mail.backends.locmem.EmailBackend.send_messages',
+            side_effect=SMTPException('Connection refused'),
+        ):
+            for _ in range(2):
+                self.make_due()
+                self.assertEqual(process_outbox(), (0, 1))
+        self.make_due()
+        self.assertEqual(process_outbox(), (0, 0))
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.status, message.attempts), ('failed', 2))
+        self.assertEqual(mail.outbox, [])
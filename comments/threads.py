@@ -0,0 +1,59 @@
+from django.db.models import Q, Subquery
+
+from .models import Comment
+
+
+def thread_queryset():
+    """Comments with their author, ordered as a depth-first walk"""
+    return Comment.objects.select_related('author').order_by('path')
+
+
+def build_tree(comments, root_id=None, newest_first=True):
+    """Nest path-ordered comments under their parents in one pass.
+
+    Each comment gets a `children` list. Top-level comments (or the one with
+    `root_id`) are returned as roots; replies whose parent was filtered out
+    are dropped along with their subtree, as they would be when walking
+    get_replies().
+    """
+    nodes = {}
+    roots = []
+    for comment in comments:
+        comment.children = []
+        parent = nodes.get(comment.parent_id)
+        if parent is not None:
+            parent.children.append(comment)
+        elif comment.parent_id is None or comment.pk == root_id:
+            roots.append(comment)
+        else:
+            continue
+        nodes[comment.pk] = comment
+
+    if newest_first:
+        roots.reverse()
+        for comment in nodes.values():
+            comment.children.reverse()
+    return roots, len(nodes)
+
+
+def load_post_comments(post):
+    """The visible comment forest of a post in one query; returns (roots, count)"""
+    comments = thread_queryset().filter(
+        Q(parent__isnull=True) | Q(is_approved=True),
+        post=post,
+        active=True,
+    )
+    return build_tree(comments)
+
+
+def load_thread(comment_id):
+    """A comment and all its visible replies, nested, in one query; None if it is not active"""
+    root = Comment.objects.filter(pk=comment_id)
+    comments = thread_queryset().filter(
+        Q(pk=comment_id) | Q(is_approved=True),
+        post=Subquery(root.values('post')[:1]),
+        path__startswith=Subquery(root.values('path')[:1]),
+        active=True,
+    )
+    roots, count = build_tree(comments, root_id=comment_id)
+    return roots[0] if roots else None
@@ -1,15 +1,24 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponseForbidden
+from django.http import Http404, JsonResponse, HttpResponseForbidden
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
-from django.db.models import Count, Q
+from django.db import transaction
+from django.db.models import Count, Max, Q, Subquery
 from django.utils import timezone
 import json
 
+from asgiref.sync import sync_to_async
+
+from blog.concurrent import load_user
+from blog.conditional import conditional, make_validators
+
 from .models import Comment, CommentVote, CommentReport
 from .forms import CommentForm, CommentReplyForm
+from .outbox import enqueue_comment_notifications
+from .threads import load_thread
+from .votes import cast_vote
 from posts.models import Post
 
 def get_client_ip(request):
@@ -42,10 +51,10 @@ def add_comment(request, post_id):
         if request.user.is_authenticated and request.user.is_staff:
             comment.is_approved = True
         
-        comment.save()
-        
-        # Send notification emails
-        send_comment_notifications(comment)
+        with transaction.atomic():
+            comment.save()
+            # Notification emails are sent later by `manage.py run_outbox_worker`
+            enqueue_comment_notifications(comment)
         
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
             # Return JSON for AJAX requests
@@ -128,36 +137,19 @@ def reply_comment(request, comment_id):
 def vote_comment(request, comment_id):
     """Vote (like/dislike) on a comment"""
     comment = get_object_or_404(Comment, id=comment_id, active=True)
-    vote_type = int(request.POST.get('vote', 1))  # 1 for upvote, -1 for downvote
+    vote_type = request.POST.get('vote', '1')  # 1 for upvote, -1 for downvote
+    if vote_type not in ('1', '-1'):
+        return JsonResponse({'success': False, 'error': 'Invalid vote.'}, status=400)
     
     try:
-        vote, created = CommentVote.objects.get_or_create(
-            comment=comment,
-            user=request.user,
-            defaults={'vote': vote_type}
-        )
-        
-        if not created:
-            # Update existing vote
-            if vote.vote == vote_type:
-                # Remove vote if same
-                vote.delete()
-                vote_type = 0
-            else:
-                # Change vote
-                vote.vote = vote_type
-                vote.save()
-        
-        # Get updated vote counts
-        upvotes = comment.votes.filter(vote=1).count()
-        downvotes = comment.votes.filter(vote=-1).count()
+        user_vote = cast_vote(comment, request.user, int(vote_type))
         
         return JsonResponse({
             'success': True,
-            'upvotes': upvotes,
-            'downvotes': downvotes,
-            'user_vote': vote_type if 'vote' in locals() else 0,
-            'score': upvotes - downvotes,
+            'upvotes': comment.upvotes,
+            'downvotes': comment.downvotes,
+            'user_vote': user_vote,
+            'score': comment.score,
         })
     except Exception as e:
         return JsonResponse({
@@ -246,9 +238,24 @@ def moderate_comment(request, comment_id):
     
     return redirect(comment.post.get_absolute_url() + '#comments')
 
-def get_comment_thread(request, comment_id):
+def comment_thread_validators(request, comment_id):
+    root = Comment.objects.filter(id=comment_id, active=True)
+    # Every comment in the thread has a path starting with the root's
+    stats = Comment.objects.filter(
+        post=Subquery(root.values('post')[:1]),
+        path__startswith=Subquery(root.values('path')[:1]),
+    ).aggregate(latest=Max('updated_at'), count=Count('id'))
+    if not stats['count']:
+        return None
+    return make_validators(request, [stats['latest'], stats['count']], last_modified=stats['latest'])
+
+@conditional(comment_thread_validators)
+async def get_comment_thread(request, comment_id):
     """Get a comment thread with all replies (AJAX)"""
-    comment = get_object_or_404(Comment, id=comment_id, active=True)
+    thread = await sync_to_async(load_thread)(comment_id)
+    if thread is None:
+        raise Http404('No Comment matches the given query.')
+    user = await load_user(request)
     
     def serialize_comment(c):
         return {
@@ -257,83 +264,12 @@ def get_comment_thread(request, comment_id):
             'author': c.author.username if c.author else c.name,
             'created_at': c.created_at.strftime('%B %d, %Y at %I:%M %p'),
             'avatar': c.author.profile_picture.url if c.author and c.author.profile_picture else None,
-            'upvotes': c.votes.filter(vote=1).count(),
-            'downvotes': c.votes.filter(vote=-1).count(),
-            'replies': [serialize_comment(reply) for reply in c.get_replies()],
-            'can_delete': request.user == c.author or request.user.is_staff,
+            'upvotes': c.upvotes,
+            'downvotes': c.downvotes,
+            'replies': [serialize_comment(reply) for reply in c.children],
+            'can_delete': user == c.author or user.is_staff,
         }
     
-    data = serialize_comment(comment)
+    data = serialize_comment(thread)
     
     return JsonResponse(data)
-
-def send_comment_notifications(comment):
-    """Send email notifications for new comments"""
-    try:
-        from django.core.mail import send_mail
-        from django.conf import settings
-        from django.template.loader import render_to_string
-        
-        # Notify post author
-        if comment.author != comment.post.author:
-            subject = f"New comment on your post: {comment.post.title}"
-            context = {
-                'comment': comment,
-                'post': comment.post,
-                'site_url': settings.SITE_URL,
-            }
-            message = render_to_string('emails/new_comment_notification.txt', context)
-            html_message = render_to_string('emails/new_comment_notification.html', context)
-            
-            send_mail(
-                subject=subject,
-                message=message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[comment.post.author.email],
-                html_message=html_message,
-                fail_silently=True,
-            )
-        
-        # Notify parent comment author for replies
-        if comment.parent and comment.author != comment.parent.author:
-            if comment.parent.author:
-                subject = f"New reply to your comment on: {comment.post.title}"
-                context = {
-                    'comment': comment,
-                    'parent': comment.parent,
-                    'post': comment.post,
-                    'site_url': settings.SITE_URL,
-                }
-                message = render_to_string('emails/new_reply_notification.txt', context)
-                html_message = render_to_string('emails/new_reply_notification.html', context)
-                
-                send_mail(
-                    subject=subject,
-                    message=message,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[comment.parent.author.email],
-                    html_message=html_message,
-                    fail_silently=True,
-                )
-        
-        # Notify admins for moderation
-        if settings.NOTIFY_ADMIN_ON_COMMENT:
-            subject = f"New comment requires moderation on: {comment.post.title}"
-            context = {
-                'comment': comment,
-                'post': comment.post,
-                'site_url': settings.SITE_URL,
-            }
-            message = render_to_string('emails/comment_moderation_notification.txt', context)
-            html_message = render_to_string('emails/comment_moderation_notification.html', context)
-            
-            send_mail(
-                subject=subject,
-                message=message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[settings.ADMIN_EMAIL],
-                html_message=html_message,
-                fail_silently=True,
-            )
-    except Exception as e:
-        print(f"Error sending comment notification: {e}")
\ No newline at end of file
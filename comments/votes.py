@@ -0,0 +1,93 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Now
+
+from blog.pagecache import purge
+from .models import Comment, CommentVote
+
+BATCH_SIZE = 1000
+
+
+def cast_vote(comment, user, value):
+    """Apply a vote of 1 or -1, toggling it off if repeated; returns the user's vote.
+
+    The CommentVote change and the F() update of the comment's tallies run in
+    one transaction, and the tallies on `comment` are updated to match.
+    """
+    try:
+        return _cast_vote(comment, user, value)
+    except IntegrityError:
+        # A concurrent first vote by the same user won the insert; apply
+        # this one on top of it
+        return _cast_vote(comment, user, value)
+
+
+def _cast_vote(comment, user, value):
+    with transaction.atomic():
+        # Locking the comment serializes votes on it, so the tallies read
+        # here are the ones the update below applies to
+        state = Comment.objects.select_for_update().filter(pk=comment.pk).annotate(
+            user_vote=Subquery(
+                CommentVote.objects.filter(comment=OuterRef('pk'), user=user).values('vote')[:1]
+            ),
+        ).values('upvotes', 'downvotes', 'score', 'user_vote').get()
+
+        old = state['user_vote'] or 0
+        new = 0 if old == value else value
+        votes = CommentVote.objects.filter(comment=comment, user=user)
+        if not old:
+            CommentVote.objects.create(comment=comment, user=user, vote=new)
+        elif not new:
+            votes.delete()
+        else:
+            votes.update(vote=new)
+
+        upvotes = int(new == 1) - int(old == 1)
+        downvotes = int(new == -1) - int(old == -1)
+        Comment.objects.filter(pk=comment.pk).update(
+            upvotes=F('upvotes') + upvotes,
+            downvotes=F('downvotes') + downvotes,
+            score=F('score') + new - old,
+            # Tallies are part of what conditional GETs validate
+            updated_at=Now(),
+        )
+        # Cached pages show the tallies
+        purge(f'comments:{comment.post_id}')
+
+    comment.upvotes = state['upvotes'] + upvotes
+    comment.downvotes = state['downvotes'] + downvotes
+    comment.score = state['score'] + new - old
+    return new
+
+
+def _vote_count(value):
+    return Coalesce(Subquery(
+        CommentVote.objects.filter(comment=OuterRef('pk'), vote=value)
+        .values('comment').annotate(total=Count('*')).values('total'),
+        output_field=IntegerField(),
+    ), Value(0))
+
+
+def recount_votes(comments=None, batch_size=BATCH_SIZE, progress=None):
+    """Recompute the tallies of `comments` (default: all) from CommentVote.
+
+    Runs in batches of ids with the counting done by the database.
+    Returns the number of comments updated.
+    """
+    comments = Comment.objects.all() if comments is None else comments
+    ids = comments.order_by('pk').values_list('pk', flat=True)
+    updated = 0
+    last_id = 0
+    while True:
+        batch = list(ids.filter(pk__gt=last_id)[:batch_size])
+        if not batch:
+            return updated
+        with transaction.atomic():
+            Comment.objects.filter(pk__in=batch).update(
+                upvotes=_vote_count(1), downvotes=_vote_count(-1)
+            )
+            Comment.objects.filter(pk__in=batch).update(score=F('upvotes') - F('downvotes'))
+        updated += len(batch)
+        last_id = batch[-1]
+        if progress:
+            progress(updated)
@@ -0,0 +1,31 @@
+"""Gunicorn running the ASGI application on uvicorn workers.
+
+    gunicorn -c gunicorn_asgi.conf.py blog.asgi:application
+
+or `docker compose --profile asgi up`. Each worker runs one event loop.
+The project's middleware is async-capable, so the async views (home,
+post_detail, the comment thread endpoint) run on the loop and wait on their
+concurrent queries without holding a thread. Their ORM calls, the
+process_view hooks and sync views still hop to Django's thread pool for
+as long as each call takes.
+
+Under ASGI every request runs on its own thread, so persistent database
+connections are never reused: set DATABASE_CONN_MAX_AGE=0 and put
+PgBouncer in front of PostgreSQL (DATABASE_PGBOUNCER=1) instead.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+worker_class = 'uvicorn.workers.UvicornWorker'
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() + 1))
+
+# Restart workers now and then so a leak cannot grow forever
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = max_requests // 10
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = timeout
+keepalive = 5
+
+accesslog = '-'
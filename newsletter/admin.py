@@ -1,3 +1,36 @@
 from django.contrib import admin
+from django.db.models import Count, Q
+from .models import Subscriber, Newsletter, Delivery
 
-# Register your models here.
+@admin.register(Subscriber)
+class SubscriberAdmin(admin.ModelAdmin):
+    list_display = ['email', 'is_active', 'subscribed_at']
+    list_filter = ['is_active']
+    search_fields = ['email']
+
+@admin.register(Newsletter)
+class NewsletterAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'status', 'created_at', 'sent_at', 'sent_count', 'failed_count']
+    list_filter = ['status']
+    readonly_fields = ['status', 'sent_at', 'last_subscriber_id']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            sent_count=Count('deliveries', filter=Q(deliveries__status='sent')),
+            failed_count=Count('deliveries', filter=Q(deliveries__status='failed')),
+        )
+    
+    def sent_count(self, obj):
+        return obj.sent_count
+    sent_count.short_description = 'Sent'
+    
+    def failed_count(self, obj):
+        return obj.failed_count
+    failed_count.short_description = 'Failed'
+
+@admin.register(Delivery)
+class DeliveryAdmin(admin.ModelAdmin):
+    list_display = ['newsletter', 'subscriber', 'status', 'sent_at']
+    list_filter = ['status', 'newsletter']
+    search_fields = ['subscriber__email']
+    raw_id_fields = ['newsletter', 'subscriber']
@@ -0,0 +1,204 @@
+"""Batched, resumable newsletter sending.
+
+Active subscribers are streamed in id order. For each batch the Delivery
+rows and the newsletter's `last_subscriber_id` checkpoint are committed
+together *before* anything is sent, so a restarted send continues after the
+last batch it started and never mails anyone twice. Deliveries still
+pending after a crash were possibly sent and are left for inspection.
+The message is rendered once; only the unsubscribe link differs per
+recipient. Mail goes out from a thread pool, each thread keeping its own
+open connection, paced by a shared rate limit.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Delivery, Newsletter, Subscriber
+
+UNSUBSCRIBE_PLACEHOLDER = '__unsubscribe_url__'
+EMAIL_PLACEHOLDER = '__email__'
+
+
+class RateLimiter:
+    """Spaces calls from all threads at least 1/rate seconds apart; 0 disables it"""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class Mailer:
+    """Sends rendered newsletter copies, reusing one mail connection per thread"""
+
+    def __init__(self, newsletter, rate_limit):
+        context = {
+            'newsletter': newsletter,
+            'site_url': settings.SITE_URL,
+            'unsubscribe_url': UNSUBSCRIBE_PLACEHOLDER,
+        }
+        self.subject = newsletter.subject
+        self.text = render_to_string('emails/newsletter.txt', context)
+        self.html = render_to_string('emails/newsletter.html', context)
+        self.unsubscribe_url = settings.SITE_URL + reverse(
+            'newsletter_unsubscribe', args=[EMAIL_PLACEHOLDER]
+        )
+        self.limiter = RateLimiter(rate_limit)
+        self.local = threading.local()
+        self.connections = []
+        self.lock = threading.Lock()
+
+    def _connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = get_connection()
+            connection.open()
+            self.local.connection = connection
+            with self.lock:
+                self.connections.append(connection)
+        return connection
+
+    def _discard_connection(self):
+        connection = getattr(self.local, 'connection', None)
+        self.local.connection = None
+        if connection is not None:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    def build(self, email):
+        url = self.unsubscribe_url.replace(EMAIL_PLACEHOLDER, quote(email))
+        message = EmailMultiAlternatives(
+            subject=self.subject,
+            body=self.text.replace(UNSUBSCRIBE_PLACEHOLDER, url),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[email],
+            headers={'List-Unsubscribe': f'<{url}>'},
+        )
+        message.attach_alternative(self.html.replace(UNSUBSCRIBE_PLACEHOLDER, url), 'text/html')
+        return message
+
+    def send(self, recipients):
+        """Send to [(delivery id, email)]; returns {delivery id: error or None}"""
+        results = {}
+        for delivery_id, email in recipients:
+            self.limiter.wait()
+            try:
+                if not self._connection().send_messages([self.build(email)]):
+                    raise ValueError('Message was not accepted')
+                results[delivery_id] = None
+            except Exception as e:
+                results[delivery_id] = f'{type(e).__name__}: {e}'
+                # Reconnect for the next message in case the connection broke
+                self._discard_connection()
+        return results
+
+    def close(self):
+        for connection in self.connections:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _claim(newsletter, batch):
+    """Create pending deliveries and advance the checkpoint in one transaction"""
+    subscriber_ids = [subscriber_id for subscriber_id, email in batch]
+    with transaction.atomic():
+        existing = set(Delivery.objects.filter(
+            newsletter=newsletter, subscriber_id__in=subscriber_ids
+        ).values_list('subscriber_id', flat=True))
+        deliveries = Delivery.objects.bulk_create([
+            Delivery(newsletter=newsletter, subscriber_id=subscriber_id)
+            for subscriber_id, email in batch
+            if subscriber_id not in existing
+        ])
+        Newsletter.objects.filter(pk=newsletter.pk).update(last_subscriber_id=subscriber_ids[-1])
+    emails = dict(batch)
+    return [(delivery.id, emails[delivery.subscriber_id]) for delivery in deliveries]
+
+
+def _send_batch(executor, mailer, recipients, workers):
+    chunks = [recipients[i::workers] for i in range(workers) if recipients[i::workers]]
+    results = {}
+    for chunk_results in executor.map(mailer.send, chunks):
+        results.update(chunk_results)
+
+    sent = [delivery_id for delivery_id, error in results.items() if error is None]
+    failed = [Delivery(id=delivery_id, status='failed', error=error)
+              for delivery_id, error in results.items() if error is not None]
+    Delivery.objects.filter(id__in=sent).update(status='sent', sent_at=timezone.now(), error='')
+    Delivery.objects.bulk_update(failed, ['status', 'error'])
+    return len(sent), len(failed)
+
+
+def send_newsletter(newsletter, batch_size=None, workers=None, rate_limit=None,
+                    retry_failed=False, progress=None):
+    """Send (or resume sending) a newsletter to every active subscriber.
+
+    With retry_failed, deliveries that failed earlier are attempted again
+    first. Returns (sent, failed) for this run.
+    """
+    batch_size = batch_size or settings.NEWSLETTER_BATCH_SIZE
+    workers = workers or settings.NEWSLETTER_WORKERS
+    rate_limit = settings.NEWSLETTER_RATE_LIMIT if rate_limit is None else rate_limit
+
+    Newsletter.objects.filter(pk=newsletter.pk).update(status='sending')
+    newsletter.refresh_from_db()
+    mailer = Mailer(newsletter, rate_limit)
+    totals = [0, 0]
+
+    def run(batch_recipients):
+        sent, failed = _send_batch(executor, mailer, batch_recipients, workers)
+        totals[0] += sent
+        totals[1] += failed
+        if progress:
+            progress(*totals)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            if retry_failed:
+                retries = newsletter.deliveries.filter(status='failed').order_by('id').values_list(
+                    'id', 'subscriber__email'
+                ).iterator(chunk_size=batch_size)
+                for batch in _batches(retries, batch_size):
+                    run(batch)
+
+            subscribers = Subscriber.objects.filter(
+                is_active=True, id__gt=newsletter.last_subscriber_id
+            ).order_by('id').values_list('id', 'email').iterator(chunk_size=batch_size)
+            for batch in _batches(subscribers, batch_size):
+                recipients = _claim(newsletter, batch)
+                if recipients:
+                    run(recipients)
+    finally:
+        mailer.close()
+
+    Newsletter.objects.filter(pk=newsletter.pk).update(status='sent', sent_at=timezone.now())
+    return tuple(totals)
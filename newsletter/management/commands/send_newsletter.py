@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from newsletter.dispatch import send_newsletter
+from newsletter.models import Newsletter
+
+
+class Command(BaseCommand):
+    help = 'Send a newsletter to all active subscribers, resuming where an interrupted send stopped'
+
+    def add_arguments(self, parser):
+        parser.add_argument('newsletter_id', type=int)
+        parser.add_argument('--batch-size', type=int, default=settings.NEWSLETTER_BATCH_SIZE)
+        parser.add_argument('--workers', type=int, default=settings.NEWSLETTER_WORKERS)
+        parser.add_argument('--rate', type=float, default=settings.NEWSLETTER_RATE_LIMIT,
+                            help='Maximum emails per second across all workers; 0 for no limit')
+        parser.add_argument('--retry-failed', action='store_true',
+                            help='Also retry deliveries that failed in an earlier run')
+
+    def handle(self, *args, **options):
+        try:
+            newsletter = Newsletter.objects.get(pk=options['newsletter_id'])
+        except Newsletter.DoesNotExist:
+            raise CommandError(f"Newsletter {options['newsletter_id']} does not exist")
+
+        if newsletter.last_subscriber_id:
+            self.stdout.write(f'Resuming after subscriber {newsletter.last_subscriber_id}...')
+
+        sent, failed = send_newsletter(
+            newsletter,
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            rate_limit=options['rate'],
+            retry_failed=options['retry_failed'],
+            progress=lambda sent, failed: self.stdout.write(f'Sent {sent}, failed {failed}...'),
+        )
+        style = self.style.SUCCESS if not failed else self.style.WARNING
+        self.stdout.write(style(f'Sent "{newsletter.subject}" to {sent} subscribers, {failed} failed.'))
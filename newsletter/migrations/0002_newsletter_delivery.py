@@ -0,0 +1,71 @@
+# Generated by Django 4.2.7 on 2026-10-18 06:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def copy_sent_to(apps, schema_editor):
+    Newsletter = apps.get_model('newsletter', 'Newsletter')
+    Delivery = apps.get_model('newsletter', 'Delivery')
+    SentTo = Newsletter.sent_to.through
+    Newsletter.objects.filter(sent_at__isnull=False).update(status='sent')
+    sent_at = dict(Newsletter.objects.values_list('id', 'sent_at'))
+    Delivery.objects.bulk_create([
+        Delivery(newsletter_id=newsletter_id, subscriber_id=subscriber_id,
+                 status='sent', sent_at=sent_at[newsletter_id])
+        for newsletter_id, subscriber_id in SentTo.objects.values_list('newsletter_id', 'subscriber_id')
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('newsletter', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='newsletter',
+            name='last_subscriber_id',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='newsletter',
+            name='status',
+            field=models.CharField(choices=[('draft', 'Draft'), ('sending', 'Sending'), ('sent', 'Sent')], default='draft', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='Delivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('error', models.TextField(blank=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('newsletter', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='newsletter.newsletter')),
+                ('subscriber', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='newsletter.subscriber')),
+            ],
+            options={
+                'verbose_name_plural': 'Deliveries',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='delivery',
+            index=models.Index(fields=['newsletter', 'status'], name='newsletter__newslet_cbdba3_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='delivery',
+            unique_together={('newsletter', 'subscriber')},
+        ),
+        # An existing many-to-many field cannot be given a through model in
+        # place: copy its rows into Delivery and recreate the field
+        migrations.RunPython(copy_sent_to, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='newsletter',
+            name='sent_to',
+        ),
+        migrations.AddField(
+            model_name='newsletter',
+            name='sent_to',
+            field=models.ManyToManyField(blank=True, through='newsletter.Delivery', to='newsletter.subscriber'),
+        ),
+    ]
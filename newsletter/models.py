@@ -13,11 +13,44 @@ class Subscriber(models.Model):
         return self.email
 
 class Newsletter(models.Model):
+    STATUS_CHOICES = (
+        ('draft', 'Draft'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+    )
+    
     subject = models.CharField(max_length=200)
     content = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='draft')
     sent_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    sent_to = models.ManyToManyField(Subscriber, blank=True)
+    sent_to = models.ManyToManyField(Subscriber, through='Delivery', blank=True)
+    # Highest subscriber id handed to the mailer, so a restarted send resumes after it
+    last_subscriber_id = models.BigIntegerField(default=0, editable=False)
     
     def __str__(self):
         return self.subject
+
+class Delivery(models.Model):
+    """One newsletter to one subscriber; written before sending so nobody gets it twice"""
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    )
+    
+    newsletter = models.ForeignKey(Newsletter, on_delete=models.CASCADE, related_name='deliveries')
+    subscriber = models.ForeignKey(Subscriber, on_delete=models.CASCADE, related_name='deliveries')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name_plural = 'Deliveries'
+        unique_together = ['newsletter', 'subscriber']
+        indexes = [
+            models.Index(fields=['newsletter', 'status']),
+        ]
+    
+    def __str__(self):
+        return f'{self.newsletter} to {self.subscriber} ({self.status})'
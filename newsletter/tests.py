@@ -1,3 +1,76 @@
+from unittest import mock
+
+from django.core import mail
 from django.test import TestCase
 
-# Create your tests here.
+from . import dispatch
+from .dispatch import send_newsletter
+from .models import Delivery, Newsletter, Subscriber
+
+
+class SendNewsletterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.subscribers = [
+            Subscriber.objects.create(email=f'reader{number}@example.com') for number in range(5)
+        ]
+        Subscriber.objects.create(email='gone@example.com', is_active=False)
+        cls.newsletter = Newsletter.objects.create(subject='News', content='<p>Hello</p>')
+
+    def send(self, **kwargs):
+        return send_newsletter(self.newsletter, batch_size=2, workers=1, rate_limit=0, **kwargs)
+
+    def recipients(self):
+        return sorted(email for message in mail.outbox for email in message.to)
+
+    def test_resume_skips_recipients_of_the_interrupted_run(self):
+        real = dispatch._send_batch
+        batches = []
+
+        def crash_on_second_batch(*args):
+            batches.append(args)
+            if len(batches) == 2:
+                raise RuntimeError('Worker killed')
+            return real(*args)
+
+        with mock.patch.object(dispatch, '_send_batch', side_effect=crash_on_second_batch):
+            with self.assertRaises(RuntimeError):
+                self.send()
+        self.assertEqual(self.recipients(), ['reader0@example.com', 'reader1@example.com'])
+
+        # The second batch was claimed before the crash and may have gone out,
+        # so only the subscribers after it are mailed
+        self.assertEqual(self.send(), (1, 0))
+        self.assertEqual(
+            self.recipients(), ['reader0@example.com', 'reader1@example.com', 'reader4@example.com'],
+        )
+        statuses = dict(Delivery.objects.values_list('subscriber__email', 'status'))
+        self.assertEqual(statuses, {
+            'reader0@example.com': 'sent',
+            'reader1@example.com': 'sent',
+            'reader2@example.com': 'pending',
+            'reader3@example.com': 'pending',
+            'reader4@example.com': 'sent',
+        })
+        self.newsletter.refresh_from_db()
+        self.assertEqual(self.newsletter.status, 'sent')
+
+    def test_existing_deliveries_are_not_sent_again(self):
+        Delivery.objects.create(newsletter=self.newsletter, subscriber=self.subscribers[3], status='sent')
+        self.assertEqual(self.send(), (4, 0))
+        self.assertNotIn('reader3@example.com', self.recipients())
+        self.assertEqual(self.send(), (0, 0))
+        self.assertEqual(len(mail.outbox), 4)
+
+    def test_retry_failed_sends_only_failed_deliveries(self):
+        with mock.patch(
+            'django.core.mail.backends.locmem.EmailBackend.send_messages', return_value=0,
+        ):
+            self.assertEqual(self.send(), (0, 5))
+        self.assertEqual(Delivery.objects.filter(status='failed').count(), 5)
+
+        Delivery.objects.filter(subscriber=self.subscribers[0]).update(status='sent')
+        self.assertEqual(self.send(retry_failed=True), (4, 0))
+        self.assertNotIn('reader0@example.com', self.recipients())
+        self.assertFalse(Delivery.objects.exclude(status='sent').exists())
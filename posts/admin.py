@@ -14,6 +14,7 @@ class PostAdmin(admin.ModelAdmin):
     date_hierarchy = 'published_date'
     ordering = ['-published_date']
     inlines = [PostImageInline]
+    readonly_fields = ['word_count', 'read_time']
     
     fieldsets = (
         (None, {
@@ -26,7 +27,7 @@ class PostAdmin(admin.ModelAdmin):
             'fields': ('status', 'published_date')
         }),
         ('Statistics', {
-            'fields': ('view_count',)
+            'fields': ('view_count', 'word_count', 'read_time')
         }),
     )
 
@@ -0,0 +1,190 @@
+import random
+import statistics
+import subprocess
+import threading
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import OperationalError, connections, transaction
+from django.db.models import F
+from django.test import Client
+from django.urls import reverse
+from taggit.models import Tag
+
+from blog.concurrent import execute_wrapper
+from blog.middleware import QueryRecorder
+from categories.models import Category
+from comments.models import Comment
+from .models import Post
+from .sample_data import SampleDataGenerator
+
+
+def seed(scale, seed_value=0):
+    """Create a dataset of `scale` posts with proportional users, tags and comments.
+
+    Rows are bulk inserted, so the search and related-posts indexes have to
+    be rebuilt afterwards.
+    """
+    SampleDataGenerator(seed=seed_value).generate(
+        users=max(5, scale // 50),
+        categories=6,
+        tags=max(10, scale // 20),
+        posts=scale,
+        comments=scale * 2,
+        votes=scale * 5,
+        subscribers=0,
+    )
+
+
+def benchmark_urls():
+    """(name, url) pairs for every public read endpoint"""
+    post = Post.objects.filter(status='published').order_by('-view_count').first()
+    category = Category.objects.order_by('id').first()
+    tag = Tag.objects.order_by('id').first()
+    thread = Comment.objects.filter(replies__isnull=False).order_by('id').first()
+    return [
+        ('home', reverse('home')),
+        ('post_list', reverse('post_list')),
+        ('post_detail', post.get_absolute_url()),
+        ('search', reverse('search') + '?q=django+cache'),
+        ('trending', reverse('trending')),
+        ('category_list', reverse('category_list')),
+        ('category_posts', reverse('category_posts', args=[category.slug])),
+        ('tag_list', reverse('tag_list')),
+        ('tag_posts', reverse('tag_posts', args=[tag.slug])),
+        ('author_list', reverse('author_list')),
+        ('comment_thread', reverse('comment_thread', args=[thread.id])),
+    ]
+
+
+def _percentile(samples, percent):
+    if len(samples) == 1:
+        return samples[0]
+    return statistics.quantiles(samples, n=100, method='inclusive')[percent - 1]
+
+
+def measure(url, iterations, warmup, cold=False):
+    """Latency percentiles, query count and allocations for one URL"""
+    client = Client(raise_request_exception=False)
+    for _ in range(warmup):
+        client.get(url)
+
+    timings = []
+    queries = []
+    status = None
+    for _ in range(iterations):
+        if cold:
+            cache.clear()
+        # Counts the queries of blog.concurrent workers as well
+        recorder = QueryRecorder()
+        with execute_wrapper(recorder):
+            start = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+        queries.append(recorder.count)
+        status = response.status_code
+
+    # Allocations are measured separately; tracemalloc skews timings
+    if cold:
+        cache.clear()
+    tracemalloc.start()
+    client.get(url)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'status': status,
+        'p50_ms': round(_percentile(timings, 50), 3),
+        'p90_ms': round(_percentile(timings, 90), 3),
+        'p99_ms': round(_percentile(timings, 99), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'queries': max(queries),
+        'peak_alloc_kb': round(peak / 1024, 1),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, current, threshold):
+    """Views whose p50 latency or query count regressed past the threshold"""
+    regressions = []
+    for name, result in current['results'].items():
+        before = baseline['results'].get(name)
+        if not before:
+            continue
+        if result['queries'] > before['queries']:
+            regressions.append((name, 'queries', before['queries'], result['queries']))
+        if before['p50_ms'] and result['p50_ms'] > before['p50_ms'] * (1 + threshold):
+            regressions.append((name, 'p50_ms', before['p50_ms'], result['p50_ms']))
+    return regressions
+
+
+def _read_page(post_id):
+    """The queries behind an uncached post page: the post and its comments"""
+    post = Post.objects.select_related('author', 'category').get(pk=post_id)
+    list(Comment.objects.filter(post_id=post.id, active=True).select_related('author')[:50])
+
+
+def _write_views(post_ids):
+    """One view count flush: a transaction updating a batch of posts"""
+    with transaction.atomic():
+        Post.objects.filter(id__in=post_ids).update(view_count=F('view_count') + 1)
+
+
+def measure_concurrency(readers, writers, duration, batch_size=500):
+    """Read throughput and latency while writer threads keep flushing view counts.
+
+    Every thread uses its own connection, as a threaded server would.
+    """
+    post_ids = list(Post.objects.filter(status='published').values_list('id', flat=True))
+    deadline = time.perf_counter() + duration
+    timings = []
+    writes = []
+    errors = []
+
+    def worker(work, samples):
+        rng = random.Random()
+        try:
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    work(rng)
+                except OperationalError:
+                    errors.append(1)
+                    continue
+                samples.append((time.perf_counter() - start) * 1000)
+        finally:
+            connections.close_all()
+
+    threads = [
+        threading.Thread(target=worker, args=(lambda rng: _read_page(rng.choice(post_ids)), timings))
+        for _ in range(readers)
+    ] + [
+        threading.Thread(target=worker, args=(
+            lambda rng: _write_views(rng.sample(post_ids, min(batch_size, len(post_ids)))), writes,
+        ))
+        for _ in range(writers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return {
+        'reads_per_s': round(len(timings) / duration, 1),
+        'read_p50_ms': round(_percentile(timings, 50), 3) if timings else None,
+        'read_p99_ms': round(_percentile(timings, 99), 3) if timings else None,
+        'writes_per_s': round(len(writes) / duration, 1),
+        'write_p50_ms': round(_percentile(writes, 50), 3) if writes else None,
+        'errors': len(errors),
+    }
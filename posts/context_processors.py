@@ -1,18 +1,66 @@
 from categories.models import Category
 from taggit.models import Tag
+from django.conf import settings
+from django.core.cache import cache
 from django.db.models import Count, Q
+from django.utils.functional import SimpleLazyObject
 
-def category_context(request):
-    """Add categories to all templates"""
+from blog.pagecache import add_surrogate_keys
+from blog.replicas import use_primary
+
+SIDEBAR_VERSION_KEY = 'posts:sidebar:version'
+
+
+def _sidebar_key():
+    version = cache.get_or_set(SIDEBAR_VERSION_KEY, 1, None)
+    return f'posts:sidebar:{version}'
+
+
+def build_sidebar():
+    """Navigation categories and popular tags as plain dicts"""
     categories = Category.objects.annotate(
         post_count=Count('posts', filter=Q(posts__status='published'))
-    ).filter(post_count__gt=0)[:10]
+    ).filter(post_count__gt=0).values('name', 'slug', 'color', 'post_count')[:10]
     
     popular_tags = Tag.objects.annotate(
         post_count=Count('taggit_taggeditem_items')
     ).order_by('-post_count')[:15]
     
     return {
-        'categories': categories,
-        'popular_tags': popular_tags,
-    }    
\ No newline at end of file
+        'categories': list(categories),
+        'popular_tags': [
+            {'name': t.name, 'slug': t.slug, 'post_count': t.post_count} for t in popular_tags
+        ],
+    }
+
+
+def get_sidebar():
+    """Return the cached sidebar data for the current content version"""
+    key = _sidebar_key()
+    sidebar = cache.get(key)
+    if sidebar is None:
+        with use_primary():
+            sidebar = build_sidebar()
+        cache.set(key, sidebar, settings.SIDEBAR_CACHE_TTL)
+    return sidebar
+
+
+def invalidate_sidebar():
+    """Move to a new version; entries for old versions expire on their own"""
+    try:
+        cache.incr(SIDEBAR_VERSION_KEY)
+    except ValueError:
+        cache.set(SIDEBAR_VERSION_KEY, 1, None)
+
+
+def category_context(request):
+    """Add categories to all templates"""
+    # Lazy, so templates that never use them cost no cache or database work
+    def sidebar(section):
+        add_surrogate_keys(request, 'sidebar')
+        return get_sidebar()[section]
+
+    return {
+        'categories': SimpleLazyObject(lambda: sidebar('categories')),
+        'popular_tags': SimpleLazyObject(lambda: sidebar('popular_tags')),
+    }
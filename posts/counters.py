@@ -0,0 +1,159 @@
+import logging
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from .models import Post
+from .trending import bucket_hour, record_view_buckets
+
+logger = logging.getLogger(__name__)
+
+# Views are buffered in the cache in fixed time windows of
+# VIEW_COUNT_FLUSH_INTERVAL seconds. Each window holds one atomic counter per
+# post plus an append-only log of the post ids it has seen, so a flush can
+# find every pending counter without scanning the posts table.
+KEY_PREFIX = 'posts:views'
+FLUSHED_KEY = f'{KEY_PREFIX}:flushed'
+LOCK_KEY = f'{KEY_PREFIX}:lock'
+
+# Backends that keep entries inside one process; a separate flush process
+# (`manage.py flush_view_counts`) cannot see what the web workers buffered
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# How many windows buffered counts survive in the cache without a flush
+RETENTION_WINDOWS = 100
+
+UPDATE_BATCH_SIZE = 500
+
+_last_flush = time.monotonic()
+
+
+def _window(now=None):
+    return int((now or time.time()) // settings.VIEW_COUNT_FLUSH_INTERVAL)
+
+
+def _timeout():
+    return settings.VIEW_COUNT_FLUSH_INTERVAL * RETENTION_WINDOWS
+
+
+def _count_key(window, post_id):
+    return f'{KEY_PREFIX}:{window}:count:{post_id}'
+
+
+def _length_key(window):
+    return f'{KEY_PREFIX}:{window}:length'
+
+
+def _slot_key(window, slot):
+    return f'{KEY_PREFIX}:{window}:slot:{slot}'
+
+
+def cache_is_shared():
+    """Whether buffered views are visible to other processes"""
+    return settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES
+
+
+def record_view(post_id):
+    """Buffer one view of a post; it reaches the database on the next flush"""
+    window = _window()
+    timeout = _timeout()
+    count_key = _count_key(window, post_id)
+
+    if cache.add(count_key, 1, timeout):
+        # First view of this post in the window: append it to the id log
+        length_key = _length_key(window)
+        cache.add(length_key, 0, timeout)
+        slot = cache.incr(length_key)
+        cache.set(_slot_key(window, slot), post_id, timeout)
+    else:
+        try:
+            cache.incr(count_key)
+        except ValueError:
+            # The counter expired between add() and incr()
+            cache.add(count_key, 1, timeout)
+
+    if settings.VIEW_COUNT_INLINE_FLUSH:
+        _maybe_flush()
+
+
+def _maybe_flush():
+    """Flush from the request path at most once per interval per process"""
+    global _last_flush
+    now = time.monotonic()
+    if now - _last_flush < settings.VIEW_COUNT_FLUSH_INTERVAL:
+        return
+    _last_flush = now
+    try:
+        flush_view_counts()
+    except Exception:
+        # The view itself succeeded; the buffered counts wait for the next flush
+        logger.exception('Inline view count flush failed')
+
+
+def _flush_window(window):
+    length = cache.get(_length_key(window)) or 0
+    if not length:
+        return 0
+
+    slots = cache.get_many([_slot_key(window, slot) for slot in range(1, length + 1)])
+    count_keys = {_count_key(window, post_id): post_id for post_id in slots.values()}
+    counts = cache.get_many(list(count_keys))
+
+    # Take the window out of the cache before writing it, so a crash after
+    # the commit cannot apply it twice; a failed write puts it back. Closed
+    # windows get no new views in between.
+    entries = {_length_key(window): length, **slots, **counts}
+    cache.delete_many(list(entries))
+    try:
+        _apply_counts(window, {count_keys[key]: count for key, count in counts.items()})
+    except Exception:
+        cache.set_many(entries, _timeout())
+        raise
+    return sum(counts.values())
+
+
+def _apply_counts(window, counts):
+    # Posts that gained the same number of views share one UPDATE
+    by_increment = defaultdict(list)
+    for post_id, count in counts.items():
+        by_increment[count].append(post_id)
+
+    with transaction.atomic():
+        for increment, post_ids in by_increment.items():
+            for start in range(0, len(post_ids), UPDATE_BATCH_SIZE):
+                Post.objects.filter(
+                    id__in=post_ids[start:start + UPDATE_BATCH_SIZE]
+                ).update(view_count=F('view_count') + increment)
+        record_view_buckets(bucket_hour(window * settings.VIEW_COUNT_FLUSH_INTERVAL), counts)
+
+
+def flush_view_counts():
+    """Write buffered views from closed windows to Post.view_count.
+
+    The window just before the current one is left alone so requests that
+    straddle a window boundary still land before it is flushed. Returns the
+    number of views written, or None if another flush is already running.
+    """
+    interval = settings.VIEW_COUNT_FLUSH_INTERVAL
+    if not cache.add(LOCK_KEY, 1, interval * 10):
+        return None
+
+    try:
+        current = _window()
+        oldest = current - RETENTION_WINDOWS
+        last_flushed = max(cache.get(FLUSHED_KEY, oldest), oldest)
+
+        flushed = 0
+        for window in range(last_flushed + 1, current - 1):
+            flushed += _flush_window(window)
+            cache.set(FLUSHED_KEY, window, None)
+        return flushed
+    finally:
+        cache.delete(LOCK_KEY)
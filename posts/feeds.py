@@ -0,0 +1,134 @@
+"""Atom and RSS feeds for the site, categories, tags and authors.
+
+Feeds are built from a values() projection of the newest published posts
+(no model instances, no templates) with django.utils.feedgenerator and the
+XML is cached per feed. A cached feed records the blog.pagecache surrogate
+key versions it was built from, so the purge signals that already drop
+cached pages when a post, category, tag or author changes also retire
+exactly the feeds showing it. A poll of an unchanged feed is cache reads
+only, and a matching If-None-Match gets a 304.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed, Rss201rev2Feed
+
+from blog.pagecache import key_versions, post_keys
+from blog.replicas import use_primary
+from categories.models import Category
+from taggit.models import Tag
+from .models import Post
+
+FORMATS = {
+    'atom': Atom1Feed,
+    'rss': Rss201rev2Feed,
+}
+
+FEED_FIELDS = (
+    'id', 'title', 'slug', 'published_date', 'updated_at', 'summary',
+    'author_id', 'author__username', 'category_id', 'category__name',
+)
+
+
+class FeedNotFound(Exception):
+    pass
+
+
+def _scope(kind, slug):
+    """(title, link path, post filter, surrogate keys) for one feed"""
+    if kind is None:
+        return 'Latest posts', '/', {}, ['posts']
+    if kind == 'category':
+        category = Category.objects.filter(slug=slug).values('id', 'name').first()
+        if category is None:
+            raise FeedNotFound
+        return (
+            category['name'], reverse('category_posts', args=[slug]),
+            {'category_id': category['id']},
+            [f"category:{category['id']}", f"category-posts:{category['id']}"],
+        )
+    if kind == 'tag':
+        tag = Tag.objects.filter(slug=slug).values('id', 'name').first()
+        if tag is None:
+            raise FeedNotFound
+        return (
+            f"Posts tagged {tag['name']}", reverse('tag_posts', args=[slug]),
+            {'tags__id': tag['id']},
+            [f"tag:{tag['id']}", f"tag-posts:{tag['id']}"],
+        )
+    if kind == 'author':
+        author = get_user_model().objects.filter(username=slug, is_active=True).values('id').first()
+        if author is None:
+            raise FeedNotFound
+        return (
+            f'Posts by {slug}', reverse('user_profile', args=[slug]),
+            {'author_id': author['id']},
+            [f"author:{author['id']}", f"author-posts:{author['id']}"],
+        )
+    raise FeedNotFound
+
+
+def _feed_key(feed_format, kind, slug):
+    return 'posts:feed:' + hashlib.md5(f'{feed_format}:{kind}:{slug}'.encode()).hexdigest()
+
+
+def _feed_path(feed_format, kind, slug):
+    if kind is None:
+        return reverse('feed', args=[feed_format])
+    return reverse('scoped_feed', args=[kind, slug, feed_format])
+
+
+def build_feed(feed_format, kind=None, slug=None):
+    """Render a feed; returns (xml, versions of the surrogate keys it depends on)"""
+    title, link, filters, keys = _scope(kind, slug)
+    # Read before the posts, so a change committed meanwhile still retires the result
+    versions = key_versions(keys)
+    rows = list(
+        Post.objects.filter(status='published', **filters)
+        .order_by('-published_date', '-id')
+        .values(*FEED_FIELDS)[:settings.FEED_ITEMS]
+    )
+
+    feed = FORMATS[feed_format](
+        title=title,
+        link=settings.SITE_URL + link,
+        description=title,
+        language='en',
+        feed_url=settings.SITE_URL + _feed_path(feed_format, kind, slug),
+    )
+    for row in rows:
+        url = settings.SITE_URL + Post(published_date=row['published_date'], slug=row['slug']).get_absolute_url()
+        feed.add_item(
+            title=row['title'],
+            link=url,
+            unique_id=url,
+            description=row['summary'],
+            author_name=row['author__username'],
+            pubdate=row['published_date'],
+            updateddate=row['updated_at'],
+            categories=[row['category__name']] if row['category__name'] else None,
+        )
+
+    items = [Post(id=row['id'], author_id=row['author_id'], category_id=row['category_id']) for row in rows]
+    return feed.writeString('utf-8'), {**key_versions(post_keys(items)), **versions}
+
+
+def get_feed(feed_format, kind=None, slug=None):
+    """Cached {'xml', 'etag', 'keys'} for a feed, rebuilt when a post in it changes"""
+    key = _feed_key(feed_format, kind, slug)
+    entry = cache.get(key)
+    if entry is not None and key_versions(entry['keys']) == entry['keys']:
+        return entry
+
+    with use_primary():
+        xml, versions = build_feed(feed_format, kind, slug)
+    entry = {
+        'xml': xml,
+        'etag': '"%s"' % hashlib.md5(xml.encode()).hexdigest(),
+        'keys': versions,
+    }
+    cache.set(key, entry, settings.FEED_CACHE_TIMEOUT)
+    return entry
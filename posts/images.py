@@ -0,0 +1,139 @@
+"""Resized WebP and JPEG derivatives of uploaded images.
+
+Derivatives are stored under IMAGE_DERIVATIVES_DIR in media storage, named
+after a hash of the source file's content, so identical uploads share them
+and the URLs never change meaning (they can be cached forever by a CDN).
+A manifest describing the variants of each source file is kept in the
+cache; `get_derivatives` builds anything missing on first use, and the
+generate_image_derivatives command backfills the whole media tree.
+"""
+import hashlib
+import posixpath
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+}
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tif', '.tiff')
+
+# Cached when a source cannot be read, so broken images are not retried on every render
+MISSING = 'missing'
+
+
+def _manifest_key(name):
+    return 'image-derivatives:' + hashlib.md5(name.encode()).hexdigest()
+
+
+def _variant_name(digest, width, extension):
+    return f'{settings.IMAGE_DERIVATIVES_DIR}/{digest[:2]}/{digest}-{width}w.{extension}'
+
+
+def _target_widths(width):
+    # Never upscale; the largest variant is the original width, capped
+    largest = min(width, max(settings.IMAGE_DERIVATIVE_WIDTHS))
+    return [w for w in sorted(settings.IMAGE_DERIVATIVE_WIDTHS) if w < largest] + [largest]
+
+
+def _encode(image, width, image_format):
+    height = max(1, round(image.height * width / image.width))
+    resized = image.resize((width, height), Image.LANCZOS) if width != image.width else image
+    if image_format == 'JPEG' and resized.mode != 'RGB':
+        if 'A' in resized.getbands():
+            background = Image.new('RGB', resized.size, (255, 255, 255))
+            background.paste(resized, mask=resized.getchannel('A'))
+            resized = background
+        else:
+            resized = resized.convert('RGB')
+    output = BytesIO()
+    resized.save(output, image_format, quality=settings.IMAGE_DERIVATIVE_QUALITY,
+                 optimize=image_format == 'JPEG', progressive=image_format == 'JPEG')
+    return output.getvalue()
+
+
+def generate_derivatives(name, storage=default_storage, force=False):
+    """Create every variant of the stored image `name`; returns its manifest"""
+    with storage.open(name, 'rb') as source:
+        data = source.read()
+    digest = hashlib.sha256(data).hexdigest()[:32]
+
+    image = Image.open(BytesIO(data))
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        transparent = 'transparency' in image.info or 'A' in image.getbands()
+        image = image.convert('RGBA' if transparent else 'RGB')
+
+    variants = {extension: [] for extension in FORMATS}
+    for width in _target_widths(image.width):
+        for extension, (image_format, _) in FORMATS.items():
+            variant = _variant_name(digest, width, extension)
+            exists = storage.exists(variant)
+            if exists and force:
+                storage.delete(variant)
+                exists = False
+            if not exists:
+                variant = storage.save(variant, ContentFile(_encode(image, width, image_format)))
+            variants[extension].append((width, storage.url(variant)))
+
+    return {
+        'src': storage.url(name),
+        'width': image.width,
+        'height': image.height,
+        'variants': variants,
+    }
+
+
+def get_derivatives(image):
+    """Manifest for an ImageField file, storage name or manifest; None if unavailable"""
+    if not image:
+        return None
+    if isinstance(image, dict):
+        return image
+    name = getattr(image, 'name', image)
+    storage = getattr(image, 'storage', default_storage)
+
+    key = _manifest_key(name)
+    manifest = cache.get(key)
+    if manifest is None:
+        try:
+            manifest = generate_derivatives(name, storage)
+        except (OSError, UnidentifiedImageError, Image.DecompressionBombError, ValueError):
+            cache.set(key, MISSING, settings.IMAGE_MANIFEST_MISSING_TTL)
+            return None
+        cache.set(key, manifest, settings.IMAGE_MANIFEST_TTL)
+    return None if manifest == MISSING else manifest
+
+
+def rebuild_derivatives(name, storage=default_storage, force=False):
+    """Generate the variants of `name` and refresh its cached manifest"""
+    manifest = generate_derivatives(name, storage, force=force)
+    cache.set(_manifest_key(name), manifest, settings.IMAGE_MANIFEST_TTL)
+    return manifest
+
+
+def closest_variant(manifest, width, extension='jpeg'):
+    """URL of the smallest variant at least `width` wide, else the largest"""
+    variants = manifest['variants'][extension]
+    for variant_width, url in variants:
+        if variant_width >= width:
+            return url
+    return variants[-1][1]
+
+
+def iter_source_images(storage=default_storage, directory=''):
+    """Storage names of every image under `directory`, skipping the derivatives"""
+    directories, files = storage.listdir(directory)
+    for filename in files:
+        if filename.lower().endswith(IMAGE_EXTENSIONS):
+            yield posixpath.join(directory, filename) if directory else filename
+    for subdirectory in directories:
+        path = posixpath.join(directory, subdirectory) if directory else subdirectory
+        if path != settings.IMAGE_DERIVATIVES_DIR:
+            yield from iter_source_images(storage, path)
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Recompute stored plain text, summary, word count and read time for posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fields = list(Post.TEXT_STATS_FIELDS)
+        posts = Post.objects.only('id', 'content', 'excerpt').order_by('id')
+
+        updated = 0
+        last_id = 0
+        while True:
+            batch = list(posts.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            for post in batch:
+                post.update_text_stats()
+            # bulk_update skips save() and its per-post signal handlers
+            Post.objects.bulk_update(batch, fields)
+            updated += len(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f'Updated {updated} posts...')
+
+        self.stdout.write(self.style.SUCCESS(f'Backfilled text stats for {updated} posts.'))
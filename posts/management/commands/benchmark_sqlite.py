@@ -0,0 +1,82 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import override_settings
+
+from posts import benchmarks
+
+# Django's stock SQLite behaviour next to the settings in blog/settings.py
+MODES = {
+    'stock': {
+        'SQLITE_PRAGMAS': {'journal_mode': 'delete', 'synchronous': 'full'},
+        'SQLITE_IMMEDIATE_TRANSACTIONS': False,
+    },
+    'tuned': {
+        'SQLITE_PRAGMAS': settings.SQLITE_PRAGMAS,
+        'SQLITE_IMMEDIATE_TRANSACTIONS': settings.SQLITE_IMMEDIATE_TRANSACTIONS,
+    },
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway SQLite database file and measure read throughput while '
+        'other threads write view counts, with stock and tuned connection settings'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=1000, help='Number of posts to seed')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--readers', type=int, default=4, help='Concurrent reading threads')
+        parser.add_argument('--writers', type=int, default=1, help='Concurrent writing threads')
+        parser.add_argument('--duration', type=float, default=5, help='Seconds to run each mode for')
+        parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+        parser.add_argument('--output', help='Write results to this JSON file')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('The default database is not SQLite')
+
+        with tempfile.TemporaryDirectory() as directory:
+            # A file, not the in-memory test database: locking is what is measured
+            connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                self.stdout.write(f"Seeding {options['scale']} posts...")
+                benchmarks.seed(options['scale'], options['seed'])
+                results = {mode: self.run(mode, options) for mode in options['modes']}
+            finally:
+                connections.close_all()
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps({
+                'revision': benchmarks.git_revision(),
+                'readers': options['readers'],
+                'writers': options['writers'],
+                'duration': options['duration'],
+                'results': results,
+            }, indent=2))
+            self.stdout.write(f"Wrote {options['output']}")
+
+    def run(self, mode, options):
+        # Pragmas are applied when a connection opens
+        connections.close_all()
+        with override_settings(**MODES[mode]):
+            result = benchmarks.measure_concurrency(
+                options['readers'], options['writers'], options['duration'],
+            )
+            connections.close_all()
+
+        style = self.style.WARNING if result['errors'] else self.style.SUCCESS
+        self.stdout.write(style(
+            f"{mode:<6} {result['reads_per_s']:>9.1f} reads/s  "
+            f"p50 {result['read_p50_ms'] or 0:>7.2f}ms  p99 {result['read_p99_ms'] or 0:>8.2f}ms  "
+            f"{result['writes_per_s']:>7.1f} writes/s  {result['errors']} errors"
+        ))
+        return result
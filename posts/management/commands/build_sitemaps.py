@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from blog.sitemaps import build_sitemaps
+
+
+class Command(BaseCommand):
+    help = 'Write the sitemap index and every sitemap shard that changed since the last build'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Ignore the stored watermarks and rewrite every shard')
+
+    def handle(self, *args, **options):
+        written = build_sitemaps(
+            full=options['full'],
+            progress=lambda section, shard: self.stdout.write(f'Wrote {section} shard {shard}'),
+        )
+        self.stdout.write(self.style.SUCCESS(f'Sitemaps up to date, {written} shards written.'))
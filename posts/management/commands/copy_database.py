@@ -0,0 +1,85 @@
+from django.apps import apps
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.core.serializers import sort_dependencies
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+SOURCE_ALIAS = 'copy_source'
+
+
+class Command(BaseCommand):
+    help = 'Copy every row of a SQLite database into the (migrated) target database, e.g. PostgreSQL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Path of the SQLite database file to copy from')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help='Target database alias; its current rows are deleted first')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Rows read and inserted per batch')
+
+    def handle(self, *args, **options):
+        target = options['database']
+        chunk_size = options['chunk_size']
+        connections.databases[SOURCE_ALIAS] = {
+            **connections.databases[target],
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': options['source'],
+            'OPTIONS': {},
+        }
+        if connections[target].vendor == 'sqlite' and \
+                str(connections.databases[target]['NAME']) == options['source']:
+            raise CommandError('The source and target databases are the same')
+
+        models = self.models()
+        # Content types and permissions come across with their ids, so drop
+        # the ones migrate created instead of letting flush recreate them
+        call_command('flush', database=target, interactive=False, inhibit_post_migrate=True, verbosity=0)
+
+        # PostgreSQL checks foreign keys at commit, so rows can go in in any order
+        with transaction.atomic(using=target):
+            for model in models:
+                copied = self.copy_model(model, target, chunk_size)
+                if copied:
+                    self.stdout.write(f'{model._meta.label}: {copied} rows')
+
+            connection = connections[target]
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(no_style(), models):
+                    cursor.execute(sql)
+
+        connections[SOURCE_ALIAS].close()
+        del connections.databases[SOURCE_ALIAS]
+
+        if target == DEFAULT_DB_ALIAS:
+            # The full-text index is a raw table specific to each backend
+            call_command('rebuild_search_index', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS('Database copied.'))
+
+    def models(self):
+        app_list = {config: None for config in apps.get_app_configs()}
+        models = sort_dependencies(app_list.items(), allow_cycles=True)
+        # Implicit many-to-many tables are not in the serializer's list
+        for model in apps.get_models(include_auto_created=True):
+            if model._meta.auto_created and model not in models:
+                models.append(model)
+        return [
+            model for model in models
+            if model._meta.managed and not model._meta.proxy
+        ]
+
+    def copy_model(self, model, target, chunk_size):
+        """Stream rows in primary key order, inserting them a chunk at a time"""
+        rows = model._base_manager.using(SOURCE_ALIAS).order_by('pk').iterator(chunk_size=chunk_size)
+        chunk = []
+        copied = 0
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                model._base_manager.using(target).bulk_create(chunk)
+                copied += len(chunk)
+                chunk = []
+        if chunk:
+            model._base_manager.using(target).bulk_create(chunk)
+            copied += len(chunk)
+        return copied
@@ -1,9 +1,14 @@
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
 from categories.models import Category
+from posts.context_processors import invalidate_sidebar
 from posts.models import Post
+from posts.sample_data import SampleDataGenerator
+from posts.snapshot import invalidate_home_snapshot
 from taggit.models import Tag
 import random
+import time
 from django.utils import timezone
 from datetime import timedelta
 
@@ -12,7 +17,28 @@ User = get_user_model()
 class Command(BaseCommand):
     help = 'Create sample data for the blog'
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument('--bulk', action='store_true',
+                            help='Generate a large, skewed dataset with bulk inserts')
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--categories', type=int, default=6)
+        parser.add_argument('--tags', type=int, default=200)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=30000)
+        parser.add_argument('--votes', type=int, default=50000)
+        parser.add_argument('--subscribers', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Random seed; the same seed always produces the same data')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Processes used to generate post content')
+        parser.add_argument('--skip-indexes', action='store_true',
+                            help='Do not rebuild the search and related-posts indexes afterwards')
+
+    def handle(self, *args, **options):
+        if options['bulk']:
+            return self.handle_bulk(options)
+
         self.stdout.write('Creating sample data...')
         
         # Create users
@@ -69,4 +95,34 @@ class Command(BaseCommand):
             post.view_count = random.randint(0, 1000)
             post.save()
         
-        self.stdout.write(self.style.SUCCESS('Successfully created sample data!'))
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS('Successfully created sample data!'))
+
+    def handle_bulk(self, options):
+        started = time.monotonic()
+        generator = SampleDataGenerator(
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            log=lambda message: self.stdout.write(f'  {message}') if options['verbosity'] > 1 else None,
+        )
+        self.stdout.write(f"Generating {options['posts']} posts (seed {options['seed']})...")
+        generator.generate(
+            users=options['users'],
+            categories=options['categories'],
+            tags=options['tags'],
+            posts=options['posts'],
+            comments=options['comments'],
+            votes=options['votes'],
+            subscribers=options['subscribers'],
+        )
+
+        # Bulk inserts bypass the signals that keep these up to date
+        if not options['skip_indexes']:
+            call_command('rebuild_search_index', stdout=self.stdout)
+            call_command('rebuild_related_posts', stdout=self.stdout)
+        invalidate_home_snapshot()
+        invalidate_sidebar()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully created sample data in {time.monotonic() - started:.1f}s!'
+        ))
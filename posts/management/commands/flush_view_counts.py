@@ -0,0 +1,38 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.counters import cache_is_shared, flush_view_counts
+
+
+class Command(BaseCommand):
+    help = (
+        'Write buffered post views to the database. Needs a cache shared with '
+        'the web processes (REDIS_URL); with the local-memory cache they flush '
+        'their own views (VIEW_COUNT_INLINE_FLUSH).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running and flush every VIEW_COUNT_FLUSH_INTERVAL seconds',
+        )
+
+    def handle(self, *args, **options):
+        if not cache_is_shared():
+            raise CommandError(
+                'The default cache is local to each process, so this command cannot see the '
+                'views buffered by the web processes. Configure a shared cache (REDIS_URL).'
+            )
+        while True:
+            flushed = flush_view_counts()
+            if flushed is None:
+                self.stdout.write('Another flush is in progress, skipping.')
+            else:
+                self.stdout.write(self.style.SUCCESS(f'Flushed {flushed} views.'))
+
+            if not options['loop']:
+                break
+            time.sleep(settings.VIEW_COUNT_FLUSH_INTERVAL)
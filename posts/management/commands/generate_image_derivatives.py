@@ -0,0 +1,36 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from PIL import Image, UnidentifiedImageError
+
+from posts.images import iter_source_images, rebuild_derivatives
+
+
+class Command(BaseCommand):
+    help = 'Generate responsive WebP and JPEG variants for every image in media storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Images processed in parallel (Pillow releases the GIL while resizing)')
+        parser.add_argument('--force', action='store_true', help='Regenerate existing variants')
+
+    def handle(self, *args, **options):
+        def process(name):
+            try:
+                rebuild_derivatives(name, force=options['force'])
+                return name, None
+            except (OSError, UnidentifiedImageError, Image.DecompressionBombError, ValueError) as e:
+                return name, e
+
+        done = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for name, error in executor.map(process, iter_source_images()):
+                if error:
+                    failed += 1
+                    self.stdout.write(self.style.WARNING(f'Skipped {name}: {error}'))
+                else:
+                    done += 1
+                    if done % 100 == 0:
+                        self.stdout.write(f'Processed {done} images...')
+
+        self.stdout.write(self.style.SUCCESS(f'Generated derivatives for {done} images, {failed} skipped.'))
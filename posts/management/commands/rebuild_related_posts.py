@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts.related import rebuild_related_posts
+
+
+class Command(BaseCommand):
+    help = 'Recompute the related-posts index for every published post'
+
+    def handle(self, *args, **options):
+        processed = rebuild_related_posts(
+            progress=lambda count: self.stdout.write(f'Ranked {count} posts...')
+        )
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt related posts for {processed} posts.'))
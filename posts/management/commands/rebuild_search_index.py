@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.models import Post
+from posts.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for published posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        batch_size = options['batch_size']
+        posts = Post.objects.filter(status='published').prefetch_related('tags').order_by('id')
+
+        with transaction.atomic():
+            backend.clear()
+            indexed = 0
+            last_id = 0
+            while True:
+                batch = list(posts.filter(id__gt=last_id)[:batch_size])
+                if not batch:
+                    break
+                backend.index_posts(batch)
+                indexed += len(batch)
+                last_id = batch[-1].id
+                self.stdout.write(f'Indexed {indexed} posts...')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {type(backend).__name__} index with {indexed} posts.'
+        ))
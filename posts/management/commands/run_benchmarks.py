@@ -0,0 +1,92 @@
+import json
+import logging
+import sys
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from posts import benchmarks
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a scaled dataset in a throwaway test database and measure latency, '
+        'query counts and allocations for every public view'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=1000, help='Number of posts to seed')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--cold', action='store_true', help='Clear the cache before every request')
+        parser.add_argument('--only', nargs='+', metavar='VIEW', help='Only benchmark these URL names')
+        parser.add_argument('--output', help='Write results to this JSON file')
+        parser.add_argument('--compare', help='Baseline JSON file to compare against')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Allowed p50 slowdown before a view counts as regressed')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Keep the test database and its data between runs')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options['keepdb']
+        )
+        try:
+            with override_settings(QUERY_BUDGET_SAMPLE_RATE=0, QUERY_BUDGET_RAISE=False):
+                report = self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(report, indent=2))
+            self.stdout.write(f"Wrote {options['output']}")
+
+        if options['compare']:
+            baseline = json.loads(Path(options['compare']).read_text())
+            regressions = benchmarks.compare(baseline, report, options['threshold'])
+            for name, metric, before, after in regressions:
+                self.stdout.write(self.style.ERROR(f'{name}: {metric} {before} -> {after}'))
+            if regressions:
+                sys.exit(1)
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['compare']}."))
+
+    def run(self, options):
+        if not Post.objects.exists():
+            self.stdout.write(f"Seeding {options['scale']} posts...")
+            benchmarks.seed(options['scale'], options['seed'])
+            call_command('rebuild_search_index', stdout=self.stdout)
+            call_command('rebuild_related_posts', stdout=self.stdout)
+
+        # Failing views are reported by status; their tracebacks are noise here
+        logging.getLogger('django.request').setLevel(logging.CRITICAL)
+
+        results = {}
+        for name, url in benchmarks.benchmark_urls():
+            if options['only'] and name not in options['only']:
+                continue
+            result = benchmarks.measure(url, options['iterations'], options['warmup'], options['cold'])
+            results[name] = result
+            style = self.style.SUCCESS if result['status'] < 400 else self.style.WARNING
+            self.stdout.write(style(
+                f"{name:<16} {result['status']}  p50 {result['p50_ms']:>8.2f}ms  "
+                f"p99 {result['p99_ms']:>8.2f}ms  {result['queries']:>3} queries  "
+                f"{result['peak_alloc_kb']:>8.1f} KiB"
+            ))
+
+        return {
+            'revision': benchmarks.git_revision(),
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'scale': Post.objects.count(),
+            'iterations': options['iterations'],
+            'cold': options['cold'],
+            'results': results,
+        }
@@ -0,0 +1,39 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from blog.sqlite import maintain
+
+
+class Command(BaseCommand):
+    help = 'Checkpoint the SQLite write-ahead log and refresh query planner statistics'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running and repeat every SQLITE_MAINTENANCE_INTERVAL seconds',
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError(f"{options['database']} is not a SQLite database")
+
+        while True:
+            busy, frames, checkpointed = maintain(options['database'])
+            if busy:
+                self.stdout.write(self.style.WARNING(
+                    f'Checkpointed {checkpointed} of {frames} WAL frames; readers kept the rest.'
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS('Checkpointed the WAL and analyzed the database.'))
+
+            if not options['loop']:
+                break
+            # Do not hold a connection (and the WAL) open while sleeping
+            connection.close()
+            time.sleep(settings.SQLITE_MAINTENANCE_INTERVAL)
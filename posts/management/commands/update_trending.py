@@ -0,0 +1,28 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.snapshot import invalidate_home_snapshot
+from posts.trending import compute_trending_scores
+
+
+class Command(BaseCommand):
+    help = 'Recompute time-decayed trending scores from recent post views'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running and recompute every TRENDING_UPDATE_INTERVAL seconds',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            scored = compute_trending_scores()
+            invalidate_home_snapshot()
+            self.stdout.write(self.style.SUCCESS(f'Scored {scored} trending posts.'))
+
+            if not options['loop']:
+                break
+            time.sleep(settings.TRENDING_UPDATE_INTERVAL)
@@ -0,0 +1,24 @@
+from django.db import migrations
+from django.db.models import F
+
+
+def merge_views_count(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.filter(views_count__gt=0).update(
+        view_count=F('view_count') + F('views_count')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0003_post_is_sponsored_post_rating_post_views_count_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_views_count, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='post',
+            name='views_count',
+        ),
+    ]
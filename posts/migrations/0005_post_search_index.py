@@ -0,0 +1,44 @@
+from django.db import migrations
+
+SQLITE_CREATE = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS posts_post_fts USING fts5("
+    "title, tags, excerpt, body, tokenize='porter unicode61')"
+)
+SQLITE_DROP = 'DROP TABLE IF EXISTS posts_post_fts'
+
+POSTGRES_CREATE = (
+    'CREATE TABLE IF NOT EXISTS posts_post_search ('
+    'post_id bigint PRIMARY KEY REFERENCES posts_post (id) ON DELETE CASCADE, '
+    'document tsvector NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS posts_post_search_document_gin '
+    'ON posts_post_search USING GIN (document)',
+)
+POSTGRES_DROP = 'DROP TABLE IF EXISTS posts_post_search'
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(SQLITE_CREATE)
+    elif vendor == 'postgresql':
+        for statement in POSTGRES_CREATE:
+            schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(SQLITE_DROP)
+    elif vendor == 'postgresql':
+        schema_editor.execute(POSTGRES_DROP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_merge_views_count_into_view_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0005_post_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['status', '-published_date', '-id'], name='posts_post_status_a45721_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-18 06:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_post_text_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostViewBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('views', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['status', '-trending_score'], name='posts_post_status_40cb75_idx'),
+        ),
+        migrations.AddField(
+            model_name='postviewbucket',
+            name='post',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='view_buckets', to='posts.post'),
+        ),
+        migrations.AddIndex(
+            model_name='postviewbucket',
+            index=models.Index(fields=['hour'], name='posts_postv_hour_4475a4_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='postviewbucket',
+            unique_together={('post', 'hour')},
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations
+
+from posts.text import text_stats
+
+BATCH_SIZE = 500
+
+
+def backfill_text_stats(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    posts = Post.objects.only('id', 'content', 'excerpt').order_by('id')
+    last_id = 0
+    while True:
+        batch = list(posts.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            break
+        for post in batch:
+            for field, value in text_stats(post.content, post.excerpt).items():
+                setattr(post, field, value)
+        Post.objects.bulk_update(batch, ['plain_text', 'summary', 'word_count', 'read_time'])
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_post_trending'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_text_stats, migrations.RunPython.noop),
+    ]
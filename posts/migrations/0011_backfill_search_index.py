@@ -0,0 +1,55 @@
+from collections import defaultdict
+
+from django.db import migrations
+
+from posts.search import VENDOR_BACKENDS
+from posts.text import plain_text
+
+BATCH_SIZE = 500
+
+
+def backfill_search_index(apps, schema_editor):
+    backend_class = VENDOR_BACKENDS.get(schema_editor.connection.vendor)
+    if backend_class is None:
+        return
+    backend = backend_class()
+    Post = apps.get_model('posts', 'Post')
+    Tag = apps.get_model('taggit', 'Tag')
+    TaggedItem = apps.get_model('taggit', 'TaggedItem')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+
+    tag_names = dict(Tag.objects.values_list('id', 'name'))
+    content_type = ContentType.objects.filter(app_label='posts', model='post').first()
+    post_tags = defaultdict(list)
+    if content_type is not None:
+        for post_id, tag_id in TaggedItem.objects.filter(
+            content_type=content_type
+        ).order_by('id').values_list('object_id', 'tag_id').iterator(chunk_size=BATCH_SIZE):
+            post_tags[post_id].append(tag_names[tag_id])
+
+    posts = Post.objects.filter(status='published').order_by('id').values_list(
+        'id', 'title', 'excerpt', 'content', 'plain_text'
+    )
+    last_id = 0
+    while True:
+        batch = list(posts.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            break
+        backend.index_documents([
+            (post_id, title, ' '.join(post_tags[post_id]), plain_text(excerpt), body or plain_text(content))
+            for post_id, title, excerpt, content, body in batch
+        ])
+        last_id = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+        ('posts', '0010_backfill_text_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_search_index, migrations.RunPython.noop),
+    ]
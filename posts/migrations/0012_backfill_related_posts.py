@@ -0,0 +1,20 @@
+from django.db import migrations
+
+from posts.related import rebuild_related_posts
+
+
+def backfill_related_posts(apps, schema_editor):
+    rebuild_related_posts(apps=apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('taggit', '0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx'),
+        ('posts', '0011_backfill_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_related_posts, migrations.RunPython.noop),
+    ]
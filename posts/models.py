@@ -6,6 +6,7 @@ from django.contrib.auth import get_user_model
 from ckeditor.fields import RichTextField
 from taggit.managers import TaggableManager
 from categories.models import Category
+from .text import text_stats
 
 User = get_user_model()
 
@@ -14,6 +15,7 @@ class Post(models.Model):
         ('draft', 'Draft'),
         ('published', 'Published'),
     )
+    TEXT_STATS_FIELDS = {'plain_text', 'summary', 'word_count', 'read_time'}
     
     title = models.CharField(max_length=200)
     slug = models.SlugField(max_length=200, unique_for_date='published_date')
@@ -23,6 +25,12 @@ class Post(models.Model):
     content = RichTextField()
     excerpt = models.TextField(max_length=500, blank=True)
     
+    # Derived from content and excerpt on save, see posts.text
+    plain_text = models.TextField(blank=True, editable=False)
+    summary = models.TextField(blank=True, editable=False)
+    word_count = models.PositiveIntegerField(default=0, editable=False)
+    read_time = models.PositiveSmallIntegerField(default=1, editable=False)
+    
     featured_image = models.ImageField(upload_to='blog_images/', blank=True, null=True)
     
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='draft')
@@ -33,17 +41,19 @@ class Post(models.Model):
     tags = TaggableManager(blank=True)
     
     view_count = models.PositiveIntegerField(default=0)
+    trending_score = models.FloatField(default=0, editable=False)
 
     is_sponsored = models.BooleanField(default=False)
     rating = models.DecimalField(max_digits=3, decimal_places=1, null=True, blank=True)
-    views_count = models.PositiveIntegerField(default=0)
     
     class Meta:
         ordering = ('-published_date',)
         indexes = [
             models.Index(fields=['-published_date']),
+            models.Index(fields=['status', '-published_date', '-id']),
             models.Index(fields=['is_sponsored']),
             models.Index(fields=['category']),
+            models.Index(fields=['status', '-trending_score']),
         ]
     
     def __str__(self):
@@ -52,8 +62,19 @@ class Post(models.Model):
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
+        
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'content', 'excerpt'} & set(update_fields):
+            self.update_text_stats()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | self.TEXT_STATS_FIELDS
         super().save(*args, **kwargs)
     
+    def update_text_stats(self):
+        """Recompute the plain-text copy, summary, word count and read time"""
+        for field, value in text_stats(self.content, self.excerpt).items():
+            setattr(self, field, value)
+    
     def get_absolute_url(self):
         return reverse('post_detail', kwargs={
             'year': self.published_date.year,
@@ -63,15 +84,13 @@ class Post(models.Model):
         })
     
     def increment_view_count(self):
-        self.view_count += 1
-        self.save(update_fields=['view_count'])
+        """Buffer a view; posts.counters flushes it to view_count in bulk"""
+        from .counters import record_view
+        record_view(self.id)
 
     def get_read_time(self):
-        """Calculate estimated reading time in minutes"""
-        # Average reading speed: 200-250 words per minute
-        word_count = len(self.content.split())
-        reading_time = max(1, word_count // 200)  # At least 1 minute
-        return reading_time
+        """Estimated reading time in minutes, stored on save"""
+        return self.read_time
     
     def get_rating_display(self):
         """Display rating with stars"""
@@ -87,3 +106,35 @@ class PostImage(models.Model):
     
     def __str__(self):
         return f"Image for {self.post.title}"
+
+class RelatedPost(models.Model):
+    """Precomputed neighbour of a post, maintained by posts.related"""
+    post = models.ForeignKey(Post, related_name='related_entries', on_delete=models.CASCADE)
+    related = models.ForeignKey(Post, related_name='related_from', on_delete=models.CASCADE)
+    score = models.FloatField()
+    
+    class Meta:
+        ordering = ['-score']
+        unique_together = ['post', 'related']
+        indexes = [
+            models.Index(fields=['post', '-score']),
+        ]
+    
+    def __str__(self):
+        return f"{self.related.title} related to {self.post.title}"
+
+
+class PostViewBucket(models.Model):
+    """Views of a post within one hour, feeding posts.trending"""
+    post = models.ForeignKey(Post, related_name='view_buckets', on_delete=models.CASCADE)
+    hour = models.DateTimeField()
+    views = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['post', 'hour']
+        indexes = [
+            models.Index(fields=['hour']),
+        ]
+    
+    def __str__(self):
+        return f"{self.views} views of {self.post_id} at {self.hour}"
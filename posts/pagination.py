@@ -0,0 +1,137 @@
+import base64
+import hashlib
+import json
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(direction, post):
+    payload = json.dumps([direction, post.published_date.isoformat(), post.id])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Return (direction, published_date, id), or None for a bad token"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        direction, published_date, post_id = json.loads(base64.urlsafe_b64decode(padded))
+        published_date = parse_datetime(published_date)
+        if published_date is None or published_date.tzinfo is None:
+            return None
+        # Dates at the edges of the calendar overflow once converted to UTC
+        published_date = published_date.astimezone(dt_timezone.utc)
+    except (ValueError, TypeError, OverflowError):
+        return None
+    # Ids must fit the database's 64-bit integer column
+    if direction not in (NEXT, PREVIOUS) or not isinstance(post_id, int) or not 0 < post_id < 2 ** 63:
+        return None
+    return direction, published_date, post_id
+
+
+def approximate_count(queryset):
+    """COUNT(*) cached per query, for an "about N posts" label"""
+    sql, params = queryset.query.sql_with_params()
+    key = 'posts:count:' + hashlib.md5(f'{sql}{params}'.encode()).hexdigest()
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, settings.PAGINATION_COUNT_TTL)
+    return count
+
+
+class CursorPage:
+    def __init__(self, object_list, has_next, has_previous, approximate_total=None):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.approximate_total = approximate_total
+        self.next_url = None
+        self.previous_url = None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def next_cursor(self):
+        if self.has_next and self.object_list:
+            return encode_cursor(NEXT, self.object_list[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous and self.object_list:
+            return encode_cursor(PREVIOUS, self.object_list[0])
+        return None
+
+
+class CursorPaginator:
+    """Keyset pagination over posts, newest first, keyed on (published_date, id).
+
+    Unlike Paginator there is no COUNT(*) and no OFFSET: every page is an
+    indexed range scan starting from the edge of the page before it, so page
+    4000 costs the same as page 1.
+    """
+
+    def __init__(self, queryset, per_page, with_total=False):
+        self.queryset = queryset.order_by('-published_date', '-id')
+        self.per_page = per_page
+        self.with_total = with_total
+
+    def get_page(self, token=None):
+        cursor = decode_cursor(token) if token else None
+        limit = self.per_page + 1
+
+        if cursor is None:
+            rows = list(self.queryset[:limit])
+            has_next, has_previous = len(rows) > self.per_page, False
+            rows = rows[:self.per_page]
+        else:
+            direction, published_date, post_id = cursor
+            if direction == NEXT:
+                rows = list(self.queryset.filter(
+                    Q(published_date__lt=published_date) |
+                    Q(published_date=published_date, id__lt=post_id)
+                )[:limit])
+                has_next, has_previous = len(rows) > self.per_page, True
+                rows = rows[:self.per_page]
+            else:
+                rows = list(self.queryset.filter(
+                    Q(published_date__gt=published_date) |
+                    Q(published_date=published_date, id__gt=post_id)
+                ).order_by('published_date', 'id')[:limit])
+                has_next, has_previous = True, len(rows) > self.per_page
+                rows = rows[:self.per_page][::-1]
+
+        total = approximate_count(self.queryset) if self.with_total else None
+        return CursorPage(rows, has_next, has_previous, total)
+
+
+def paginate_by_cursor(request, queryset, per_page, with_total=False):
+    """Return the page named by ?cursor=, with older/newer links that keep
+    the rest of the query string"""
+    page = CursorPaginator(queryset, per_page, with_total).get_page(request.GET.get('cursor'))
+
+    def url_for(cursor):
+        params = request.GET.copy()
+        params.pop('page', None)
+        params['cursor'] = cursor
+        return f'?{params.urlencode()}'
+
+    if page.next_cursor:
+        page.next_url = url_for(page.next_cursor)
+    if page.previous_cursor:
+        page.previous_url = url_for(page.previous_cursor)
+    return page
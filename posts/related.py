@@ -0,0 +1,236 @@
+import math
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Post, RelatedPost
+
+# Neighbours kept per post
+RELATED_POSTS_COUNT = 6
+
+# Score weights: shared tags (IDF weighted, normalised to 0..1), same
+# category, and freshness of the candidate
+TAG_WEIGHT = 1.0
+CATEGORY_WEIGHT = 0.3
+RECENCY_WEIGHT = 0.2
+RECENCY_HALF_LIFE_DAYS = 90
+
+# Tags on more posts than this carry almost no signal and would drag huge
+# candidate sets into every computation, so they are ignored
+MAX_TAG_POSTS = 5000
+
+# Recent posts from the same category added to the candidate set
+CATEGORY_CANDIDATES = 50
+
+# Neighbours recomputed along with an edited post; the rest catch up at
+# the next `manage.py rebuild_related_posts`
+REFRESH_NEIGHBOURS = 20
+
+BATCH_SIZE = 1000
+
+
+def _tagged_items():
+    TaggedItem = Post.tags.through
+    return TaggedItem.objects.filter(content_type=ContentType.objects.get_for_model(Post))
+
+
+def _models(apps):
+    """Post, RelatedPost and the posts' tag assignments, from a migration's `apps` if given"""
+    if apps is None:
+        return Post, RelatedPost, _tagged_items()
+    content_type = apps.get_model('contenttypes', 'ContentType').objects.filter(
+        app_label='posts', model='post'
+    ).first()
+    tagged_items = apps.get_model('taggit', 'TaggedItem').objects.filter(content_type=content_type)
+    return apps.get_model('posts', 'Post'), apps.get_model('posts', 'RelatedPost'), tagged_items
+
+
+def _idf(tag_frequency, total_posts):
+    return math.log(1 + total_posts / tag_frequency)
+
+
+def _rank(post_id, category_id, tag_idf, overlaps, meta, now):
+    """Score candidates for one post and return the best (related_id, score) pairs.
+
+    tag_idf maps the post's usable tags to their weight, overlaps maps
+    candidate ids to the tags they share with the post, and meta maps
+    published candidate ids to (category_id, published_date).
+    """
+    total_idf = sum(tag_idf.values()) or 1.0
+    scored = []
+    for candidate_id, (candidate_category, published_date) in meta.items():
+        if candidate_id == post_id:
+            continue
+        score = TAG_WEIGHT * sum(tag_idf[tag] for tag in overlaps.get(candidate_id, ())) / total_idf
+        if category_id and candidate_category == category_id:
+            score += CATEGORY_WEIGHT
+        if score <= 0:
+            continue
+        age_days = max((now - published_date).total_seconds(), 0) / 86400
+        score += RECENCY_WEIGHT * 0.5 ** (age_days / RECENCY_HALF_LIFE_DAYS)
+        scored.append((score, candidate_id))
+
+    scored.sort(reverse=True)
+    return [(candidate_id, score) for score, candidate_id in scored[:RELATED_POSTS_COUNT]]
+
+
+def _store(rankings, model=RelatedPost):
+    """Replace the stored neighbours for every post id in rankings"""
+    with transaction.atomic():
+        model.objects.filter(post_id__in=list(rankings)).delete()
+        model.objects.bulk_create([
+            model(post_id=post_id, related_id=related_id, score=score)
+            for post_id, ranked in rankings.items()
+            for related_id, score in ranked
+        ])
+
+
+def compute_related_posts(post):
+    """Rank neighbours for a single post with a handful of targeted queries"""
+    if post.status != 'published':
+        return []
+
+    items = _tagged_items()
+    tag_ids = list(items.filter(object_id=post.id).values_list('tag_id', flat=True))
+    # Published posts only, as rebuild_related_posts counts them
+    frequencies = dict(
+        items.filter(
+            tag_id__in=tag_ids,
+            object_id__in=Post.objects.filter(status='published').values('id'),
+        ).values_list('tag_id').annotate(n=Count('id'))
+    )
+    total_posts = Post.objects.filter(status='published').count()
+    tag_idf = {
+        tag_id: _idf(frequency, total_posts)
+        for tag_id, frequency in frequencies.items()
+        if frequency <= MAX_TAG_POSTS
+    }
+
+    overlaps = defaultdict(set)
+    for candidate_id, tag_id in items.filter(
+        tag_id__in=list(tag_idf)
+    ).exclude(object_id=post.id).values_list('object_id', 'tag_id'):
+        overlaps[candidate_id].add(tag_id)
+
+    candidate_ids = set(overlaps)
+    if post.category_id:
+        candidate_ids.update(Post.objects.filter(
+            status='published', category_id=post.category_id
+        ).exclude(id=post.id).order_by('-published_date').values_list('id', flat=True)[:CATEGORY_CANDIDATES])
+
+    meta = {}
+    candidate_ids = list(candidate_ids)
+    for start in range(0, len(candidate_ids), BATCH_SIZE):
+        meta.update(
+            (post_id, (category_id, published_date))
+            for post_id, category_id, published_date in Post.objects.filter(
+                id__in=candidate_ids[start:start + BATCH_SIZE], status='published'
+            ).values_list('id', 'category_id', 'published_date')
+        )
+
+    return _rank(post.id, post.category_id, tag_idf, overlaps, meta, timezone.now())
+
+
+def update_related_posts(posts):
+    """Recompute and store neighbours for the given posts only"""
+    _store({post.id: compute_related_posts(post) for post in posts})
+
+
+def refresh_related_posts(post):
+    """Recompute a post's neighbours and those of every post it affects.
+
+    Posts that it now lists, then posts that listed it before, are
+    recomputed too, up to REFRESH_NEIGHBOURS, so the relation stays roughly
+    symmetric after tag edits.
+    """
+    ranked = compute_related_posts(post)
+    rankings = {post.id: ranked}
+
+    affected = [related_id for related_id, score in ranked]
+    previous = RelatedPost.objects.filter(related=post).exclude(
+        post_id__in=affected
+    ).order_by('-score').values_list('post_id', flat=True)
+    affected += previous[:max(REFRESH_NEIGHBOURS - len(affected), 0)]
+    for neighbour in Post.objects.filter(id__in=affected[:REFRESH_NEIGHBOURS]):
+        rankings[neighbour.id] = compute_related_posts(neighbour)
+
+    _store(rankings)
+
+
+def rebuild_related_posts(progress=None, apps=None):
+    """Recompute neighbours for every published post from in-memory indexes.
+
+    Loads post metadata and tag assignments once, then scores each post
+    without further reads, writing results in batches. A data migration
+    passes its `apps` to run this against the historical models.
+    """
+    Post, RelatedPost, tagged_items = _models(apps)
+    now = timezone.now()
+    published = Post.objects.filter(status='published')
+
+    meta = {}
+    category_posts = defaultdict(list)
+    for post_id, category_id, published_date in published.order_by(
+        '-published_date'
+    ).values_list('id', 'category_id', 'published_date').iterator(chunk_size=BATCH_SIZE):
+        meta[post_id] = (category_id, published_date)
+        if category_id:
+            category_posts[category_id].append(post_id)
+
+    post_tags = defaultdict(set)
+    tag_posts = defaultdict(list)
+    for post_id, tag_id in tagged_items.values_list('object_id', 'tag_id').iterator(chunk_size=BATCH_SIZE):
+        if post_id in meta:
+            post_tags[post_id].add(tag_id)
+            tag_posts[tag_id].append(post_id)
+
+    total_posts = len(meta)
+    idf = {
+        tag_id: _idf(len(post_ids), total_posts)
+        for tag_id, post_ids in tag_posts.items()
+        if len(post_ids) <= MAX_TAG_POSTS
+    }
+
+    rankings = {}
+    processed = 0
+    for post_id, (category_id, published_date) in meta.items():
+        tag_idf = {tag_id: idf[tag_id] for tag_id in post_tags[post_id] if tag_id in idf}
+
+        overlaps = defaultdict(set)
+        for tag_id in tag_idf:
+            for candidate_id in tag_posts[tag_id]:
+                overlaps[candidate_id].add(tag_id)
+
+        candidate_ids = set(overlaps)
+        if category_id:
+            candidate_ids.update(category_posts[category_id][:CATEGORY_CANDIDATES])
+        candidates = {candidate_id: meta[candidate_id] for candidate_id in candidate_ids}
+
+        rankings[post_id] = _rank(post_id, category_id, tag_idf, overlaps, candidates, now)
+        processed += 1
+
+        if len(rankings) >= BATCH_SIZE:
+            _store(rankings, RelatedPost)
+            rankings = {}
+            if progress:
+                progress(processed)
+
+    if rankings:
+        _store(rankings, RelatedPost)
+    if progress:
+        progress(processed)
+
+    # Drafts and unpublished posts keep no neighbours
+    RelatedPost.objects.exclude(post__status='published').delete()
+    return processed
+
+
+def get_related_posts(post, limit=3):
+    """Stored neighbours of a post, best first, in one indexed query"""
+    return Post.objects.filter(
+        related_from__post=post,
+        status='published',
+    ).select_related('author', 'category').order_by('-related_from__score')[:limit]
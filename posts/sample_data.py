@@ -0,0 +1,267 @@
+"""Bulk generation of realistic sample data for capacity and benchmark runs.
+
+Everything is derived from a seed, and post rows are generated per chunk
+from their own seed, so the dataset is identical whatever the number of
+worker processes. Popularity follows Zipf/Pareto curves: a few authors,
+tags and posts get most of the posts, tags, comments and views.
+"""
+import itertools
+import multiprocessing
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
+from django.utils.text import slugify
+from taggit.models import Tag
+
+from categories.models import Category
+from comments.models import Comment, CommentVote
+from comments.votes import recount_votes
+from newsletter.models import Subscriber
+from .models import Post
+from .text import text_stats
+
+User = get_user_model()
+
+WORDS = (
+    'django python database query index cache latency server request template '
+    'model view search crawler archive travel science sports food lifestyle '
+    'health markets climate music film design startup history ocean mountain '
+    'river city garden energy policy economy football tennis recipe coffee '
+    'camera review guide opinion interview research space robot network'
+).split()
+
+CATEGORY_NAMES = ['Technology', 'Science', 'Travel', 'Food', 'Lifestyle', 'Sports']
+
+DAYS_OF_HISTORY = 365 * 3
+
+
+def zipf_cum_weights(count, exponent=1.1):
+    return list(itertools.accumulate(1 / (rank + 1) ** exponent for rank in range(count)))
+
+
+def _sentence(rng, length):
+    return ' '.join(rng.choice(WORDS) for _ in range(length))
+
+
+def _post_rows(args):
+    """Build field values for one chunk of posts; runs in worker processes"""
+    chunk, start, size, seed, user_count, category_count, tag_count, now = args
+    rng = random.Random(f'{seed}:posts:{chunk}')
+    user_weights = zipf_cum_weights(user_count)
+    tag_weights = zipf_cum_weights(tag_count)
+
+    rows = []
+    for number in range(start, start + size):
+        title = f'{_sentence(rng, rng.randint(3, 8)).capitalize()} {number}'
+        content = ''.join(
+            f'<p>{_sentence(rng, rng.randint(30, 90))}.</p>'
+            for _ in range(max(1, int(rng.lognormvariate(1.6, 0.6))))
+        )
+        excerpt = _sentence(rng, 20) if rng.random() < 0.3 else ''
+        row = {
+            'title': title,
+            'slug': slugify(title),
+            'content': content,
+            'excerpt': excerpt,
+            'status': 'published' if rng.random() < 0.95 else 'draft',
+            # Newer posts are more common than old ones
+            'published_date': now - timedelta(days=DAYS_OF_HISTORY * rng.random() ** 2,
+                                               minutes=rng.randint(0, 1439)),
+            'view_count': int(rng.paretovariate(1.2) * 10),
+            'is_sponsored': rng.random() < 0.03,
+            'author_index': rng.choices(range(user_count), cum_weights=user_weights)[0],
+            'category_index': rng.randrange(category_count),
+            'tag_indexes': set(rng.choices(range(tag_count), cum_weights=tag_weights,
+                                           k=rng.randint(1, 5))),
+        }
+        row.update(text_stats(content, excerpt))
+        rows.append(row)
+    return rows
+
+
+class SampleDataGenerator:
+    def __init__(self, seed=0, batch_size=1000, workers=1, log=None):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.workers = workers
+        self.log = log or (lambda message: None)
+
+    def _chunks(self, total):
+        for chunk, start in enumerate(range(0, total, self.batch_size)):
+            yield chunk, start, min(self.batch_size, total - start)
+
+    def create_users(self, count):
+        password = make_password('password123')
+        prefix = f'sample{self.seed}'
+        for chunk, start, size in self._chunks(count):
+            User.objects.bulk_create([
+                User(
+                    username=f'{prefix}_user{number}',
+                    email=f'{prefix}_user{number}@example.com',
+                    first_name=f'First{number}',
+                    last_name=f'Last{number}',
+                    bio=f'Bio for user {number}',
+                    password=password,
+                )
+                for number in range(start, start + size)
+            ], ignore_conflicts=True)
+        ids = list(User.objects.filter(
+            username__startswith=f'{prefix}_user'
+        ).order_by('id').values_list('id', flat=True))
+        self.log(f'{len(ids)} users')
+        return ids
+
+    def create_categories(self, count):
+        names = CATEGORY_NAMES[:count] + [
+            f'Category {number}' for number in range(len(CATEGORY_NAMES), count)
+        ]
+        ids = []
+        for name in names:
+            category, created = Category.objects.get_or_create(
+                name=name,
+                defaults={'slug': slugify(name), 'description': f'Posts about {name.lower()}'}
+            )
+            ids.append(category.id)
+        self.log(f'{len(ids)} categories')
+        return ids
+
+    def create_tags(self, count):
+        names = [f'{self.rng.choice(WORDS)}-{number}' for number in range(count)]
+        Tag.objects.bulk_create(
+            [Tag(name=name, slug=name) for name in names],
+            batch_size=self.batch_size, ignore_conflicts=True,
+        )
+        by_name = {}
+        for start in range(0, len(names), self.batch_size):
+            by_name.update(Tag.objects.filter(
+                name__in=names[start:start + self.batch_size]
+            ).values_list('name', 'id'))
+        ids = [by_name[name] for name in names]
+        self.log(f'{len(ids)} tags')
+        return ids
+
+    def create_posts(self, count, user_ids, category_ids, tag_ids):
+        """Insert posts and their tag assignments; returns (ids, view counts)"""
+        now = timezone.now()
+        tasks = [
+            (chunk, start, size, self.seed, len(user_ids), len(category_ids), len(tag_ids), now)
+            for chunk, start, size in self._chunks(count)
+        ]
+        TaggedItem = Post.tags.through
+        content_type = ContentType.objects.get_for_model(Post)
+
+        post_ids, view_counts = [], []
+        pool = None
+        if self.workers > 1 and 'fork' in multiprocessing.get_all_start_methods():
+            # fork keeps the configured Django environment in the workers
+            pool = multiprocessing.get_context('fork').Pool(self.workers)
+            chunks = pool.imap(_post_rows, tasks)
+        else:
+            chunks = map(_post_rows, tasks)
+
+        try:
+            for rows in chunks:
+                tag_indexes = [row.pop('tag_indexes') for row in rows]
+                posts = Post.objects.bulk_create([
+                    Post(
+                        author_id=user_ids[row.pop('author_index')],
+                        category_id=category_ids[row.pop('category_index')],
+                        **row
+                    )
+                    for row in rows
+                ])
+                TaggedItem.objects.bulk_create([
+                    TaggedItem(content_type=content_type, object_id=post.id, tag_id=tag_ids[index])
+                    for post, indexes in zip(posts, tag_indexes)
+                    for index in indexes
+                ])
+                post_ids.extend(post.id for post in posts)
+                view_counts.extend(post.view_count for post in posts)
+                self.log(f'{len(post_ids)} posts')
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+        return post_ids, view_counts
+
+    def create_comments(self, count, post_ids, view_counts, user_ids, reply_ratio=0.3):
+        """Comments land on posts in proportion to their views; some are replies"""
+        post_weights = list(itertools.accumulate(count + 1 for count in view_counts))
+        user_weights = zipf_cum_weights(len(user_ids))
+        comment_ids = []
+        for chunk, start, size in self._chunks(count):
+            top_level = Comment.objects.bulk_create([
+                Comment(
+                    post_id=post_id,
+                    author_id=self.rng.choices(user_ids, cum_weights=user_weights)[0],
+                    content=_sentence(self.rng, self.rng.randint(5, 60)),
+                    active=True,
+                    is_approved=self.rng.random() < 0.9,
+                )
+                for post_id in self.rng.choices(
+                    post_ids, cum_weights=post_weights, k=size - int(size * reply_ratio)
+                )
+            ])
+            # Replies favour the first comments in the chunk, giving a few deep threads
+            replies = []
+            for _ in range(int(size * reply_ratio)):
+                parent = top_level[int(len(top_level) * self.rng.random() ** 3)]
+                replies.append(Comment(
+                    post_id=parent.post_id,
+                    parent=parent,
+                    author_id=self.rng.choices(user_ids, cum_weights=user_weights)[0],
+                    content=_sentence(self.rng, self.rng.randint(5, 40)),
+                    active=True,
+                    is_approved=True,
+                ))
+            replies = Comment.objects.bulk_create(replies)
+            # bulk_create skips Comment.save(), which fills in the tree path
+            for comment in top_level + replies:
+                comment.set_path()
+            Comment.objects.bulk_update(top_level + replies, ['path', 'depth'])
+            comment_ids.extend(comment.id for comment in top_level + replies)
+            self.log(f'{len(comment_ids)} comments')
+        return comment_ids
+
+    def create_votes(self, count, comment_ids, user_ids):
+        if not comment_ids:
+            return
+        created = 0
+        for chunk, start, size in self._chunks(count):
+            CommentVote.objects.bulk_create([
+                CommentVote(
+                    comment_id=self.rng.choice(comment_ids),
+                    user_id=self.rng.choice(user_ids),
+                    vote=1 if self.rng.random() < 0.8 else -1,
+                )
+                for _ in range(size)
+            ], ignore_conflicts=True)
+            created += size
+            self.log(f'{created} votes')
+        # Tallies are normally kept up to date by comments.votes.cast_vote
+        recount_votes()
+
+    def create_subscribers(self, count):
+        for chunk, start, size in self._chunks(count):
+            Subscriber.objects.bulk_create([
+                Subscriber(
+                    email=f'sample{self.seed}_reader{number}@example.com',
+                    is_active=self.rng.random() < 0.97,
+                )
+                for number in range(start, start + size)
+            ], ignore_conflicts=True)
+        self.log(f'{count} subscribers')
+
+    def generate(self, users, categories, tags, posts, comments, votes, subscribers):
+        user_ids = self.create_users(max(users, 1))
+        category_ids = self.create_categories(max(categories, 1))
+        tag_ids = self.create_tags(max(tags, 1))
+        post_ids, view_counts = self.create_posts(posts, user_ids, category_ids, tag_ids)
+        comment_ids = self.create_comments(comments, post_ids, view_counts, user_ids) if post_ids else []
+        self.create_votes(votes, comment_ids, user_ids)
+        self.create_subscribers(subscribers)
@@ -0,0 +1,211 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, Q, When
+from django.utils.module_loading import import_string
+
+from .models import Post
+from .text import plain_text
+
+FTS_TABLE = 'posts_post_fts'
+PG_TABLE = 'posts_post_search'
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_document(post):
+    """Fields indexed for a post, in weight order"""
+    return {
+        'title': post.title,
+        'tags': ' '.join(tag.name for tag in post.tags.all()),
+        'excerpt': plain_text(post.excerpt),
+        'body': post.plain_text or plain_text(post.content),
+    }
+
+
+def document_row(post_id, document):
+    return (post_id, document['title'], document['tags'], document['excerpt'], document['body'])
+
+
+class BaseSearchBackend:
+    """Interface shared by the search backends.
+
+    Backends keep an index of published posts keyed by post id and return
+    matching ids best match first; ``search`` turns those into a queryset.
+    """
+
+    def index_posts(self, posts):
+        self.index_documents([document_row(post.id, search_document(post)) for post in posts])
+
+    def index_documents(self, rows):
+        """Index (post id, title, tags, excerpt, body) rows"""
+        raise NotImplementedError
+
+    def remove_posts(self, post_ids):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def search_ids(self, query, limit):
+        raise NotImplementedError
+
+    def update_post(self, post):
+        if post.status == 'published':
+            self.index_posts([post])
+        else:
+            self.remove_posts([post.id])
+
+    def search(self, queryset, query, limit=None):
+        """Filter queryset to posts matching query, ordered by rank"""
+        ids = self.search_ids(query, limit or settings.SEARCH_RESULTS_LIMIT)
+        if not ids:
+            return queryset.none()
+        rank = Case(*[When(id=post_id, then=position) for position, post_id in enumerate(ids)])
+        return queryset.filter(id__in=ids).order_by(rank)
+
+
+class LikeSearchBackend(BaseSearchBackend):
+    """Unindexed fallback using icontains, for databases without full-text support"""
+
+    def index_documents(self, rows):
+        pass
+
+    def remove_posts(self, post_ids):
+        pass
+
+    def clear(self):
+        pass
+
+    def search(self, queryset, query, limit=None):
+        return queryset.filter(
+            Q(title__icontains=query) |
+            Q(content__icontains=query) |
+            Q(excerpt__icontains=query) |
+            Q(tags__name__icontains=query)
+        ).distinct().order_by('-published_date')
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    """SQLite FTS5 virtual table ranked with bm25"""
+
+    # bm25 column weights: title, tags, excerpt, body
+    WEIGHTS = (10.0, 6.0, 4.0, 1.0)
+
+    def index_documents(self, rows):
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                               [(row[0],) for row in rows])
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, tags, excerpt, body) '
+                f'VALUES (%s, %s, %s, %s, %s)',
+                rows,
+            )
+
+    def remove_posts(self, post_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                               [(post_id,) for post_id in post_ids])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+    def match_expression(self, query):
+        # Quote every word so user input can never be parsed as FTS5 syntax;
+        # the last word is a prefix match for search-as-you-type
+        words = WORD_RE.findall(query)
+        if not words:
+            return None
+        terms = [f'"{word}"' for word in words]
+        terms[-1] += '*'
+        return ' '.join(terms)
+
+    def search_ids(self, query, limit):
+        expression = self.match_expression(query)
+        if expression is None:
+            return []
+        weights = ', '.join(str(weight) for weight in self.WEIGHTS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s',
+                [expression, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """Weighted tsvector table with a GIN index, ranked with ts_rank_cd"""
+
+    CONFIG = 'english'
+
+    def index_documents(self, rows):
+        if not rows:
+            return
+        config = self.CONFIG
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {PG_TABLE} (post_id, document) VALUES (%s, '
+                f"setweight(to_tsvector('{config}', %s), 'A') || "
+                f"setweight(to_tsvector('{config}', %s), 'B') || "
+                f"setweight(to_tsvector('{config}', %s), 'C') || "
+                f"setweight(to_tsvector('{config}', %s), 'D')) "
+                f'ON CONFLICT (post_id) DO UPDATE SET document = EXCLUDED.document',
+                rows,
+            )
+
+    def remove_posts(self, post_ids):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {PG_TABLE} WHERE post_id = ANY(%s)', [list(post_ids)])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {PG_TABLE}')
+
+    def search_ids(self, query, limit):
+        if not WORD_RE.search(query):
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT post_id FROM {PG_TABLE}, websearch_to_tsquery('{self.CONFIG}', %s) query "
+                f'WHERE document @@ query ORDER BY ts_rank_cd(document, query) DESC LIMIT %s',
+                [query, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+VENDOR_BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+_backend = None
+
+
+def get_search_backend():
+    """Return the configured backend, or the one matching the database vendor"""
+    global _backend
+    if _backend is None:
+        if settings.SEARCH_BACKEND:
+            _backend = import_string(settings.SEARCH_BACKEND)()
+        else:
+            _backend = VENDOR_BACKENDS.get(connection.vendor, LikeSearchBackend)()
+    return _backend
+
+
+def search_posts(queryset, query):
+    return get_search_backend().search(queryset, query)
+
+
+def reindex_posts(post_ids, batch_size=500):
+    """Refresh the index entries of the published posts among post_ids"""
+    backend = get_search_backend()
+    post_ids = sorted(post_ids)
+    for start in range(0, len(post_ids), batch_size):
+        backend.index_posts(Post.objects.filter(
+            id__in=post_ids[start:start + batch_size], status='published'
+        ).prefetch_related('tags'))
@@ -0,0 +1,228 @@
+import threading
+import weakref
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from blog import pagecache
+from categories.models import Category
+from comments.models import Comment
+from taggit.models import Tag
+from .context_processors import invalidate_sidebar
+from .images import get_derivatives
+from .models import Post, PostImage, RelatedPost
+from .related import refresh_related_posts, update_related_posts
+from .search import get_search_backend, reindex_posts
+from .snapshot import invalidate_home_snapshot
+
+User = get_user_model()
+
+# Saves that only touch counters do not change what the home page lists
+# closely enough to justify a rebuild; the snapshot TTL picks them up.
+COUNTER_FIELDS = frozenset({'view_count'})
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, instance, **kwargs):
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= COUNTER_FIELDS:
+        return
+    invalidate_home_snapshot()
+    invalidate_sidebar()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def taxonomy_changed(sender, instance, **kwargs):
+    invalidate_home_snapshot()
+    invalidate_sidebar()
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def post_tags_changed(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_home_snapshot()
+        invalidate_sidebar()
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= COUNTER_FIELDS:
+        return
+    get_search_backend().update_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    get_search_backend().remove_posts([instance.id])
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def reindex_post_tags(sender, instance, action, **kwargs):
+    if isinstance(instance, Post) and action in ('post_add', 'post_remove', 'post_clear'):
+        get_search_backend().update_post(instance)
+
+
+def _tagged_post_ids(tag):
+    return list(Post.objects.filter(tags=tag).values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Tag)
+def reindex_renamed_tag(sender, instance, created, **kwargs):
+    if not created:
+        reindex_posts(_tagged_post_ids(instance))
+
+
+@receiver(pre_delete, sender=Tag)
+def remember_tagged_posts(sender, instance, **kwargs):
+    instance._search_post_ids = _tagged_post_ids(instance)
+
+
+@receiver(post_delete, sender=Tag)
+def reindex_deleted_tag(sender, instance, **kwargs):
+    # The tag links are gone by now, so the posts index without it
+    reindex_posts(getattr(instance, '_search_post_ids', []))
+
+
+# Fields the related-posts ranking depends on besides tags
+RELATED_FIELDS = ('category_id', 'status')
+
+
+@receiver(post_init, sender=Post)
+def remember_related_fields(sender, instance, **kwargs):
+    # From __dict__, so deferred fields are not loaded for every instance
+    instance._related_state = tuple(instance.__dict__.get(field) for field in RELATED_FIELDS)
+
+
+# Post ids with a neighbour refresh waiting for the transaction to commit, per
+# thread like the connections. Only weak references to the callbacks are kept:
+# a rollback drops Django's reference too, and with it the pending entry.
+_pending_refreshes = threading.local()
+
+
+def _schedule_related_refresh(post):
+    """Refresh a post's neighbours once per transaction, after it commits"""
+    pending = _pending_refreshes.__dict__.setdefault('posts', {})
+    scheduled = pending.get(post.id)
+    if scheduled is not None and scheduled() is not None:
+        return
+
+    def refresh():
+        pending.pop(post.id, None)
+        refresh_related_posts(post)
+
+    pending[post.id] = weakref.ref(refresh)
+    transaction.on_commit(refresh)
+
+
+@receiver(post_save, sender=Post)
+def refresh_related_on_save(sender, instance, created, **kwargs):
+    state = tuple(getattr(instance, field) for field in RELATED_FIELDS)
+    if created or state != instance._related_state:
+        _schedule_related_refresh(instance)
+    instance._related_state = state
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def refresh_related_on_tags(sender, instance, action, pk_set, **kwargs):
+    if not isinstance(instance, Post):
+        return
+    if action == 'post_clear' or (action in ('post_add', 'post_remove') and pk_set):
+        _schedule_related_refresh(instance)
+
+
+@receiver(pre_delete, sender=Post)
+def remember_related_from(sender, instance, **kwargs):
+    instance._related_from_ids = list(
+        RelatedPost.objects.filter(related=instance).values_list('post_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Post)
+def refresh_related_on_delete(sender, instance, **kwargs):
+    # Posts that listed the deleted one lost a neighbour to the cascade
+    update_related_posts(Post.objects.filter(id__in=getattr(instance, '_related_from_ids', [])))
+
+
+IMAGE_FIELDS = {
+    Post: 'featured_image',
+    PostImage: 'image',
+    User: 'profile_picture',
+}
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=PostImage)
+@receiver(post_save, sender=User)
+def generate_image_derivatives(sender, instance, **kwargs):
+    """Build responsive variants of a newly saved image instead of on first render"""
+    field = IMAGE_FIELDS[sender]
+    update_fields = kwargs.get('update_fields')
+    if update_fields and field not in update_fields:
+        return
+    get_derivatives(getattr(instance, field))
+
+
+# Full-page cache (blog.pagecache): purge the pages that show a changed object
+# and the listings it may have joined or left
+
+def _post_listing_keys(post):
+    keys = {f'post:{post.id}', 'posts', f'author-posts:{post.author_id}'}
+    if post.category_id:
+        keys.add(f'category-posts:{post.category_id}')
+    keys |= {f'tag-posts:{tag_id}' for tag_id in post.tags.values_list('id', flat=True)}
+    return keys
+
+
+@receiver(post_save, sender=Post)
+def purge_post_pages(sender, instance, **kwargs):
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= COUNTER_FIELDS:
+        return
+    pagecache.purge(*_post_listing_keys(instance))
+
+
+@receiver(pre_delete, sender=Post)
+def purge_deleted_post_pages(sender, instance, **kwargs):
+    # Before the tag links are cascaded away
+    pagecache.purge(*_post_listing_keys(instance))
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def purge_post_tag_pages(sender, instance, action, pk_set, **kwargs):
+    if isinstance(instance, Post) and action in ('post_add', 'post_remove'):
+        pagecache.purge(f'post:{instance.id}', *(f'tag-posts:{tag_id}' for tag_id in pk_set))
+    elif isinstance(instance, Post) and action == 'pre_clear':
+        pagecache.purge(*_post_listing_keys(instance))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def purge_category_pages(sender, instance, **kwargs):
+    pagecache.purge(f'category:{instance.id}', 'categories', 'sidebar')
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def purge_tag_pages(sender, instance, **kwargs):
+    pagecache.purge(f'tag:{instance.id}', 'sidebar')
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def purge_comment_pages(sender, instance, **kwargs):
+    pagecache.purge(f'comments:{instance.post_id}')
+
+
+@receiver(post_save, sender=User)
+def purge_author_pages(sender, instance, **kwargs):
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    pagecache.purge(f'author:{instance.id}')
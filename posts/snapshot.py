@@ -0,0 +1,168 @@
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import timezone
+
+from blog.concurrent import gather
+from blog.replicas import use_primary
+from categories.models import Category
+from .images import get_derivatives
+from .models import Post
+
+HOME_SNAPSHOT_KEY = 'posts:home_snapshot'
+
+HOME_SECTIONS = (
+    'hero_posts',
+    'highlights_posts',
+    'top_highlights',
+    'sports_posts',
+    'sponsored_posts',
+)
+
+
+def _post_card(post):
+    """Flatten a post into the fields the home page cards render"""
+    author = post.author
+    return {
+        'id': post.id,
+        'title': post.title,
+        'url': post.get_absolute_url(),
+        'excerpt': post.summary,
+        'featured_image_url': post.featured_image.url if post.featured_image else None,
+        # Derivative manifest for the responsive_images tags
+        'featured_image': get_derivatives(post.featured_image),
+        'published_date': post.published_date,
+        'read_time': post.read_time,
+        'rating': post.rating,
+        'is_sponsored': post.is_sponsored,
+        'category': {
+            'name': post.category.name,
+            'slug': post.category.slug,
+        } if post.category else None,
+        'author': {
+            'username': author.username,
+            'full_name': author.get_full_name(),
+            'avatar_url': author.profile_picture.url if author.profile_picture else None,
+            'avatar': get_derivatives(author.profile_picture),
+        },
+    }
+
+
+def _published():
+    return Post.objects.filter(status='published')
+
+
+def _ids(queryset):
+    return list(queryset.values_list('id', flat=True))
+
+
+def _hero_ids():
+    return _ids(_published().filter(featured_image__isnull=False).order_by('-published_date')[:5])
+
+
+def _highlight_ids():
+    return _ids(_published().order_by('-view_count', '-published_date')[:8])
+
+
+def _top_highlight_ids():
+    ids = _ids(_published().filter(trending_score__gt=0).order_by('-trending_score')[:5])
+    # Before any views have been scored, fall back to last week's most viewed
+    if not ids:
+        last_week = timezone.now() - timedelta(days=7)
+        ids = _ids(_published().filter(published_date__gte=last_week).order_by('-view_count')[:5])
+    return ids
+
+
+def _sports_ids():
+    sports_posts = _published().order_by('-published_date')
+    sports_category = Category.objects.filter(name__icontains='sport').first()
+    if sports_category:
+        sports_posts = sports_posts.filter(category=sports_category)
+    return _ids(sports_posts[:4])
+
+
+def _sponsored_ids():
+    """Sponsored posts, topped up with regular ones when there are not enough"""
+    ids = _ids(_published().filter(is_sponsored=True).order_by('-published_date')[:6])
+    if len(ids) < 6:
+        ids += _ids(_published().filter(is_sponsored=False).order_by('-published_date')[:6 - len(ids)])
+    return ids
+
+
+# Each section is independent of the others, so they are queried concurrently
+SECTION_QUERIES = {
+    'hero_posts': _hero_ids,
+    'highlights_posts': _highlight_ids,
+    'top_highlights': _top_highlight_ids,
+    'sports_posts': _sports_ids,
+    'sponsored_posts': _sponsored_ids,
+}
+
+
+def _trending_categories():
+    return [
+        {
+            'name': category.name,
+            'slug': category.slug,
+            'image_url': category.image.url if category.image else None,
+        }
+        for category in Category.objects.annotate(
+            post_count=Count('posts')
+        ).filter(post_count__gt=0).order_by('-post_count')[:8]
+    ]
+
+
+def _cards(post_ids):
+    return {
+        post.id: _post_card(post)
+        for post in Post.objects.filter(id__in=post_ids).select_related(
+            'author', 'category'
+        ).defer('content', 'plain_text')
+    }
+
+
+async def abuild_home_snapshot():
+    """Build every home page section as id lists plus card data"""
+    *section_ids, trending_categories = await gather(*SECTION_QUERIES.values(), _trending_categories)
+    sections = dict(zip(SECTION_QUERIES, section_ids))
+
+    post_ids = {post_id for ids in sections.values() for post_id in ids}
+    cards = await sync_to_async(_cards)(post_ids)
+
+    return {
+        'sections': sections,
+        'cards': cards,
+        'trending_categories': trending_categories,
+        'built_at': timezone.now(),
+    }
+
+
+async def aget_home_snapshot():
+    """Return the cached home snapshot, rebuilding it if missing or expired"""
+    snapshot = await cache.aget(HOME_SNAPSHOT_KEY)
+    if snapshot is None:
+        with use_primary():
+            snapshot = await abuild_home_snapshot()
+        await cache.aset(HOME_SNAPSHOT_KEY, snapshot, settings.HOME_SNAPSHOT_TTL)
+    return snapshot
+
+
+def invalidate_home_snapshot():
+    """Drop the cached snapshot so the next home request rebuilds it"""
+    cache.delete(HOME_SNAPSHOT_KEY)
+
+
+async def ahome_context():
+    """Resolve the snapshot id lists into the context the home template expects"""
+    snapshot = await aget_home_snapshot()
+    cards = snapshot['cards']
+
+    context = {
+        name: [cards[post_id] for post_id in snapshot['sections'][name] if post_id in cards]
+        for name in HOME_SECTIONS
+    }
+    context['trending_categories'] = snapshot['trending_categories']
+    return context
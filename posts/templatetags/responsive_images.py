@@ -0,0 +1,63 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from posts.images import FORMATS, closest_variant, get_derivatives
+
+register = template.Library()
+
+
+def _srcset(manifest, extension):
+    return ', '.join(f'{url} {width}w' for width, url in manifest['variants'][extension])
+
+
+@register.simple_tag
+def srcset(image, extension='jpeg'):
+    """`srcset` value listing every width of an image, or '' if it has none"""
+    manifest = get_derivatives(image)
+    return _srcset(manifest, extension) if manifest else ''
+
+
+def _original_url(image):
+    if image and hasattr(image, 'url'):
+        return image.url
+    return ''
+
+
+@register.simple_tag
+def image_url(image, width, extension='jpeg', fallback=''):
+    """URL of the smallest derivative at least `width` pixels wide.
+
+    For places srcset cannot reach, such as CSS backgrounds. Without
+    derivatives this is the original file's URL, or `fallback`.
+    """
+    manifest = get_derivatives(image)
+    if manifest:
+        return closest_variant(manifest, int(width), extension)
+    return _original_url(image) or fallback
+
+
+@register.simple_tag
+def picture(image, sizes='100vw', alt='', fallback='', **attrs):
+    """<picture> with WebP and JPEG sources at every derivative width.
+
+    `image` is an ImageField file, a storage name or a manifest from
+    posts.images. `sizes` should describe the rendered width (for a 40px
+    avatar, "40px") so the browser downloads the smallest adequate file.
+    Extra keyword arguments become attributes of the <img>; without
+    derivatives a plain <img> of the original (or `fallback`) is rendered.
+    """
+    manifest = get_derivatives(image)
+    attrs.setdefault('loading', 'lazy')
+    attrs.setdefault('decoding', 'async')
+    extra = format_html_join('', ' {}="{}"', attrs.items())
+
+    if not manifest:
+        return format_html('<img src="{}" alt="{}"{}>', _original_url(image) or fallback, alt, extra)
+
+    return format_html(
+        '<picture><source type="{}" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}"{}></picture>',
+        FORMATS['webp'][1], _srcset(manifest, 'webp'), sizes,
+        closest_variant(manifest, 640), _srcset(manifest, 'jpeg'), sizes,
+        manifest['width'], manifest['height'], alt, extra,
+    )
@@ -1,3 +1,1074 @@
-from django.test import TestCase
+import base64
+import gzip
+import importlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+from unittest import mock, skipUnless
+from datetime import datetime, timezone as dt_timezone
+from io import BytesIO
+from pathlib import Path
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, IntegrityError, connection, connections, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import CommandError, call_command
+from django.middleware.csrf import _unmask_cipher_token
+from django.test import Client
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.test import RequestFactory
+from django.utils import timezone
+from PIL import Image
+from taggit.models import Tag
+
+from blog import replicas
+from blog.concurrent import execute_wrapper, gather
+from blog.middleware import QueryBudgetExceeded, QueryRecorder
+from blog.sitemaps import build_sitemaps
+from blog.staticfiles import IMMUTABLE, serve as serve_static
+from categories.models import Category
+from .benchmarks import benchmark_urls, seed
+from .feeds import get_feed
+from . import counters, images, related
+from .models import Post, PostViewBucket, RelatedPost
+from .pagination import CursorPaginator, decode_cursor, encode_cursor
+from .related import compute_related_posts, rebuild_related_posts
+from .search import LikeSearchBackend, SQLiteSearchBackend, get_search_backend, search_posts
+from .trending import record_view_buckets
+
+
+@override_settings(DATABASE_ROUTERS=['blog.replicas.ReplicaRouter'])
+class ReplicaRoutingTests(TransactionTestCase):
+    """Reads routed to a replica that is behind the primary"""
+
+    def setUp(self):
+        cache.clear()
+        author = get_user_model().objects.create_user('author', password='x')
+        self.post = Post.objects.create(
+            title='Post', slug='post', author=author, content='<p>Body</p>',
+            status='published', published_date=timezone.now(),
+        )
+        self.hour = datetime(2024, 1, 1, 12, tzinfo=dt_timezone.utc)
+
+        # The replica is a snapshot taken before the view bucket below exists
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'replica.sqlite3')
+        connections['default'].ensure_connection()
+        with sqlite3.connect(path) as replica:
+            connections['default'].connection.backup(replica)
+        connections.databases['replica1'] = {**connections.databases['default'], 'NAME': path}
+        self.addCleanup(self.remove_replica)
+
+        PostViewBucket.objects.create(post=self.post, hour=self.hour, views=1)
+        self.new_post = Post.objects.create(
+            title='Not replicated yet', slug='new', author=author, content='<p>Body</p>',
+            status='published', published_date=timezone.now(),
+        )
+
+        token = replicas._read_alias.set('replica1')
+        self.addCleanup(replicas._read_alias.reset, token)
+
+    def remove_replica(self):
+        connections['replica1'].close()
+        del connections['replica1']
+        del connections.databases['replica1']
+
+    def test_reads_outside_a_transaction_use_the_replica(self):
+        self.assertFalse(PostViewBucket.objects.exists())
+        self.assertEqual(Post.objects.get().pk, self.post.pk)
+
+    def test_reads_inside_a_transaction_use_the_primary(self):
+        with transaction.atomic():
+            self.assertTrue(PostViewBucket.objects.exists())
+
+    def test_use_primary(self):
+        with replicas.use_primary():
+            self.assertTrue(PostViewBucket.objects.exists())
+
+    def test_feeds_are_built_from_the_primary(self):
+        self.assertIn('Not replicated yet', get_feed('atom')['xml'])
+
+    def test_feed_views_are_kept_on_the_primary(self):
+        self.assertIn('feed', settings.REPLICA_EXCLUDED_VIEWS)
+        self.assertIn('replica1', replicas.replica_aliases())
+        response = self.client.get(reverse('feed', args=['rss']))
+        self.assertContains(response, 'Not replicated yet')
+
+    def test_a_view_cannot_be_both_routed_and_excluded(self):
+        with override_settings(REPLICA_EXCLUDED_VIEWS=['feed', 'post_list']):
+            with self.assertRaisesMessage(ImproperlyConfigured, 'post_list'):
+                replicas.ReplicaMiddleware(lambda request: None)
+
+    def test_page_cache_misses_render_from_the_primary(self):
+        url = self.new_post.get_absolute_url()
+        self.assertEqual(self.client.get(url).status_code, 200)
+        # Logged-in pages are not cached, so they may come from the replica
+        self.client.force_login(self.new_post.author)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_flush_adds_to_existing_buckets(self):
+        with transaction.atomic():
+            record_view_buckets(self.hour, {self.post.id: 2})
+        self.assertEqual(PostViewBucket.objects.using('default').get().views, 3)
+
+
+class ConcurrentQueryTests(TransactionTestCase):
+
+    def queries(self):
+        recorder = QueryRecorder()
+        with execute_wrapper(recorder):
+            counts = async_to_sync(gather)(Post.objects.count, PostViewBucket.objects.count)
+        self.assertEqual(counts, [0, 0])
+        return recorder.count
+
+    @override_settings(CONCURRENT_QUERIES=True)
+    def test_worker_queries_are_recorded(self):
+        self.assertEqual(self.queries(), 2)
+
+    @override_settings(CONCURRENT_QUERIES=False)
+    def test_sequential_queries_are_recorded(self):
+        self.assertEqual(self.queries(), 2)
+
+
+@override_settings(CONCURRENT_QUERIES=False)
+class AsyncMiddlewareTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = get_user_model().objects.create_user('author', 'author@example.com', 'x')
+        Post.objects.create(
+            title='Post', slug='post', author=author, content='<p>Body</p>',
+            status='published', published_date=timezone.now(),
+        )
+
+    async def get(self, url):
+        return await self.async_client.get(url)
+
+    @override_settings(DEBUG=True)
+    def test_asgi_stack_is_not_adapted(self):
+        with self.assertLogs('django.request', 'DEBUG') as logs:
+            logging.getLogger('django.request').debug('Loading middleware')
+            ASGIHandler()
+        adapted = [message for message in logs.output if 'adapted for middleware' in message]
+        self.assertEqual(adapted, [])
+
+    @override_settings(QUERY_BUDGET_RAISE=True, PAGE_CACHE_TIMEOUT=0)
+    def test_queries_of_async_views_are_budgeted(self):
+        cache.clear()
+        self.assertEqual(async_to_sync(self.get)(reverse('home')).status_code, 200)
+        self.assertIsNone(replicas._read_alias.get())
+        # The queries the view ran from sync_to_async threads were counted
+        cache.clear()
+        with override_settings(QUERY_BUDGETS={'home': 0}), self.assertRaises(QueryBudgetExceeded):
+            async_to_sync(self.get)(reverse('home'))
+
+
+@override_settings(CONCURRENT_QUERIES=False, PAGE_CACHE_TIMEOUT=0)
+class SidebarTests(TestCase):
+
+    def test_category_colours_survive_the_cache(self):
+        cache.clear()
+        author = get_user_model().objects.create_user('author', 'author@example.com', 'x')
+        category = Category.objects.create(name='Sport', color='danger')
+        post = Post.objects.create(
+            title='Post', slug='post', author=author, category=category, content='<p>Body</p>',
+            status='published', published_date=timezone.now(),
+        )
+        for _ in range(2):
+            response = self.client.get(post.get_absolute_url())
+            self.assertContains(response, 'class="m-0 text-danger">Sport</h6>')
+
+
+class RelatedPostsTests(TransactionTestCase):
+
+    def setUp(self):
+        self.author = get_user_model().objects.create_user('author', password='x')
+
+    def make_post(self, slug, tags, status='published'):
+        post = Post.objects.create(
+            title=slug, slug=slug, author=self.author, content='<p>Body</p>', status=status,
+        )
+        post.tags.add(*tags)
+        return post
+
+    @mock.patch('posts.signals.refresh_related_posts')
+    def test_one_refresh_per_post_per_transaction(self, refresh):
+        with transaction.atomic():
+            post = self.make_post('a', ['python', 'django'])
+            post.tags.set(['python'])
+            refresh.assert_not_called()
+        refresh.assert_called_once_with(post)
+
+    @mock.patch('posts.signals.refresh_related_posts')
+    def test_edits_that_do_not_affect_ranking_do_not_refresh(self, refresh):
+        post = self.make_post('a', ['python'])
+        refresh.reset_mock()
+        post.title = 'Renamed'
+        post.save()
+        post.tags.add('python')
+        refresh.assert_not_called()
+
+        post.status = 'draft'
+        post.save()
+        refresh.assert_called_once_with(post)
+
+    @mock.patch('posts.signals.refresh_related_posts')
+    def test_rolled_back_refresh_does_not_block_the_next(self, refresh):
+        post = self.make_post('a', ['python'])
+        refresh.reset_mock()
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                post.tags.add('django')
+                raise RuntimeError
+        refresh.assert_not_called()
+
+        with transaction.atomic():
+            post.tags.add('web')
+        refresh.assert_called_once_with(post)
+
+    def test_migration_backfills_related_posts(self):
+        posts = [self.make_post(slug, ['python']) for slug in 'abc']
+        RelatedPost.objects.all().delete()
+
+        migration = 'posts', '0012_backfill_related_posts'
+        state = MigrationExecutor(connection).loader.project_state(migration)
+        importlib.import_module('posts.migrations.' + migration[1]).backfill_related_posts(state.apps, None)
+        self.assertCountEqual(
+            RelatedPost.objects.filter(post=posts[0]).values_list('related_id', flat=True),
+            [posts[1].id, posts[2].id],
+        )
+
+    def test_refresh_fan_out_is_capped(self):
+        posts = [self.make_post(f'p{n}', ['python']) for n in range(4)]
+        rebuild_related_posts()
+        with mock.patch.object(related, 'REFRESH_NEIGHBOURS', 1), \
+                mock.patch.object(related, 'compute_related_posts', wraps=compute_related_posts) as compute:
+            related.refresh_related_posts(posts[0])
+        # The post itself plus one neighbour
+        self.assertEqual(compute.call_count, 2)
+
+    def test_incremental_ranking_matches_full_rebuild(self):
+        posts = [
+            self.make_post('a', ['python', 'django']),
+            self.make_post('b', ['python']),
+            self.make_post('c', ['django', 'web']),
+            self.make_post('d', ['web']),
+        ]
+        # Drafts must not change the tag weights
+        self.make_post('draft', ['python', 'python-draft'], status='draft')
+        rebuild_related_posts()
+        for post in posts:
+            stored = [
+                (related_id, round(score, 6)) for related_id, score in RelatedPost.objects.filter(
+                    post=post
+                ).order_by('-score').values_list('related_id', 'score')
+            ]
+            computed = [(related_id, round(score, 6)) for related_id, score in compute_related_posts(post)]
+            self.assertEqual(computed, stored)
+
+
+@override_settings(CONCURRENT_QUERIES=False, PAGE_CACHE_TIMEOUT=0)
+class ConditionalGetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = get_user_model().objects.create_user('author', password='x')
+        cls.post = Post.objects.create(
+            title='Post', slug='post', author=author, content='<p>Body</p>', status='published',
+        )
+
+    @mock.patch('posts.counters.record_view')
+    def test_not_modified_still_counts_the_view(self, record_view):
+        url = self.post.get_absolute_url()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(record_view.call_args_list, [mock.call(self.post.id)] * 2)
+
+
+# Stand-ins for the list templates this tree does not ship, touching what
+# a real listing shows so the budgets cover the view's relations too
+POST_LIST_STUB = (
+    "{% extends 'base.html' %}{% block content %}{% for post in POSTS %}"
+    "<a href='{{ post.get_absolute_url }}'>{{ post.title }}</a>"
+    "{{ post.author.username }} {{ post.category.name }}{% endfor %}{% endblock %}"
+)
+LIST_TEMPLATE_STUBS = {
+    'posts/post_list.html': POST_LIST_STUB.replace('POSTS', 'posts'),
+    'posts/search_results.html': POST_LIST_STUB.replace('POSTS', 'results'),
+    'categories/category_posts.html': POST_LIST_STUB.replace('POSTS', 'posts'),
+    'tags/tag_posts.html': POST_LIST_STUB.replace('POSTS', 'posts'),
+    'tags/tag_list.html': (
+        "{% extends 'base.html' %}{% block content %}"
+        "{% for tag in tags %}{{ tag.name }}{% endfor %}{% endblock %}"
+    ),
+}
+
+
+STUB_TEMPLATES = [{
+    **settings.TEMPLATES[0],
+    'APP_DIRS': False,
+    'OPTIONS': {
+        **settings.TEMPLATES[0]['OPTIONS'],
+        'loaders': [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+            ('django.template.loaders.locmem.Loader', LIST_TEMPLATE_STUBS),
+        ],
+    },
+}]
+
+
+@override_settings(CONCURRENT_QUERIES=False, QUERY_BUDGET_RAISE=True, TEMPLATES=STUB_TEMPLATES)
+class QueryBudgetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        seed(60)
+
+    def test_views_stay_within_their_budgets(self):
+        for name, url in benchmark_urls():
+            with self.subTest(name):
+                cache.clear()
+                # QueryBudgetExceeded propagates out of the test client
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+
+def make_cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+@override_settings(TEMPLATES=STUB_TEMPLATES, PAGE_CACHE_TIMEOUT=0)
+class CursorPaginationTests(TestCase):
+
+    MALFORMED = [
+        '!!!',
+        'é',
+        make_cursor(5),
+        make_cursor({'n': 1}),
+        make_cursor(['n']),
+        make_cursor(['x', '2024-01-01T00:00:00+00:00', 1]),
+        make_cursor(['n', 'yesterday', 1]),
+        make_cursor(['n', '2024-13-01T00:00:00+00:00', 1]),
+        make_cursor(['n', '2024-01-01T00:00:00', 1]),
+        make_cursor(['n', '9999-12-31T23:59:59-05:00', 1]),
+        make_cursor(['n', '0001-01-01T00:00:00+05:00', 1]),
+        make_cursor(['n', '2024-01-01T00:00:00+00:00', '1']),
+        make_cursor(['n', '2024-01-01T00:00:00+00:00', 2 ** 70]),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        author = get_user_model().objects.create_user('author', 'author@example.com', 'x')
+        cls.posts = [
+            Post.objects.create(
+                title=f'Post {number}', slug=f'post-{number}', author=author, content='<p>Body</p>',
+                status='published', published_date=datetime(2024, 1, number + 1, tzinfo=dt_timezone.utc),
+            )
+            for number in range(3)
+        ]
+
+    def test_malformed_cursors_are_ignored(self):
+        paginator = CursorPaginator(Post.objects.all(), 2)
+        for token in self.MALFORMED:
+            with self.subTest(token):
+                self.assertIsNone(decode_cursor(token))
+                page = paginator.get_page(token)
+                self.assertEqual(list(page), [self.posts[2], self.posts[1]])
+                self.assertFalse(page.has_previous)
+
+    def test_malformed_cursor_renders_the_first_page(self):
+        for token in self.MALFORMED:
+            with self.subTest(token):
+                response = self.client.get(reverse('post_list'), {'cursor': token})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(list(response.context['posts']), self.posts[::-1])
+
+    def test_cursors_round_trip(self):
+        paginator = CursorPaginator(Post.objects.all(), 2)
+        page = paginator.get_page(encode_cursor('n', self.posts[1]))
+        self.assertEqual((list(page), page.has_next, page.has_previous), ([self.posts[0]], False, True))
+        page = paginator.get_page(page.previous_cursor)
+        self.assertEqual((list(page), page.has_next, page.has_previous), ([self.posts[2], self.posts[1]], True, False))
+
+
+class SearchIndexTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = get_user_model().objects.create_user('author', 'author@example.com', 'x')
+
+    def make_post(self, slug, title, content='<p>Body</p>', tags=(), status='published'):
+        post = Post.objects.create(
+            title=title, slug=slug, author=self.author, content=content, status=status,
+        )
+        post.tags.add(*tags)
+        return post
+
+    def search(self, query):
+        return list(search_posts(Post.objects.all(), query))
+
+    def test_only_published_posts_are_indexed(self):
+        post = self.make_post('caching', 'Caching in Django')
+        draft = self.make_post('draft', 'Caching drafts', status='draft')
+        self.assertEqual(self.search('caching'), [post])
+
+        draft.status = 'published'
+        draft.save()
+        self.assertCountEqual(self.search('caching'), [post, draft])
+        post.status = 'draft'
+        post.save()
+        self.assertEqual(self.search('caching'), [draft])
+        draft.delete()
+        self.assertEqual(self.search('caching'), [])
+
+    def test_title_matches_rank_above_body_matches(self):
+        body = self.make_post('body', 'Notes', content='<p>Some words about <b>redis</b></p>')
+        title = self.make_post('title', 'Redis in production')
+        tagged = self.make_post('tagged', 'Queues', tags=['redis'])
+        self.assertEqual(self.search('redis'), [title, tagged, body])
+
+    def test_tag_changes_reindex_posts(self):
+        post = self.make_post('post', 'Notes', tags=['python'])
+        self.assertEqual(self.search('python'), [post])
+        post.tags.set(['django'])
+        self.assertEqual(self.search('python'), [])
+
+        tag = Tag.objects.get(name='django')
+        tag.name = 'flask'
+        tag.save()
+        self.assertEqual(self.search('django'), [])
+        self.assertEqual(self.search('flask'), [post])
+
+        tag.delete()
+        self.assertEqual(self.search('flask'), [])
+        self.assertEqual(self.search('notes'), [post])
+
+    def test_user_input_is_not_query_syntax(self):
+        post = self.make_post('caching', 'Caching: the "hard" part')
+        for query in ('cach', '"caching', '(caching', 'caching*', '-caching', 'caching: "hard', 'part^'):
+            with self.subTest(query):
+                self.assertEqual(self.search(query), [post])
+        # Operators are searched for as words
+        self.assertEqual(self.search('caching OR nothing'), [])
+        self.assertEqual(self.search('!!!'), [])
+
+    def test_migration_backfills_the_index(self):
+        post = self.make_post('caching', 'Caching in Django', tags=['performance'])
+        get_search_backend().clear()
+        self.assertEqual(self.search('performance'), [])
+
+        migration = importlib.import_module('posts.migrations.0011_backfill_search_index')
+        migration.backfill_search_index(django_apps, mock.Mock(connection=connection))
+        self.assertEqual(self.search('performance'), [post])
+        self.assertEqual(self.search('caching'), [post])
+
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite FTS5 syntax')
+    def test_sqlite_match_expression(self):
+        backend = SQLiteSearchBackend()
+        self.assertEqual(backend.match_expression('caching "in" django'), '"caching" "in" "django"*')
+        self.assertIsNone(backend.match_expression('*-"'))
+
+    def test_like_fallback(self):
+        post = self.make_post('post', 'Notes', tags=['Redis'])
+        self.assertEqual(list(LikeSearchBackend().search(Post.objects.all(), 'redis')), [post])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'PostgreSQL full-text search')
+class PostgresSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = get_user_model().objects.create_user('author', 'author@example.com', 'x')
+
+    def test_reindexing_replaces_the_document(self):
+        post = Post.objects.create(
+            title='Running queries', slug='post', author=self.author, content='<p>Body</p>',
+            status='published',
+        )
+        post.title = 'Caching pages'
+        post.save()
+        self.assertEqual(list(search_posts(Post.objects.all(), 'run')), [])
+        self.assertEqual(list(search_posts(Post.objects.all(), 'cached')), [post])
+        # websearch syntax is accepted, unbalanced quotes included
+        self.assertEqual(list(search_posts(Post.objects.all(), '"caching -running')), [post])
+
+
+class ViewBucketTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = get_user_model().objects.create_user('author', 'author@example.com', 'x')
+        cls.posts = [
+            Post.objects.create(
+                title=f'Post {number}', slug=f'post-{number}', author=author, content='<p>Body</p>',
+                status='published',
+            )
+            for number in range(2)
+        ]
+        cls.hour = datetime(2024, 1, 1, 12, tzinfo=dt_timezone.utc)
+
+    def buckets(self):
+        return dict(PostViewBucket.objects.filter(hour=self.hour).values_list('post_id', 'views'))
+
+    def test_adds_to_existing_buckets_and_creates_missing_ones(self):
+        first, second = self.posts
+        PostViewBucket.objects.create(post=first, hour=self.hour, views=2)
+        record_view_buckets(self.hour, {first.id: 3, second.id: 1, second.id + 100: 5})
+        self.assertEqual(self.buckets(), {first.id: 5, second.id: 1})
+
+    def test_bucket_created_by_a_concurrent_flush(self):
+        post = self.posts[0]
+        real = PostViewBucket.objects.bulk_create
+
+        def concurrent_flush_first(objs, **kwargs):
+            PostViewBucket.objects.create(post=post, hour=self.hour, views=4)
+            return real(objs, **kwargs)
+
+        with mock.patch.object(PostViewBucket.objects, 'bulk_create', side_effect=concurrent_flush_first):
+            try:
+                with transaction.atomic():
+                    record_view_buckets(self.hour, {post.id: 3})
+            except IntegrityError:
+                self.fail('Concurrent flushes of one hour collided')
+        self.assertEqual(self.buckets(), {post.id: 7})
+
+    @override_settings(VIEW_COUNT_INLINE_FLUSH=True)
+    def test_inline_flush_errors_do_not_escape(self):
+        with mock.patch.object(counters, '_last_flush', float('-inf')), \
+                mock.patch.object(counters, 'flush_view_counts', side_effect=DatabaseError('locked')), \
+                self.assertLogs('posts.counters', 'ERROR'):
+            counters.record_view(self.posts[0].id)
+
+
+@override_settings(VIEW_COUNT_INLINE_FLUSH=False, VIEW_COUNT_FLUSH_INTERVAL=30)
+class ViewCounterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = get_user_model().objects.create_user('author', 'author@example.com', 'x')
+        cls.posts = [
+            Post.objects.create(
+                title=f'Post {number}', slug=f'post-{number}', author=author, content='<p>Body</p>',
+                status='published',
+            )
+            for number in range(2)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.window = 1000
+        patcher = mock.patch.object(counters, '_window', lambda now=None: self.window)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def view_counts(self):
+        return list(Post.objects.order_by('id').values_list('view_count', flat=True))
+
+    def record(self, *posts):
+        for post in posts:
+            counters.record_view(post.id)
+
+    def test_closed_windows_are_flushed_once(self):
+        first, second = self.posts
+        self.record(first, first, second)
+        self.window += 1
+        self.record(first)
+        self.assertEqual(counters.flush_view_counts(), 0)
+        self.assertEqual(self.view_counts(), [0, 0])
+
+        # The window before the current one is left for late requests
+        self.window += 1
+        self.assertEqual(counters.flush_view_counts(), 3)
+        self.assertEqual(self.view_counts(), [2, 1])
+        self.assertEqual(PostViewBucket.objects.get(post=first).views, 2)
+        self.assertEqual(counters.flush_view_counts(), 0)
+        self.assertEqual(self.view_counts(), [2, 1])
+
+    def test_killed_after_commit_does_not_count_twice(self):
+        self.record(self.posts[0])
+        self.window += 2
+        real = counters._apply_counts
+
+        def killed_after_commit(*args):
+            real(*args)
+            raise KeyboardInterrupt
+
+        with mock.patch.object(counters, '_apply_counts', side_effect=killed_after_commit):
+            with self.assertRaises(KeyboardInterrupt):
+                counters.flush_view_counts()
+        self.assertEqual(counters.flush_view_counts(), 0)
+        self.assertEqual(self.view_counts(), [1, 0])
+
+    def test_failed_write_keeps_the_buffer(self):
+        self.record(self.posts[0])
+        self.window += 2
+        with mock.patch.object(counters, '_apply_counts', side_effect=DatabaseError('locked')):
+            with self.assertRaises(DatabaseError):
+                counters.flush_view_counts()
+        self.assertEqual(self.view_counts(), [0, 0])
+        self.assertEqual(counters.flush_view_counts(), 1)
+        self.assertEqual(self.view_counts(), [1, 0])
+
+    def test_only_one_flush_at_a_time(self):
+        self.record(self.posts[0])
+        self.window += 2
+        cache.add(counters.LOCK_KEY, 1)
+        self.assertIsNone(counters.flush_view_counts())
+        self.assertEqual(self.view_counts(), [0, 0])
+        cache.delete(counters.LOCK_KEY)
+        self.assertEqual(counters.flush_view_counts(), 1)
+
+    def test_command_requires_a_shared_cache(self):
+        with self.assertRaisesMessage(CommandError, 'shared cache'):
+            call_command('flush_view_counts')
+
+
+@override_settings(CONCURRENT_QUERIES=False, PAGE_CACHE_TIMEOUT=600)
+class PageCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = get_user_model().objects.create_user('author', 'author@example.com', 'x')
+        cls.post = Post.objects.create(
+            title='Cached post', slug='post', author=cls.author, content='Cached body',
+            status='published', published_date=timezone.now(),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.url = self.post.get_absolute_url()
+
+    def get(self, client=None):
+        return (client or self.client).get(self.url)
+
+    def warm(self):
+        self.assertEqual(self.get()['X-Cache'], 'MISS')
+
+    def test_anonymous_gets_are_served_from_the_cache(self):
+        self.warm()
+        with self.assertNumQueries(0):
+            response = self.get()
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertContains(response, 'Cached body')
+
+    def test_logged_in_users_and_posts_bypass_the_cache(self):
+        self.warm()
+        response = self.client.post(self.url, {'content': ''})
+        self.assertFalse(response.has_header('X-Cache'))
+        self.assertEqual(self.get()['X-Cache'], 'HIT')
+
+        self.client.force_login(self.author)
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('X-Cache'))
+
+    def test_csrf_token_is_the_visitors_own(self):
+        self.warm()
+        for client in (self.client, Client()):
+            response = self.get(client)
+            self.assertEqual(response['X-Cache'], 'HIT')
+            tokens = re.findall(rb'name="csrfmiddlewaretoken" value="([^"]+)"', response.content)
+            self.assertTrue(tokens)
+            secret = client.cookies[settings.CSRF_COOKIE_NAME].value
+            for token in tokens:
+                self.assertEqual(_unmask_cipher_token(token.decode()), secret)
+
+    def test_saving_a_post_purges_its_pages(self):
+        self.warm()
+        self.assertEqual(self.get()['X-Cache'], 'HIT')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.content = 'Edited body'
+            self.post.save()
+        response = self.get()
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertContains(response, 'Edited body')
+        self.assertEqual(self.get()['X-Cache'], 'HIT')
+
+
+class SitemapTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = get_user_model().objects.create_user('author', 'author@example.com', 'x')
+        cls.posts = [
+            Post.objects.create(
+                title=f'Post {number}', slug=f'post-{number}', author=cls.author, content='<p>Body</p>',
+                status='published', published_date=timezone.now(),
+            )
+            for number in range(5)
+        ]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        settings_override = override_settings(SITEMAP_ROOT=self.root, SITEMAP_SHARD_SIZE=2)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def build(self, **kwargs):
+        written = []
+        build_sitemaps(progress=lambda section, shard: written.append((section, shard)), **kwargs)
+        return [shard for section, shard in written if section == 'posts']
+
+    def read(self, name):
+        with open(os.path.join(self.root, name)) as f:
+            return f.read()
+
+    def post_shard(self, post):
+        return str(post.pk // 2)
+
+    def test_posts_are_sharded_by_primary_key(self):
+        shards = {self.post_shard(post) for post in self.posts}
+        self.assertEqual(sorted(self.build()), sorted(shards))
+        index = self.read('sitemap.xml')
+        for post in self.posts:
+            content = self.read(f'sitemap-posts-{self.post_shard(post)}.xml')
+            self.assertIn(f'<loc>{settings.SITE_URL}{post.get_absolute_url()}</loc>', content)
+            self.assertIn(f'sitemap-posts-{self.post_shard(post)}.xml</loc>', index)
+        for shard in shards:
+            self.assertLessEqual(self.read(f'sitemap-posts-{shard}.xml').count('<url>'), 2)
+        self.assertEqual(self.build(), [])
+
+    def test_lastmod_is_the_newest_update_in_the_shard(self):
+        post = self.posts[-1]
+        shard = self.post_shard(post)
+        Post.objects.filter(pk=post.pk).update(updated_at=datetime(2030, 1, 1, 12, 30, 15, 5, dt_timezone.utc))
+        self.build()
+        self.assertIn('<lastmod>2030-01-01T12:30:15+00:00</lastmod>', self.read(f'sitemap-posts-{shard}.xml'))
+        self.assertIn(
+            f'sitemap-posts-{shard}.xml</loc>\n<lastmod>2030-01-01T12:30:15+00:00</lastmod>',
+            self.read('sitemap.xml'),
+        )
+        state = json.loads(self.read('state.json'))
+        self.assertEqual(state['posts'][shard][1], '2030-01-01T12:30:15.000005+00:00')
+
+        # An edit within the same second still moves the watermark
+        Post.objects.filter(pk=post.pk).update(updated_at=datetime(2030, 1, 1, 12, 30, 15, 6, dt_timezone.utc))
+        self.assertEqual(self.build(), [shard])
+
+    def test_publishing_and_unpublishing_rewrite_only_that_shard(self):
+        self.build()
+        # A shard that keeps another post, so it is rewritten rather than removed
+        post = next(
+            post for post in self.posts
+            if sum(self.post_shard(other) == self.post_shard(post) for other in self.posts) > 1
+        )
+        post.status = 'draft'
+        post.save()
+        self.assertEqual(self.build(), [self.post_shard(post)])
+        self.assertNotIn(post.get_absolute_url(), self.read(f'sitemap-posts-{self.post_shard(post)}.xml'))
+
+        post.status = 'published'
+        post.save()
+        self.assertEqual(self.build(), [self.post_shard(post)])
+        self.assertIn(post.get_absolute_url(), self.read(f'sitemap-posts-{self.post_shard(post)}.xml'))
+
+    def test_emptied_shards_are_removed(self):
+        self.build()
+        post = self.posts[-1]
+        shard = self.post_shard(post)
+        Post.objects.filter(pk__gte=int(shard) * 2).update(status='draft')
+        self.build()
+        self.assertFalse(os.path.exists(os.path.join(self.root, f'sitemap-posts-{shard}.xml')))
+        self.assertFalse(os.path.exists(os.path.join(self.root, f'sitemap-posts-{shard}.xml.gz')))
+        self.assertNotIn(f'sitemap-posts-{shard}.xml', self.read('sitemap.xml'))
+
+
+class FeedTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = get_user_model().objects.create_user('author', 'author@example.com', 'x')
+        cls.news = Category.objects.create(name='News', slug='news')
+        cls.sport = Category.objects.create(name='Sport', slug='sport')
+        cls.post = Post.objects.create(
+            title='News post', slug='news-post', author=cls.author, category=cls.news,
+            content='<p>Body</p>', status='published', published_date=timezone.now(),
+        )
+        cls.other = Post.objects.create(
+            title='Sport post', slug='sport-post', author=cls.author, category=cls.sport,
+            content='<p>Body</p>', status='published', published_date=timezone.now(),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def save(self, post, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            for field, value in fields.items():
+                setattr(post, field, value)
+            post.save()
+
+    def test_unchanged_feeds_are_served_from_the_cache(self):
+        entry = get_feed('atom')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_feed('atom'), entry)
+
+        url = reverse('scoped_feed', args=['category', 'news', 'rss'])
+        response = self.client.get(url)
+        self.assertContains(response, 'News post')
+        self.assertNotContains(response, 'Sport post')
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_editing_a_post_retires_the_feeds_showing_it(self):
+        get_feed('atom')
+        get_feed('atom', 'category', 'news')
+        sport = get_feed('atom', 'category', 'sport')
+        self.save(self.post, title='Edited post')
+
+        self.assertIn('Edited post', get_feed('atom')['xml'])
+        self.assertIn('Edited post', get_feed('atom', 'category', 'news')['xml'])
+        with self.assertNumQueries(0):
+            self.assertEqual(get_feed('atom', 'category', 'sport'), sport)
+
+    def test_publishing_and_unpublishing_retire_the_feeds(self):
+        get_feed('rss')
+        get_feed('rss', 'author', 'author')
+        self.save(self.other, status='draft')
+        self.assertNotIn('Sport post', get_feed('rss')['xml'])
+        self.assertNotIn('Sport post', get_feed('rss', 'author', 'author')['xml'])
+
+        self.save(self.other, status='published')
+        self.assertIn('Sport post', get_feed('rss')['xml'])
+        self.assertIn('Sport post', get_feed('rss', 'author', 'author')['xml'])
+
+    def test_unknown_scopes_are_not_found(self):
+        response = self.client.get(reverse('scoped_feed', args=['tag', 'missing', 'atom']))
+        self.assertEqual(response.status_code, 404)
+
+
+class SQLiteBackendTests(TransactionTestCase):
+    """blog.sqlite against a database file (the test database is in memory)"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        connections.databases['sqlite_file'] = {
+            **connections.databases['default'],
+            'ENGINE': 'blog.sqlite',
+            'NAME': os.path.join(directory.name, 'db.sqlite3'),
+            'TEST': {},
+        }
+        self.addCleanup(self.remove_database)
+        with connections['sqlite_file'].cursor() as cursor:
+            cursor.execute('CREATE TABLE counter (id integer PRIMARY KEY, value integer)')
+            cursor.execute('INSERT INTO counter VALUES (1, 0)')
+
+    def remove_database(self):
+        connections['sqlite_file'].close()
+        del connections['sqlite_file']
+        del connections.databases['sqlite_file']
+
+    def pragma(self, name):
+        with connections['sqlite_file'].cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_are_applied_to_new_connections(self):
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
+        self.assertEqual(self.pragma('busy_timeout'), settings.SQLITE_PRAGMAS['busy_timeout'])
+        # NORMAL
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('cache_size'), settings.SQLITE_PRAGMAS['cache_size'])
+        # MEMORY
+        self.assertEqual(self.pragma('temp_store'), 2)
+
+    def increment(self, read, other_read):
+        """Read-then-write transaction, as a view that loads and saves a row would"""
+        with transaction.atomic(using='sqlite_file'):
+            with connections['sqlite_file'].cursor() as cursor:
+                cursor.execute('SELECT value FROM counter WHERE id = 1')
+                value = cursor.fetchone()[0]
+                read.set()
+                # Give the other writer the chance to read the same value
+                other_read.wait(0.5)
+                cursor.execute('UPDATE counter SET value = %s WHERE id = 1', [value + 1])
+
+    def race(self):
+        """Run two overlapping increments; returns the errors they raised"""
+        errors = []
+        first_read, second_read = threading.Event(), threading.Event()
+
+        def run(read, other_read):
+            try:
+                self.increment(read, other_read)
+            except DatabaseError as e:
+                errors.append(e)
+
+        def first():
+            try:
+                run(first_read, second_read)
+            finally:
+                connections['sqlite_file'].close()
+
+        thread = threading.Thread(target=first)
+        thread.start()
+        self.assertTrue(first_read.wait(5))
+        run(second_read, first_read)
+        thread.join()
+        return errors
+
+    def test_concurrent_writers_wait_for_the_lock(self):
+        self.assertEqual(self.race(), [])
+        with connections['sqlite_file'].cursor() as cursor:
+            cursor.execute('SELECT value FROM counter WHERE id = 1')
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+    @override_settings(SQLITE_IMMEDIATE_TRANSACTIONS=False)
+    def test_deferred_transactions_fail_to_upgrade(self):
+        errors = self.race()
+        self.assertEqual(len(errors), 1)
+        self.assertIn('database is locked', str(errors[0]))
+
+
+class ImageDerivativeTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = get_user_model().objects.create_user('author', 'author@example.com', 'x')
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=directory.name, IMAGE_DERIVATIVE_WIDTHS=[160, 320, 640])
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, name, color, size=(400, 200)):
+        output = BytesIO()
+        Image.new('RGB', size, color).save(output, 'PNG')
+        return SimpleUploadedFile(name, output.getvalue(), content_type='image/png')
+
+    def variants(self):
+        directories, _ = default_storage.listdir(settings.IMAGE_DERIVATIVES_DIR)
+        return sorted(
+            name
+            for directory in directories
+            for name in default_storage.listdir(f'{settings.IMAGE_DERIVATIVES_DIR}/{directory}')[1]
+        )
+
+    def cached_manifest(self, image):
+        return cache.get(images._manifest_key(image.name))
+
+    def test_derivatives_are_generated_on_upload(self):
+        post = Post.objects.create(
+            title='Post', slug='post', author=self.author, content='<p>Body</p>',
+            featured_image=self.upload('photo.png', 'red'),
+        )
+        manifest = self.cached_manifest(post.featured_image)
+        self.assertEqual((manifest['width'], manifest['height']), (400, 200))
+        # Never upscaled: 640 is capped at the original width
+        self.assertEqual([width for width, url in manifest['variants']['webp']], [160, 320, 400])
+        self.assertEqual(len(self.variants()), 6)
+        for extension, urls in manifest['variants'].items():
+            for width, url in urls:
+                name = url[len(settings.MEDIA_URL):]
+                with default_storage.open(name) as f, Image.open(f) as variant:
+                    self.assertEqual(variant.format, images.FORMATS[extension][0])
+                    self.assertEqual(variant.width, width)
+
+        with mock.patch.object(images, 'generate_derivatives') as generate:
+            self.assertEqual(images.get_derivatives(post.featured_image), manifest)
+        generate.assert_not_called()
+
+    def test_replacing_an_image_generates_its_derivatives(self):
+        post = Post.objects.create(
+            title='Post', slug='post', author=self.author, content='<p>Body</p>',
+            featured_image=self.upload('photo.png', 'red'),
+        )
+        old = self.cached_manifest(post.featured_image)
+        post.featured_image = self.upload('photo.png', 'blue', (300, 300))
+        post.save()
+
+        manifest = self.cached_manifest(post.featured_image)
+        self.assertEqual((manifest['width'], manifest['height']), (300, 300))
+        self.assertEqual([width for width, url in manifest['variants']['jpeg']], [160, 300])
+        self.assertFalse(set(manifest['variants']['jpeg']) & set(old['variants']['jpeg']))
+        self.assertEqual(len(self.variants()), 6 + 4)
+
+    def test_saves_that_do_not_touch_the_image_skip_generation(self):
+        post = Post.objects.create(
+            title='Post', slug='post', author=self.author, content='<p>Body</p>',
+            featured_image=self.upload('photo.png', 'red'),
+        )
+        with mock.patch.object(images, 'generate_derivatives') as generate:
+            post.title = 'Renamed'
+            post.save(update_fields=['title'])
+        generate.assert_not_called()
+
+
+class StaticPipelineTests(TestCase):
+    """collectstatic with blog.staticfiles on a small source tree"""
+
+    STYLESHEET = "body { background: url('../assets/images/used.png'); }\n" + '.rule { color: red; }\n' * 40
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        source = Path(directory.name, 'source')
+        self.root = Path(directory.name, 'collected')
+        for name, content in {
+            'css/site.css': self.STYLESHEET.encode(),
+            'js/tiny.js': b'console.log(1);\n',
+            'assets/images/used.png': b'used',
+            'assets/images/unused.png': b'unused',
+        }.items():
+            (source / name).parent.mkdir(parents=True, exist_ok=True)
+            (source / name).write_bytes(content)
+
+        settings_override = override_settings(
+            STATICFILES_DIRS=[source], STATIC_ROOT=self.root,
+            STATICFILES_FINDERS=['blog.staticfiles.PrunedFileSystemFinder'],
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        self.manifest = json.loads((self.root / 'staticfiles.json').read_text())['paths']
+
+    def test_manifest_maps_every_collected_file_to_a_hashed_name(self):
+        self.assertEqual(set(self.manifest), {'css/site.css', 'js/tiny.js', 'assets/images/used.png'})
+        for name, hashed in self.manifest.items():
+            self.assertNotEqual(name, hashed)
+            self.assertTrue((self.root / hashed).is_file())
+        stylesheet = (self.root / self.manifest['css/site.css']).read_text()
+        self.assertIn(self.manifest['assets/images/used.png'].rsplit('/', 1)[1], stylesheet)
+
+    def test_text_assets_get_gzipped_siblings(self):
+        for name in ('css/site.css', self.manifest['css/site.css']):
+            path = self.root / name
+            self.assertEqual(gzip.decompress(Path(f'{path}.gz').read_bytes()), path.read_bytes())
+        # Too small to be worth compressing, and images are never compressed
+        self.assertFalse((self.root / (self.manifest['js/tiny.js'] + '.gz')).exists())
+        self.assertFalse((self.root / (self.manifest['assets/images/used.png'] + '.gz')).exists())
+
+    def test_unreferenced_files_in_prune_dirs_are_not_collected(self):
+        self.assertFalse((self.root / 'assets/images/unused.png').exists())
+
+    def test_hashed_files_are_served_compressed_and_immutable(self):
+        name = self.manifest['css/site.css']
+        request = RequestFactory().get('/static/' + name, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        response = serve_static(request, name)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Cache-Control'], IMMUTABLE)
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), (self.root / name).read_bytes())
+        response.close()
@@ -0,0 +1,26 @@
+import html
+
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+
+# Average reading speed: 200-250 words per minute
+WORDS_PER_MINUTE = 200
+
+SUMMARY_LENGTH = 300
+
+
+def plain_text(value):
+    """Strip markup and entities from rich-text content"""
+    return ' '.join(html.unescape(strip_tags(value or '')).split())
+
+
+def text_stats(content, excerpt=''):
+    """Derived fields stored on Post for a piece of rich-text content"""
+    text = plain_text(content)
+    word_count = len(text.split())
+    return {
+        'plain_text': text,
+        'word_count': word_count,
+        'read_time': max(1, word_count // WORDS_PER_MINUTE),  # At least 1 minute
+        'summary': Truncator(plain_text(excerpt) or text).chars(SUMMARY_LENGTH),
+    }
@@ -0,0 +1,90 @@
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Post, PostViewBucket
+
+BATCH_SIZE = 500
+
+
+def bucket_hour(timestamp):
+    """UTC hour a unix timestamp falls into"""
+    moment = datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def record_view_buckets(hour, counts):
+    """Add flushed view counts ({post_id: views}) to the hour's buckets.
+
+    Missing buckets are created empty, skipping any that another flush
+    created first, and every bucket is then incremented in the database, so
+    concurrent flushes of the same hour add up instead of colliding.
+    """
+    if not counts:
+        return
+    post_ids = list(counts)
+    # Posts deleted since they were viewed are skipped
+    live = []
+    for start in range(0, len(post_ids), BATCH_SIZE):
+        live.extend(Post.objects.filter(
+            id__in=post_ids[start:start + BATCH_SIZE]
+        ).values_list('id', flat=True))
+    PostViewBucket.objects.bulk_create(
+        [PostViewBucket(post_id=post_id, hour=hour, views=0) for post_id in live],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+    by_increment = defaultdict(list)
+    for post_id in live:
+        by_increment[counts[post_id]].append(post_id)
+    for increment, ids in by_increment.items():
+        for start in range(0, len(ids), BATCH_SIZE):
+            PostViewBucket.objects.filter(
+                hour=hour, post_id__in=ids[start:start + BATCH_SIZE]
+            ).update(views=F('views') + increment)
+
+
+def compute_trending_scores(now=None):
+    """Recompute Post.trending_score from recent view buckets.
+
+    Each bucket contributes its views decayed exponentially by age, with
+    TRENDING_HALF_LIFE_HOURS as the half-life, so a post needs sustained,
+    recent attention to stay on top. Buckets older than TRENDING_WINDOW_HOURS
+    are deleted. Returns the number of posts with a non-zero score.
+    """
+    now = now or timezone.now()
+    cutoff = now - timedelta(hours=settings.TRENDING_WINDOW_HOURS)
+    decay = math.log(2) / settings.TRENDING_HALF_LIFE_HOURS
+
+    scores = defaultdict(float)
+    for post_id, hour, views in PostViewBucket.objects.filter(
+        hour__gte=cutoff
+    ).values_list('post_id', 'hour', 'views').iterator(chunk_size=2000):
+        age_hours = max((now - hour).total_seconds(), 0) / 3600
+        scores[post_id] += views * math.exp(-decay * age_hours)
+
+    with transaction.atomic():
+        Post.objects.filter(trending_score__gt=0).exclude(
+            id__in=list(scores)
+        ).update(trending_score=0)
+        Post.objects.bulk_update(
+            [Post(id=post_id, trending_score=score) for post_id, score in scores.items()],
+            ['trending_score'],
+            batch_size=BATCH_SIZE,
+        )
+        PostViewBucket.objects.filter(hour__lt=cutoff).delete()
+
+    return len(scores)
+
+
+def trending_posts(limit=10):
+    """Top published posts by trending score, in one indexed query"""
+    return Post.objects.filter(
+        status='published', trending_score__gt=0
+    ).select_related('author', 'category').order_by('-trending_score')[:limit]
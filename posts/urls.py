@@ -1,13 +1,17 @@
-from django.urls import path
+from django.urls import path, re_path
 from . import views
 
 urlpatterns = [
     path('', views.home, name='home'),
     path('posts/', views.post_list, name='post_list'),
+    path('posts/trending/', views.trending, name='trending'),
     path('posts/create/', views.post_create, name='post_create'),
     path('posts/<int:pk>/update/', views.post_update, name='post_update'),
     path('posts/<int:pk>/delete/', views.post_delete, name='post_delete'),
     path('posts/<int:year>/<int:month>/<int:day>/<slug:slug>/', 
          views.post_detail, name='post_detail'),
     path('search/', views.search, name='search'),
+    re_path(r'^feeds/(?P<feed_format>atom|rss)/$', views.feed, name='feed'),
+    re_path(r'^feeds/(?P<kind>category|tag|author)/(?P<slug>[^/]+)/(?P<feed_format>atom|rss)/$',
+            views.feed, name='scoped_feed'),
 ]
\ No newline at end of file
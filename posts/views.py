@@ -1,90 +1,47 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, get_object_or_404, redirect
 from django.core.paginator import Paginator
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q, Count
+from django.db.models import Q, Count, Max
 from django.utils import timezone
+from blog.concurrent import gather
+from blog.conditional import conditional, make_validators
+from blog.pagecache import add_surrogate_keys, on_cache_hit, post_keys
 from .models import Post
+from .feeds import FORMATS as FEED_FORMATS, FeedNotFound, get_feed
 from .forms import PostForm, CommentForm
+from .pagination import paginate_by_cursor
+from .related import get_related_posts
+from .search import search_posts
+from .snapshot import ahome_context
+from .trending import trending_posts
 from categories.models import Category
 from comments.models import Comment
+from comments.threads import load_post_comments
 from taggit.models import Tag
 from newsletter.models import Subscriber
 
-def home(request):
+async def home(request):
     """Home page view with all sections"""
-    
-    # Hero posts (featured posts)
-    hero_posts = Post.objects.filter(
-        status='published',
-        featured_image__isnull=False
-    ).order_by('-published_date')[:5]
-    
-    # Highlights posts (recent popular posts)
-    highlights_posts = Post.objects.filter(
-        status='published'
-    ).order_by('-views_count', '-published_date')[:8]
-    
-    # Top highlights (last week's most viewed)
-    from django.utils import timezone
-    from datetime import timedelta
-    
-    last_week = timezone.now() - timedelta(days=7)
-    top_highlights = Post.objects.filter(
-        status='published',
-        published_date__gte=last_week
-    ).order_by('-views_count')[:5]
-    
-    # Trending categories
-    trending_categories = Category.objects.annotate(
-        post_count=Count('posts')
-    ).filter(post_count__gt=0).order_by('-post_count')[:8]
-    
-    # Sports posts
-    sports_category = Category.objects.filter(name__icontains='sport').first()
-    if sports_category:
-        sports_posts = Post.objects.filter(
-            category=sports_category,
-            status='published'
-        ).order_by('-published_date')[:4]
-    else:
-        sports_posts = Post.objects.filter(
-            status='published'
-        ).order_by('-published_date')[:4]
-    
-    # Sponsored posts
-    sponsored_posts = Post.objects.filter(
-        status='published',
-        is_sponsored=True
-    ).order_by('-published_date')[:6]
-    
-    # If not enough sponsored posts, get regular ones
-    if sponsored_posts.count() < 6:
-        regular_posts = Post.objects.filter(
-            status='published',
-            is_sponsored=False
-        ).order_by('-published_date')[:6 - sponsored_posts.count()]
-        sponsored_posts = list(sponsored_posts) + list(regular_posts)
-    
-    # Popular tags
-    popular_tags = Tag.objects.annotate(
-        post_count=Count('taggit_taggeditem_items')
-    ).order_by('-post_count')[:15]
-    
-    context = {
-        'hero_posts': hero_posts,
-        'highlights_posts': highlights_posts,
-        'top_highlights': top_highlights,
-        'trending_categories': trending_categories,
-        'sports_posts': sports_posts,
-        'sponsored_posts': sponsored_posts,
-        'popular_tags': popular_tags,
-    }
-    
-    return render(request, 'posts/home.html', context)
+    # Sections come from a prebuilt snapshot (see posts.snapshot), so a
+    # warm render does not touch the database.
+    context = await ahome_context()
+    # Context processors and templates use the ORM, so render off the event loop
+    return await sync_to_async(render)(request, 'posts/home.html', context)
+
+def post_list_validators(request):
+    # ETag only: a removed post cannot move a Last-Modified forward
+    stats = Post.objects.filter(status='published').aggregate(
+        latest=Max('updated_at'), count=Count('id'),
+    )
+    return make_validators(request, [stats['latest'], stats['count']], ['categories', 'sidebar'])
 
+@conditional(post_list_validators)
 def post_list(request):
-    posts_list = Post.objects.filter(status='published').order_by('-published_date')
+    posts_list = Post.objects.filter(status='published').select_related('author', 'category').order_by('-published_date')
     
     # Filter by category
     category_slug = request.GET.get('category')
@@ -101,72 +58,111 @@ def post_list(request):
     # Filter by search
     search_query = request.GET.get('q')
     if search_query:
-        posts_list = posts_list.filter(
-            Q(title__icontains=search_query) |
-            Q(content__icontains=search_query) |
-            Q(excerpt__icontains=search_query) |
-            Q(tags__name__icontains=search_query)
-        ).distinct()
-    
-    # Pagination
-    paginator = Paginator(posts_list, 10)
-    page = request.GET.get('page')
-    posts = paginator.get_page(page)
+        posts_list = search_posts(posts_list, search_query)
+    
+    # Pagination: search results are ranked and capped, so they keep
+    # numbered pages; plain listings use keyset pagination
+    if search_query:
+        paginator = Paginator(posts_list, 10)
+        page = request.GET.get('page')
+        posts = paginator.get_page(page)
+    else:
+        posts = paginate_by_cursor(request, posts_list, 10, with_total=True)
     
     categories = Category.objects.annotate(post_count=Count('posts'))
     
+    add_surrogate_keys(request, 'posts', 'categories', *post_keys(posts))
+    
     return render(request, 'posts/post_list.html', {
         'posts': posts,
         'categories': categories,
     })
 
 
-def post_detail(request, year, month, day, slug):
-    post = get_object_or_404(
-        Post,
+def post_detail_validators(request, year, month, day, slug):
+    post = Post.objects.filter(
         published_date__year=year,
         published_date__month=month,
         published_date__day=day,
         slug=slug,
         status='published'
+    ).values('id', 'author_id', 'updated_at', 'category__updated_at').annotate(
+        comments_updated=Max('comments__updated_at'), comment_count=Count('comments'),
+    ).first()
+    if post is None:
+        return None
+    # A 304 skips the view, so the view is counted from here (see blog.conditional)
+    on_cache_hit(request, 'posts.counters.record_view', post['id'])
+    stamps = [post['updated_at'], post['category__updated_at'], post['comments_updated']]
+    return make_validators(
+        request,
+        [*stamps, post['comment_count']],
+        [f"author:{post['author_id']}", f"author-posts:{post['author_id']}", 'sidebar'],
+        last_modified=max(stamp for stamp in stamps if stamp),
     )
+
+def _submit_comment(request, post):
+    """Bound comment form for a POST, blank otherwise; returns (form, saved)"""
+    if request.method != 'POST':
+        return CommentForm(), False
+    comment_form = CommentForm(data=request.POST)
+    if not comment_form.is_valid():
+        return comment_form, False
+    new_comment = comment_form.save(commit=False)
+    new_comment.post = post
+    new_comment.author = request.user if request.user.is_authenticated else None
+    new_comment.save()
+    messages.success(request, 'Your comment has been added!')
+    return comment_form, True
+
+@conditional(post_detail_validators)
+async def post_detail(request, year, month, day, slug):
+    try:
+        post = await Post.objects.aget(
+            published_date__year=year,
+            published_date__month=month,
+            published_date__day=day,
+            slug=slug,
+            status='published'
+        )
+    except Post.DoesNotExist:
+        raise Http404('No Post matches the given query.')
     
     # Increment view count
-    post.increment_view_count()
+    await sync_to_async(post.increment_view_count)()
     
-    # Get related posts
-    related_posts = Post.objects.filter(
-        tags__in=post.tags.all(),
-        status='published'
-    ).exclude(id=post.id).distinct()[:3]
-    
-    # Get author's published posts (excluding current post)
-    author_posts = Post.objects.filter(
-        author=post.author,
-        status='published'
-    ).exclude(id=post.id).order_by('-published_date')[:3]
+    # Comment form
+    comment_form, saved = await sync_to_async(_submit_comment)(request, post)
+    if saved:
+        return redirect(post.get_absolute_url())
     
-    # Get comments
-    comments = post.comments.filter(active=True).order_by('-created_at')
+    # Related posts (precomputed, see posts.related), the author's other
+    # published posts and the nested comments (see comments.threads) do not
+    # depend on each other, so they are queried concurrently
+    related_posts, author_posts, (comments, comment_count) = await gather(
+        lambda: list(get_related_posts(post)),
+        lambda: list(Post.objects.filter(
+            author_id=post.author_id,
+            status='published'
+        ).exclude(id=post.id).order_by('-published_date')[:3]),
+        lambda: load_post_comments(post),
+    )
     
-    # Comment form
-    if request.method == 'POST':
-        comment_form = CommentForm(data=request.POST)
-        if comment_form.is_valid():
-            new_comment = comment_form.save(commit=False)
-            new_comment.post = post
-            new_comment.author = request.user if request.user.is_authenticated else None
-            new_comment.save()
-            messages.success(request, 'Your comment has been added!')
-            return redirect(post.get_absolute_url())
-    else:
-        comment_form = CommentForm()
+    # Cached copies for anonymous readers still count the view (see blog.pagecache)
+    add_surrogate_keys(
+        request,
+        f'comments:{post.id}',
+        f'author-posts:{post.author_id}',
+        *post_keys([post, *related_posts, *author_posts]),
+    )
+    on_cache_hit(request, 'posts.counters.record_view', post.id)
     
-    return render(request, 'posts/post_detail.html', {
+    return await sync_to_async(render)(request, 'posts/post_detail.html', {
         'post': post,
         'related_posts': related_posts,
         'author_posts': author_posts,  # Add this
         'comments': comments,
+        'comment_count': comment_count,
         'comment_form': comment_form,
     })
 
@@ -214,19 +210,46 @@ def search(request):
     results = []
     
     if query:
-        results = Post.objects.filter(
-            Q(title__icontains=query) |
-            Q(content__icontains=query) |
-            Q(excerpt__icontains=query) |
-            Q(tags__name__icontains=query),
-            status='published'
-        ).distinct().order_by('-published_date')
+        results = search_posts(Post.objects.filter(status='published').select_related('author', 'category'), query)
     
     return render(request, 'posts/search_results.html', {
         'query': query,
         'results': results
     })
 
+def trending(request):
+    """Posts with the highest time-decayed view score (JSON)"""
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 50)
+    except ValueError:
+        limit = 10
+    
+    posts = [
+        {
+            'id': post.id,
+            'title': post.title,
+            'url': post.get_absolute_url(),
+            'author': post.author.username,
+            'category': post.category.name if post.category else None,
+            'published_date': post.published_date.isoformat(),
+            'score': round(post.trending_score, 3),
+        }
+        for post in trending_posts(limit).defer('content', 'plain_text')
+    ]
+    
+    return JsonResponse({'posts': posts})
+
+def feed(request, feed_format, kind=None, slug=None):
+    """Atom or RSS feed of the newest posts, whole site or one category, tag or author"""
+    # Served from the cache (see posts.feeds); no query while nothing changed
+    try:
+        entry = get_feed(feed_format, kind, slug)
+    except FeedNotFound:
+        raise Http404
+    response = HttpResponse(entry['xml'], content_type=FEED_FORMATS[feed_format].content_type)
+    response['ETag'] = entry['etag']
+    return get_conditional_response(request, etag=entry['etag'], response=response)
+
 def newsletter_subscribe(request):
     """Handle newsletter subscription"""
     if request.method == 'POST':
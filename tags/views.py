@@ -1,20 +1,33 @@
+from django.db.models import Count, Max
 from django.shortcuts import render, get_object_or_404
-from django.core.paginator import Paginator
 from taggit.models import Tag
+from blog.conditional import conditional, make_validators
+from blog.pagecache import add_surrogate_keys, post_keys
 from posts.models import Post
+from posts.pagination import paginate_by_cursor
 
 def tag_list(request):
     tags = Tag.objects.all()
     return render(request, 'tags/tag_list.html', {'tags': tags})
 
+def tag_posts_validators(request, slug):
+    # Tags have no timestamp; renames show up in the tag's surrogate key version
+    stats = Post.objects.filter(status='published', tags__slug=slug).aggregate(
+        tag=Max('tags__id'), latest=Max('updated_at'), count=Count('id'),
+    )
+    if stats['tag'] is None:
+        return None
+    return make_validators(request, [stats['latest'], stats['count']], [f"tag:{stats['tag']}", 'sidebar'])
+
+@conditional(tag_posts_validators)
 def tag_posts(request, slug):
     tag = get_object_or_404(Tag, slug=slug)
-    posts_list = Post.objects.filter(tags=tag, status='published').order_by('-published_date')
+    posts_list = Post.objects.filter(tags=tag, status='published').select_related('author', 'category').order_by('-published_date')
     
     # Pagination
-    paginator = Paginator(posts_list, 10)
-    page = request.GET.get('page')
-    posts = paginator.get_page(page)
+    posts = paginate_by_cursor(request, posts_list, 10)
+    
+    add_surrogate_keys(request, f'tag:{tag.id}', f'tag-posts:{tag.id}', *post_keys(posts))
     
     return render(request, 'tags/tag_posts.html', {
         'tag': tag,